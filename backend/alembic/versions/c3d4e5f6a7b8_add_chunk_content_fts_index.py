@@ -0,0 +1,28 @@
+"""Add full-text index on memory_chunks.content
+
+Revision ID: c3d4e5f6a7b8
+Revises: f1a2b3c4d5e6
+Create Date: 2026-02-12 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d4e5f6a7b8'
+down_revision: Union[str, None] = 'f1a2b3c4d5e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_chunk_content_fts "
+        "ON memory_chunks USING gin (to_tsvector('english', content))"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_chunk_content_fts")
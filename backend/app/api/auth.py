@@ -6,9 +6,10 @@ from jwt.exceptions import InvalidTokenError
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pwdlib import PasswordHash
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
-from ..database import get_db
+from ..database import get_async_db, get_db
 from ..models import User
 from ..core.config import settings
 from ..core.validation import validate_email, validate_password, sanitize_text
@@ -61,34 +62,64 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     return encoded_jwt
 
 
-async def get_current_user(
-    request: Request,
-    token: Annotated[str, Depends(oauth2_scheme)],
-    db: Annotated[Session, Depends(get_db)]
-) -> User:
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def _token_user_id(token: str) -> str:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         if user_id is None:
-            raise credentials_exception
+            raise _credentials_exception()
         token_data = TokenData(user_id=user_id)
     except InvalidTokenError:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.id == token_data.user_id).first()
+        raise _credentials_exception()
+
+    return user_id
+
+
+async def get_current_user(
+    request: Request,
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: Annotated[Session, Depends(get_db)]
+) -> User:
+    user_id = _token_user_id(token)
+
+    user = db.query(User).filter(User.id == user_id).first()
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
 
     request.state.user_id = str(user.id)
     
     return user
 
 
+async def get_current_user_async(
+    request: Request,
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: Annotated[AsyncSession, Depends(get_async_db)]
+) -> User:
+    # For async routes: the lookup awaits the async session instead of
+    # blocking the event loop
+    user_id = _token_user_id(token)
+
+    try:
+        user = await db.get(User, uuid.UUID(user_id))
+    except ValueError:
+        raise _credentials_exception()
+    if user is None:
+        raise _credentials_exception()
+
+    request.state.user_id = str(user.id)
+
+    return user
+
+
 @router.post("/register", response_model=UserResponse)
 async def register(
     user_data: UserCreate,
@@ -1,21 +1,30 @@
-import base64
+import tempfile
 import uuid
 from pathlib import Path
 from typing import Optional
 
 from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
+from ..core.config import settings
 from ..core.validation import sanitize_text, validate_uuid
 from ..database import get_db
 from ..models import User, ScentMemory, MemoryType
 from ..schemas.common import (
+    BulkImportResponse,
     MemoryUploadResponse,
     MemoryListItem,
     MemoryDetailResponse,
     MemoryDeleteResponse,
     ExtractedScentResponse,
 )
+from ..services.blob_refs import lock_blob_keys
+from ..services.blob_store import COPY_CHUNK_SIZE, get_blob_store
+from ..services.bulk_import import BulkImportError, create_import
+from ..services.cache import invalidate_user_recommendations
+from ..services.upload_ingest import UPLOAD_CHUNK_SIZE, UnsupportedUploadError, UploadTooLargeError, ingest_upload
+from ..tasks.bulk_import import start_import
 from ..tasks.process_memory import process_memory_task
 from .auth import get_current_user
 
@@ -23,7 +32,6 @@ from .auth import get_current_user
 router = APIRouter()
 
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
-BASE64_SIZE_LIMIT = 5 * 1024 * 1024  # 5MB
 
 ALLOWED_MIME_TYPES = {
     "image/jpeg",
@@ -87,11 +95,7 @@ async def upload_memory(
     file_data = None
 
     if file:
-        file.file.seek(0, 2)
-        file_size = file.file.tell()
-        file.file.seek(0)
-
-        if file_size > MAX_FILE_SIZE:
+        if file.size is not None and file.size > MAX_FILE_SIZE:
             raise HTTPException(400, "File too large (max 10MB)")
 
         ext = Path(file.filename).suffix.lower() if file.filename else ""
@@ -102,35 +106,40 @@ async def upload_memory(
         ):
             raise HTTPException(400, "Unsupported file type")
 
-        file_bytes = await file.read()
-
-        if file_size < BASE64_SIZE_LIMIT:
-            base64_encoded = base64.b64encode(file_bytes).decode('utf-8')
-            file_data = {
-                "type": "base64",
-                "data": base64_encoded,
-                "content_type": file.content_type,
-                "extension": ext
-            }
-        else:
-            temp_dir = Path("/tmp/scent_uploads")
-            temp_dir.mkdir(parents=True, exist_ok=True)
-
-            temp_filename = f"{uuid.uuid4()}{ext}"
-            temp_file_path = temp_dir / temp_filename
-
-            with temp_file_path.open("wb") as f:
-                f.write(file_bytes)
+        # Sniffed content must match the declared kind (image vs PDF); checked
+        # while streaming so a mismatch is rejected before the blob is stored
+        declared_kind = file.content_type.split("/")[0]
+
+        # Flushed under the blob's lock before the blob is stored, so a worker
+        # releasing an identical upload sees this memory as a holder
+        def claim(key: str) -> None:
+            lock_blob_keys(db, [key])
+            memory.file_path = key
+            db.flush()
+
+        try:
+            ingested = await ingest_upload(
+                file,
+                get_blob_store(),
+                max_size=MAX_FILE_SIZE,
+                allowed_mime_types={m for m in ALLOWED_MIME_TYPES if m.split("/")[0] == declared_kind},
+                extension=ext,
+                claim=claim
+            )
+        except UploadTooLargeError:
+            raise HTTPException(400, "File too large (max 10MB)")
+        except UnsupportedUploadError:
+            raise HTTPException(400, "Unsupported file type")
 
-            file_data = {
-                "type": "temp_file",
-                "path": str(temp_file_path),
-                "content_type": file.content_type,
-                "extension": ext
-            }
+        file_data = {
+            "type": "blob",
+            "key": ingested["key"],
+            "content_type": ingested["content_type"],
+            "extension": ext
+        }
 
-        memory.file_size = file_size
-        memory.mime_type = file.content_type
+        memory.file_size = ingested["size"]
+        memory.mime_type = ingested["content_type"]
 
     db.commit()
 
@@ -147,6 +156,51 @@ async def upload_memory(
     )
 
 
+@router.post(
+    "/import",
+    response_model=BulkImportResponse,
+    summary="Bulk import memories",
+    description="Import many memories from a JSONL file or a zip of text, image and PDF files. Progress is reported over the websocket."
+)
+async def import_memories(
+    file: UploadFile = File(..., description="JSONL file or zip archive"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> BulkImportResponse:
+    max_mb = settings.BULK_IMPORT_MAX_BYTES // (1024 * 1024)
+
+    if file.size is not None and file.size > settings.BULK_IMPORT_MAX_BYTES:
+        raise HTTPException(400, f"Import too large (max {max_mb}MB)")
+
+    # Zip archives need random access, so the upload is spooled (to disk
+    # past 1MB) rather than parsed as a stream
+    spool = tempfile.SpooledTemporaryFile(max_size=COPY_CHUNK_SIZE)
+
+    try:
+        size = 0
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > settings.BULK_IMPORT_MAX_BYTES:
+                raise HTTPException(400, f"Import too large (max {max_mb}MB)")
+            await run_in_threadpool(spool.write, chunk)
+
+        try:
+            job = await run_in_threadpool(create_import, db, current_user.id, spool, get_blob_store())
+        except BulkImportError as e:
+            raise HTTPException(400, str(e))
+
+    finally:
+        spool.close()
+
+    await run_in_threadpool(start_import, str(current_user.id), job)
+
+    return BulkImportResponse(
+        job_id=job["job_id"],
+        total=job["total"],
+        status="processing"
+    )
+
+
 @router.get(
     "/",
     response_model=list[MemoryListItem],
@@ -239,6 +293,8 @@ def delete_memory(
     db.delete(memory)
     db.commit()
 
+    invalidate_user_recommendations(str(current_user.id))
+
     return MemoryDeleteResponse(
         status="deleted",
         id=str(memory_id)
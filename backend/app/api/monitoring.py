@@ -1 +1,51 @@
-# flower monitoring for celery
\ No newline at end of file
+from fastapi import APIRouter, Depends
+
+from ..core.security import get_admin_user
+from ..models import User
+from ..schemas.common import (
+    EmbeddingCacheStatsResponse,
+    EventPublisherStatsResponse,
+    RecommendationCacheStatsResponse,
+)
+from ..services.cache import get_recommendation_cache_stats
+from ..services.embedding_cache import get_embedding_cache_stats
+from ..services.event_publisher import get_event_publisher_stats
+
+
+router = APIRouter()
+
+
+@router.get(
+    "/embedding-cache",
+    response_model=EmbeddingCacheStatsResponse,
+    summary="Embedding cache statistics",
+    description="Hit/miss counters for the embedding cache in this API process."
+)
+def embedding_cache_stats(
+    current_user: User = Depends(get_admin_user)
+) -> EmbeddingCacheStatsResponse:
+    return EmbeddingCacheStatsResponse(**get_embedding_cache_stats())
+
+
+@router.get(
+    "/recommendation-cache",
+    response_model=RecommendationCacheStatsResponse,
+    summary="Recommendation cache statistics",
+    description="Hit/miss counters for the query, exact and semantic recommendation caches in this API process."
+)
+def recommendation_cache_stats(
+    current_user: User = Depends(get_admin_user)
+) -> RecommendationCacheStatsResponse:
+    return RecommendationCacheStatsResponse(**get_recommendation_cache_stats())
+
+
+@router.get(
+    "/event-publisher",
+    response_model=EventPublisherStatsResponse,
+    summary="Event publisher statistics",
+    description="Publish counts and Redis round-trip latency for events published by this API process."
+)
+def event_publisher_stats(
+    current_user: User = Depends(get_admin_user)
+) -> EventPublisherStatsResponse:
+    return EventPublisherStatsResponse(**get_event_publisher_stats())
@@ -8,6 +8,7 @@ from sqlalchemy.orm.attributes import flag_modified
 from ..database import get_db
 from ..models import ExtractedScent, ScentMemory, User, ScentProfile
 from ..schemas.common import ProfileResponse, ProfileUpdateResponse, NoteCount
+from ..services.cache import bump_user_data_version
 from .auth import get_current_user
 
 
@@ -84,6 +85,8 @@ def update_my_profile(
         flag_modified(profile, "disliked_notes")
 
     db.commit()
+
+    bump_user_data_version(str(current_user.id))
     return ProfileUpdateResponse(status="updated")
 
 
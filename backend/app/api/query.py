@@ -1,32 +1,55 @@
+import asyncio
+import json
 import logging
+import time
 import uuid
-from typing import Optional
+from datetime import datetime, timezone
+from typing import AsyncIterator, Literal, Optional
 
+from anyio import from_thread
 from fastapi import APIRouter, Depends, HTTPException
-from openai import OpenAI
+from fastapi.responses import StreamingResponse
+from openai import AsyncOpenAI
+from openai.types import CompletionUsage
+from openai.types.chat import ChatCompletionMessageParam
 from pydantic import BaseModel, Field, field_validator
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.attributes import flag_modified
 
 from ..core.config import settings
 from ..core.validation import sanitize_text, validate_uuid
-from ..database import get_db
+from ..database import get_async_db, get_async_session_factory, get_db
 from ..models import User, QueryLog, QueryType, MemoryChunk, ScentProfile
-from ..schemas.common import SearchResponse, FeedbackResponse
+from ..schemas.common import SearchResponse, FeedbackResponse, StreamStartResponse, WebSocketMessage
 from ..services.cache import (
     get_cached_recommendation,
     cache_recommendation,
     find_similar_cached_query,
-    invalidate_user_recommendations
+    get_cache_key,
+    get_query_cached_recommendation,
+    acquire_inflight,
+    release_inflight,
+    wait_for_inflight,
+    cache_query_recommendation,
+    invalidate_user_recommendations,
+    record_cache_miss
 )
-from ..services.embeddings import generate_embedding
-from ..services.vector_db import search_similar
-from .auth import get_current_user
+from ..services.context_builder import build_context
+from ..services.embeddings import generate_embedding_async
+from ..services.event_publisher import publish_event_async
+from ..services.query_log_writer import enqueue_query_log, flush_query_logs
+from ..services.retrieval import retrieve_chunk_ids
+from .auth import get_current_user, get_current_user_async
 
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+async_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+
+# Websocket streams run detached from their request; hold references until done
+_stream_tasks: set[asyncio.Task[None]] = set()
 
 # Cache-friendly system prompt with Redis for similar and identical queries
 FRAGRANCE_ADVISOR_SYSTEM_PROMPT = """You are an expert personal fragrance advisor with deep knowledge of perfumery.
@@ -105,142 +128,393 @@ class FeedbackRequest(BaseModel):
         return cleaned
 
 
+def _log_query(
+    user: User,
+    request: QueryRequest,
+    llm_response: str,
+    model_version: str,
+    started: float,
+    chunk_ids: Optional[list[str]] = None,
+    context: Optional[str] = None,
+    usage: Optional[CompletionUsage] = None
+) -> str:
+    # Queued for the background writer rather than committed here; the id is
+    # generated up front so the response can return it straight away.
+    # started is the request's time.perf_counter()
+    query_id = uuid.uuid4()
+    enqueue_query_log({
+        "id": query_id,
+        "user_id": user.id,
+        "query_text": request.query,
+        "query_type": request.query_type,
+        "retrieved_chunks": chunk_ids,
+        "context_used": context,
+        "llm_response": llm_response,
+        "model_version": model_version,
+        "prompt_tokens": usage.prompt_tokens if usage else None,
+        "completion_tokens": usage.completion_tokens if usage else None,
+        "latency_ms": round((time.perf_counter() - started) * 1000),
+        "created_at": datetime.now(timezone.utc)
+    })
+    return str(query_id)
+
+
+async def _retrieve_context(
+    db: AsyncSession,
+    user: User,
+    request_q: str
+) -> tuple[list[float], list[str], list[str], str]:
+    # Returns the query embedding, the retrieved chunk ids and source memory
+    # ids in relevance order, and the packed context
+    query_embedding = await generate_embedding_async(request_q)
+    chunk_ids = await retrieve_chunk_ids(db, request_q, query_embedding, str(user.id))
+    rows = (await db.scalars(select(MemoryChunk).where(MemoryChunk.id.in_(chunk_ids)))).all()
+    by_id = {str(c.id): c for c in rows}
+    chunks = [by_id[chunk_id] for chunk_id in chunk_ids if chunk_id in by_id]
+
+    context, passages = build_context(chunks)
+    sources = list(dict.fromkeys(p["memory_id"] for p in passages))
+
+    return query_embedding, [str(c.id) for c in chunks], sources, context
+
+
+async def _cached_response(
+    cache_key_data: str,
+    query_embedding: list[float],
+    user_id: str,
+    data_version: str
+) -> Optional[tuple[str, str]]:
+    cached_response = await get_cached_recommendation(cache_key_data, user_id, data_version)
+    if cached_response:
+        logger.info(f"Cache hit (exact) for user {user_id}")
+        return cached_response, "gpt-4-cached"
+
+    similar_response = await find_similar_cached_query(
+        query_embedding=query_embedding,
+        user_id=user_id,
+        version=data_version
+    )
+    if similar_response:
+        logger.info(f"Cache hit (similar) for user {user_id}")
+        return similar_response, "gpt-4-cached-similar"
+
+    return None
+
+
+async def _join_inflight(cache_key: str) -> tuple[Optional[str], Optional[tuple[str, str]]]:
+    # Single flight: the first of several identical requests (on any node)
+    # gets a token and calls the LLM; the rest wait for its answer. Neither
+    # means the first one failed, so this request generates on its own
+    token = await acquire_inflight(cache_key)
+    if token:
+        return token, None
+
+    coalesced = await wait_for_inflight(cache_key)
+    if coalesced:
+        return None, (coalesced, "gpt-4-coalesced")
+    return None, None
+
+
+def _advisor_messages(context: str, query: str) -> list[ChatCompletionMessageParam]:
+    return [
+        {
+            "role": "system",
+            "content": FRAGRANCE_ADVISOR_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": f"""User's scent memories and preferences:
+{context}
+
+---
+
+User's question: {query}
+
+Please provide personalized perfume recommendations based on their profile."""
+        }
+    ]
+
+
+def _log_prompt_cache(usage: Optional[CompletionUsage]) -> None:
+    if usage and hasattr(usage, 'prompt_tokens_details'):
+        cached_tokens = getattr(usage.prompt_tokens_details, 'cached_tokens', 0)
+        if cached_tokens > 0:
+            logger.info(f"OpenAI prompt cache hit: {cached_tokens} tokens cached")
+
+
+async def _store_recommendation(
+    user: User,
+    request_q: str,
+    query_embedding: list[float],
+    context: str,
+    llm_response: str,
+    sources: list[str],
+    data_version: Optional[str]
+) -> None:
+    if data_version is not None:
+        await cache_query_recommendation(
+            str(user.id), data_version, request_q, {"response": llm_response, "sources": sources},
+            ttl=settings.QUERY_CACHE_TTL
+        )
+        await cache_recommendation(
+            cache_key_data=f"{user.id}:{context}:{request_q}",
+            recommendation=llm_response,
+            query=request_q,
+            user_id=str(user.id),
+            version=data_version,
+            context_preview=context[:200],
+            ttl=3600,
+            query_embedding=query_embedding
+        )
+
+
 @router.post(
     "/search",
     response_model=SearchResponse,
     summary="Search memories and get recommendations",
     description="Search through memories and get personalized fragrance recommendations."
 )
-def search_memories(
+async def search_memories(
     request: QueryRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
     use_cache: bool = True
 ) -> SearchResponse:
+    # Async end to end: embedding, vector search, Redis, Postgres and the
+    # completion are awaited on the event loop, so slow LLM calls don't hold
+    # threadpool workers that every sync route shares
 
+    started = time.perf_counter()
     request_q = sanitize_text(request.query, max_length=1000)
+    user_id = str(current_user.id)
 
-    query_embedding = generate_embedding(request_q)
-    results = search_similar(query_embedding, str(current_user.id), top_k=5)
-
-    chunk_ids = results['ids'][0] if results['ids'] else []
-    chunks = db.query(MemoryChunk).filter(MemoryChunk.id.in_(chunk_ids)).all()
-    context = "\n\n".join([f"Memory: {c.content}" for c in chunks])
+    # First level: a repeated question for unchanged data returns before any
+    # embedding or vector search. data_version stays None when caching is off
+    data_version: Optional[str] = None
+    if use_cache:
+        data_version, entry = await get_query_cached_recommendation(user_id, request_q)
+        if entry:
+            query_id = _log_query(current_user, request, entry["response"], "gpt-4-cached", started)
 
-    cache_key_data = f"{current_user.id}:{context}:{request_q}"
+            return SearchResponse(
+                query_id=query_id,
+                response=entry["response"],
+                sources=entry["sources"],
+                cached=True
+            )
 
-    # Check exact cache hit
-    if use_cache:
-        cached_response = get_cached_recommendation(cache_key_data, str(current_user.id))
-        if cached_response:
-            logger.info(f"Cache hit (exact) for user {current_user.id}")
-
-            query_log = QueryLog(
-                user_id=current_user.id,
-                query_text=request.query,
-                query_type=request.query_type,
-                llm_response=cached_response,
-                model_version="gpt-4-cached"
+    query_embedding, chunk_ids, sources, context = await _retrieve_context(db, current_user, request_q)
+
+    inflight_key: Optional[str] = None
+    inflight_token: Optional[str] = None
+    if data_version is not None:
+        cache_key_data = f"{user_id}:{context}:{request_q}"
+        cached = await _cached_response(cache_key_data, query_embedding, user_id, data_version)
+        if not cached:
+            inflight_key = get_cache_key(cache_key_data, user_id, data_version)
+            inflight_token, cached = await _join_inflight(inflight_key)
+        if cached:
+            cached_response, model_version = cached
+            await cache_query_recommendation(
+                user_id, data_version, request_q, {"response": cached_response, "sources": sources},
+                ttl=settings.QUERY_CACHE_TTL
+            )
+            query_id = _log_query(
+                current_user, request, cached_response, model_version, started, chunk_ids, context
             )
-            db.add(query_log)
-            db.commit()
-            db.refresh(query_log)
 
             return SearchResponse(
-                query_id=str(query_log.id),
+                query_id=query_id,
                 response=cached_response,
-                sources=[str(c.memory_id) for c in chunks],
+                sources=sources,
                 cached=True
             )
 
-        similar_response = find_similar_cached_query(
-            query=request_q,
-            user_id=str(current_user.id),
-            threshold=0.85
+    logger.info(f"Cache miss for user {user_id}, calling LLM")
+    if data_version is not None:
+        record_cache_miss()
+
+    llm_response: Optional[str] = None
+    try:
+        response = await async_client.chat.completions.create(
+            model="gpt-4",
+            messages=_advisor_messages(context, request.query),
+            temperature=0.7,
+            max_tokens=1000
         )
-        if similar_response:
-            logger.info(f"Cache hit (similar) for user {current_user.id}")
-
-            query_log = QueryLog(
-                user_id=current_user.id,
-                query_text=request.query,
-                query_type=request.query_type,
-                llm_response=similar_response,
-                model_version="gpt-4-cached-similar"
+
+        llm_response = response.choices[0].message.content or ""
+        _log_prompt_cache(response.usage)
+
+        await _store_recommendation(
+            current_user, request_q, query_embedding, context, llm_response, sources, data_version
+        )
+    finally:
+        if inflight_key and inflight_token:
+            await release_inflight(inflight_key, inflight_token, llm_response)
+
+    query_id = _log_query(
+        current_user, request, llm_response, "gpt-4", started, chunk_ids, context, response.usage
+    )
+
+    return SearchResponse(
+        query_id=query_id,
+        response=llm_response,
+        sources=sources,
+        cached=False
+    )
+
+
+async def _stream_recommendation(
+    user: User,
+    request: QueryRequest,
+    request_q: str,
+    use_cache: bool
+) -> AsyncIterator[WebSocketMessage]:
+    # Outlives the request's dependencies, so it opens its own session.
+    # Yields "sources" once, "token" per completion delta, then "done" after
+    # the full text has been cached and logged (or "error").
+    started = time.perf_counter()
+    async with get_async_session_factory()() as db:
+        inflight_key: Optional[str] = None
+        inflight_token: Optional[str] = None
+        llm_response: Optional[str] = None
+        try:
+            user_id = str(user.id)
+            data_version: Optional[str] = None
+            if use_cache:
+                data_version, entry = await get_query_cached_recommendation(user_id, request_q)
+                if entry:
+                    query_id = _log_query(user, request, entry["response"], "gpt-4-cached", started)
+                    yield {"event": "sources", "sources": entry["sources"]}
+                    yield {"event": "token", "delta": entry["response"]}
+                    yield {"event": "done", "query_id": query_id, "cached": True}
+                    return
+
+            query_embedding, chunk_ids, sources, context = await _retrieve_context(db, user, request_q)
+            yield {"event": "sources", "sources": sources}
+
+            if data_version is not None:
+                cache_key_data = f"{user_id}:{context}:{request_q}"
+                cached = await _cached_response(cache_key_data, query_embedding, user_id, data_version)
+                if not cached:
+                    inflight_key = get_cache_key(cache_key_data, user_id, data_version)
+                    inflight_token, cached = await _join_inflight(inflight_key)
+                if cached:
+                    cached_response, model_version = cached
+                    await cache_query_recommendation(
+                        user_id, data_version, request_q, {"response": cached_response, "sources": sources},
+                        ttl=settings.QUERY_CACHE_TTL
+                    )
+                    query_id = _log_query(user, request, cached_response, model_version, started, chunk_ids, context)
+                    yield {"event": "token", "delta": cached_response}
+                    yield {"event": "done", "query_id": query_id, "cached": True}
+                    return
+
+            logger.info(f"Cache miss for user {user_id}, streaming LLM response")
+            if data_version is not None:
+                record_cache_miss()
+
+            stream = await async_client.chat.completions.create(
+                model="gpt-4",
+                messages=_advisor_messages(context, request.query),
+                temperature=0.7,
+                max_tokens=1000,
+                stream=True,
+                stream_options={"include_usage": True}
             )
-            db.add(query_log)
-            db.commit()
-            db.refresh(query_log)
 
-            return SearchResponse(
-                query_id=str(query_log.id),
-                response=similar_response,
-                sources=[str(c.memory_id) for c in chunks],
-                cached=True
+            parts: list[str] = []
+            usage: Optional[CompletionUsage] = None
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield {"event": "token", "delta": chunk.choices[0].delta.content}
+                # include_usage: only the final chunk carries it
+                usage = chunk.usage or usage
+                _log_prompt_cache(chunk.usage)
+            llm_response = "".join(parts)
+
+            await _store_recommendation(
+                user, request_q, query_embedding, context, llm_response, sources, data_version
             )
+            query_id = _log_query(user, request, llm_response, "gpt-4", started, chunk_ids, context, usage)
+            yield {"event": "done", "query_id": query_id, "cached": False}
 
-    logger.info(f"Cache miss for user {current_user.id}, calling LLM")
-
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {
-                "role": "system",
-                "content": FRAGRANCE_ADVISOR_SYSTEM_PROMPT
-            },
-            {
-                "role": "user",
-                "content": f"""User's scent memories and preferences:
-{context}
+        except Exception as e:
+            logger.error(f"Streaming recommendation failed for user {user.id}: {e}")
+            yield {"event": "error", "error": "Failed to generate recommendation"}
 
----
+        finally:
+            if inflight_key and inflight_token:
+                await release_inflight(inflight_key, inflight_token, llm_response)
 
-User's question: {request.query}
 
-Please provide personalized perfume recommendations based on their profile."""
-            }
-        ],
-        temperature=0.7,
-        max_tokens=1000
-    )
+def _sse(message: WebSocketMessage) -> str:
+    data = {key: value for key, value in message.items() if key != "event"}
+    return f"event: {message['event']}\ndata: {json.dumps(data)}\n\n"
 
-    llm_response = response.choices[0].message.content or ""
 
-    usage = response.usage
-    if usage and hasattr(usage, 'prompt_tokens_details'):
-        cached_tokens = getattr(usage.prompt_tokens_details, 'cached_tokens', 0)
-        if cached_tokens > 0:
-            logger.info(f"OpenAI prompt cache hit: {cached_tokens} tokens cached")
+async def _publish_stream(
+    user: User,
+    request: QueryRequest,
+    request_q: str,
+    use_cache: bool,
+    stream_id: str
+) -> None:
+    # Published on the events channel so the API process holding the user's
+    # socket forwards it, whichever process runs the generation
+    async for message in _stream_recommendation(user, request, request_q, use_cache):
+        message["event"] = f"recommendation_{message['event']}"
+        message["user_id"] = str(user.id)
+        message["stream_id"] = stream_id
+        await publish_event_async(message)
 
-    if use_cache:
-        cache_recommendation(
-            cache_key_data=cache_key_data,
-            recommendation=llm_response,
-            query=request_q,
-            user_id=str(current_user.id),
-            context_preview=context[:200],
-            ttl=3600
-        )
 
-    query_log = QueryLog(
-        user_id=current_user.id,
-        query_text=request.query,
-        query_type=request.query_type,
-        llm_response=llm_response,
-        model_version="gpt-4"
+@router.post(
+    "/search/stream",
+    response_model=None,
+    summary="Stream recommendations",
+    description=(
+        "Same as /search, but completion tokens are streamed as they are generated: "
+        "as Server-Sent Events (transport=sse), or over the /ws/{user_id} socket as "
+        "recommendation_* events tagged with the returned stream_id (transport=websocket)."
     )
-    db.add(query_log)
-    db.commit()
-    db.refresh(query_log)
+)
+async def stream_search(
+    request: QueryRequest,
+    current_user: User = Depends(get_current_user_async),
+    transport: Literal["sse", "websocket"] = "sse",
+    use_cache: bool = True
+) -> StreamingResponse | StreamStartResponse:
 
-    return SearchResponse(
-        query_id=str(query_log.id),
-        response=llm_response,
-        sources=[str(c.memory_id) for c in chunks],
-        cached=False
+    request_q = sanitize_text(request.query, max_length=1000)
+
+    if transport == "websocket":
+        stream_id = str(uuid.uuid4())
+        task = asyncio.create_task(_publish_stream(current_user, request, request_q, use_cache, stream_id))
+        _stream_tasks.add(task)
+        task.add_done_callback(_stream_tasks.discard)
+        return StreamStartResponse(stream_id=stream_id)
+
+    async def events() -> AsyncIterator[str]:
+        async for message in _stream_recommendation(current_user, request, request_q, use_cache):
+            yield _sse(message)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
+def _find_query_log(db: Session, query_id: uuid.UUID, user_id: uuid.UUID) -> Optional[QueryLog]:
+    return db.query(QueryLog).filter(
+        QueryLog.id == query_id,
+        QueryLog.user_id == user_id
+    ).first()
+
+
 @router.post(
     "/{query_id}/feedback",
     response_model=FeedbackResponse,
@@ -256,10 +530,13 @@ def submit_feedback(
 
     validated_query_id = validate_uuid(query_id)
 
-    query = db.query(QueryLog).filter(
-        QueryLog.id == validated_query_id,
-        QueryLog.user_id == current_user.id
-    ).first()
+    query = _find_query_log(db, validated_query_id, current_user.id)
+
+    if not query:
+        # Feedback can arrive before the background writer has inserted the
+        # log; write whatever is queued (this route runs in the threadpool)
+        from_thread.run(flush_query_logs)
+        query = _find_query_log(db, validated_query_id, current_user.id)
 
     if not query:
         raise HTTPException(404, "Query not found")
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends
 from datetime import date
+from ..core.config import settings
 from ..models import User
 from .auth import get_current_user
 from ..middleware.rate_limit import redis_client
@@ -40,7 +41,8 @@ def get_all_limits(current_user: User = Depends(get_current_user)):
     return {
         "uploads": get_limit_status(user_id, "upload", 3),
         "queries": get_limit_status(user_id, "query", 10),
-        "profile_updates": get_limit_status(user_id, "profile_update", 1)
+        "profile_updates": get_limit_status(user_id, "profile_update", 1),
+        "imports": get_limit_status(user_id, "import", settings.BULK_IMPORT_LIMIT_PER_DAY)
     }
 
 @router.get("/limits/uploads")
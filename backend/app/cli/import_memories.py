@@ -0,0 +1,53 @@
+"""Bulk import memories for an existing user.
+
+Usage (from backend/):
+    python -m app.cli.import_memories --email user@example.com journal.jsonl
+    python -m app.cli.import_memories --email user@example.com journal.zip
+
+Same formats as POST /api/memories/import: JSONL records with title,
+content, occasion, emotion and created_at, or a zip of .txt/.md, image and
+PDF files with optional *.jsonl manifests whose "file" field points at an
+attachment. Processing runs on the memory_import Celery queue.
+"""
+
+import argparse
+import sys
+
+from ..database import SessionLocal
+from ..models import User
+from ..services.blob_store import get_blob_store
+from ..services.bulk_import import BulkImportError, create_import
+from ..tasks.bulk_import import start_import
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="JSONL file or zip archive")
+    parser.add_argument("--email", required=True, help="email of the user to import for")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == args.email.lower()).first()
+        if not user:
+            print(f"No user with email {args.email}", file=sys.stderr)
+            return 1
+
+        with open(args.path, "rb") as f:
+            job = create_import(db, user.id, f, get_blob_store())
+        user_id = str(user.id)
+
+    except BulkImportError as e:
+        print(f"Import failed: {e}", file=sys.stderr)
+        return 1
+
+    finally:
+        db.close()
+
+    start_import(user_id, job)
+    print(f"Queued import {job['job_id']}: {job['total']} memories")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
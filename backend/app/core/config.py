@@ -39,6 +39,73 @@ class Settings(BaseSettings):
     UPLOAD_LIMIT_PER_DAY: int = 3
     QUERY_LIMIT_PER_DAY: int = 4
     PROFILE_UPDATE_LIMIT_PER_DAY: int = 1
+    BULK_IMPORT_LIMIT_PER_DAY: int = 2
+
+
+    BLOB_STORE_BACKEND: str = "local"
+    BLOB_STORE_PATH: str = "/tmp/scent_uploads"
+    S3_BUCKET: Optional[str] = None
+    S3_ENDPOINT_URL: Optional[str] = None
+    S3_ACCESS_KEY_ID: Optional[str] = None
+    S3_SECRET_ACCESS_KEY: Optional[str] = None
+    S3_REGION: Optional[str] = None
+
+
+    OPENAI_MAX_IN_FLIGHT: int = 8
+
+
+    EVENT_PUBLISHER_MAX_CONNECTIONS: int = 16
+    EVENT_PUBLISH_BATCH_MS: int = 0
+    EVENT_PUBLISH_BATCH_SIZE: int = 50
+
+
+    PDF_MAX_CHARS: int = 100000
+    PDF_MAX_PAGES: int = 300
+    PDF_WORKERS: int = 2
+    PDF_PARALLEL_MIN_PAGES: int = 24
+    PDF_LAYOUT: bool = False
+
+
+    BULK_IMPORT_MAX_BYTES: int = 500 * 1024 * 1024
+    BULK_IMPORT_MAX_MEMORIES: int = 10000
+    BULK_IMPORT_BATCH_SIZE: int = 50
+    BULK_IMPORT_RATE_LIMIT: Optional[str] = None
+    BULK_EXTRACTION_BATCH_SIZE: int = 10
+    BULK_EXTRACTION_MAX_CHARS: int = 30000
+
+
+    VISION_DETAIL: str = "auto"
+    VISION_LOW_DETAIL_MAX_SIDE: int = 512
+    VISION_HIGH_DETAIL_MAX_SIDE: int = 2048
+    VISION_HIGH_DETAIL_SHORT_SIDE: int = 768
+    VISION_IMAGE_FORMAT: str = "WEBP"
+    VISION_IMAGE_QUALITY: int = 85
+    VISION_CACHE_ENABLED: bool = True
+    VISION_CACHE_MAX_DISTANCE: int = 4
+    VISION_CACHE_TTL: int = 30 * 24 * 3600
+
+
+    EMBEDDING_BATCH_SIZE: int = 256
+    EMBEDDING_BATCH_MAX_CHARS: int = 400000
+    EMBEDDING_CACHE_SIZE: int = 2048
+    EMBEDDING_CACHE_TTL: int = 7 * 24 * 3600
+
+    RETRIEVAL_MODE: str = "hybrid"
+    RETRIEVAL_TOP_K: int = 5
+    RETRIEVAL_CANDIDATES: int = 20
+    RRF_K: int = 60
+    MMR_LAMBDA: float = 0.7
+    CONTEXT_TOKEN_BUDGET: int = 1500
+
+    QUERY_CACHE_TTL: int = 3600
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 200
+    SINGLE_FLIGHT_LOCK_TTL: int = 90
+    SINGLE_FLIGHT_WAIT_SECONDS: float = 90.0
+
+    QUERY_LOG_FLUSH_INTERVAL: float = 1.0
+    QUERY_LOG_BATCH_SIZE: int = 500
+    QUERY_LOG_MAX_PENDING: int = 10000
 
     model_config = ConfigDict(
         env_file=".env",
@@ -80,6 +147,22 @@ class Settings(BaseSettings):
             return f"redis://:{self.REDIS_PASSWORD}@{self.REDIS_HOST}:{self.REDIS_PORT}/{self.REDIS_DB}"
         return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}/{self.REDIS_DB}"
 
+    @property
+    def async_database_url(self) -> str:
+        # Same database through an asyncio driver for async routes
+        url = self.DATABASE_URL
+        for prefix, async_prefix in (
+            ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+            ("postgresql://", "postgresql+asyncpg://"),
+            ("postgres://", "postgresql+asyncpg://"),
+            ("sqlite://", "sqlite+aiosqlite://"),
+        ):
+            if url.startswith(prefix):
+                url = async_prefix + url[len(prefix):]
+                break
+        # asyncpg takes ssl=..., not libpq's sslmode=...
+        return url.replace("sslmode=", "ssl=")
+
     @property
     def chroma_url(self) -> str:
         return f"http://{self.CHROMA_HOST}:{self.CHROMA_PORT}"
@@ -109,6 +192,61 @@ class Settings(BaseSettings):
             raise ValueError("OPENAI_API_KEY appears to be a placeholder - use a real API key")
         return v
 
+    @field_validator("BLOB_STORE_BACKEND")
+    @classmethod
+    def validate_blob_store_backend(cls, v: str) -> str:
+        valid_backends = ["local", "s3"]
+        if v not in valid_backends:
+            raise ValueError(f"BLOB_STORE_BACKEND must be one of {valid_backends}")
+        return v
+
+    @field_validator("VISION_DETAIL")
+    @classmethod
+    def validate_vision_detail(cls, v: str) -> str:
+        valid_details = ["auto", "low", "high"]
+        if v not in valid_details:
+            raise ValueError(f"VISION_DETAIL must be one of {valid_details}")
+        return v
+
+    @field_validator("VISION_IMAGE_FORMAT")
+    @classmethod
+    def validate_vision_image_format(cls, v: str) -> str:
+        v = v.upper()
+        valid_formats = ["JPEG", "WEBP"]
+        if v not in valid_formats:
+            raise ValueError(f"VISION_IMAGE_FORMAT must be one of {valid_formats}")
+        return v
+
+    @field_validator("VISION_CACHE_MAX_DISTANCE")
+    @classmethod
+    def validate_vision_cache_max_distance(cls, v: int) -> int:
+        if not 0 <= v <= 16:
+            raise ValueError("VISION_CACHE_MAX_DISTANCE must be between 0 and 16")
+        return v
+
+    @field_validator("RETRIEVAL_MODE")
+    @classmethod
+    def validate_retrieval_mode(cls, v: str) -> str:
+        v = v.lower()
+        valid_modes = ["vector", "lexical", "hybrid"]
+        if v not in valid_modes:
+            raise ValueError(f"RETRIEVAL_MODE must be one of {valid_modes}")
+        return v
+
+    @field_validator("MMR_LAMBDA")
+    @classmethod
+    def validate_mmr_lambda(cls, v: float) -> float:
+        if not 0.0 <= v <= 1.0:
+            raise ValueError("MMR_LAMBDA must be between 0 and 1")
+        return v
+
+    @field_validator("SEMANTIC_CACHE_THRESHOLD")
+    @classmethod
+    def validate_semantic_cache_threshold(cls, v: float) -> float:
+        if not 0.0 < v <= 1.0:
+            raise ValueError("SEMANTIC_CACHE_THRESHOLD must be between 0 and 1")
+        return v
+
     @field_validator("ENVIRONMENT")
     @classmethod
     def validate_environment(cls, v: str) -> str:
@@ -1,4 +1,7 @@
+from typing import AsyncIterator, Optional
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .core.config import settings
@@ -28,3 +31,43 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Async engine for async routes, created on first use so processes that never
+# touch it (Celery workers, CLI) don't need the asyncio driver
+_async_engine: Optional[AsyncEngine] = None
+_async_session_factory: Optional[async_sessionmaker[AsyncSession]] = None
+
+
+def get_async_session_factory() -> async_sessionmaker[AsyncSession]:
+    global _async_engine, _async_session_factory
+
+    if _async_session_factory is not None:
+        return _async_session_factory
+
+    if "sqlite" in settings.async_database_url:
+        _async_engine = create_async_engine(settings.async_database_url)
+    else:
+        _async_engine = create_async_engine(
+            settings.async_database_url,
+            pool_pre_ping=True,
+            pool_size=10,
+            max_overflow=20
+        )
+
+    _async_session_factory = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_session_factory
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with get_async_session_factory()() as db:
+        yield db
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _async_session_factory
+
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+    _async_session_factory = None
@@ -8,11 +8,13 @@ from sentry_sdk.integrations.fastapi import FastApiIntegration
 from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
 from sentry_sdk.integrations.redis import RedisIntegration
 from sentry_sdk.integrations.celery import CeleryIntegration
-from .api import auth, memories, query, rate_limits, profile, health
+from .api import auth, memories, query, rate_limits, profile, health, monitoring
 from .middleware.rate_limit import rate_limit_middleware
 from .core.config import settings
+from .database import dispose_async_engine
 from .core.logging_config import setup_logging
 from .middleware.logging_middleware import log_requests
+from .services.query_log_writer import run_query_log_writer
 from .websockets.redis_listener import redis_listener
 from .websockets.routes import router as websocket_router
 
@@ -39,15 +41,19 @@ logger = setup_logging()
 async def lifespan(app: FastAPI):
     logger.info(f"Starting application in {settings.ENVIRONMENT} mode")
     redis_task = asyncio.create_task(redis_listener())
+    query_log_task = asyncio.create_task(run_query_log_writer())
     
     yield
     
     logger.info("Shutting down application")
-    redis_task.cancel()
-    try:
-        await redis_task
-    except asyncio.CancelledError:
-        pass
+    # Pending query logs are written before the engine is disposed
+    for task in (query_log_task, redis_task):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    await dispose_async_engine()
 
 
 app = FastAPI(
@@ -105,6 +111,7 @@ app.include_router(memories.router, prefix="/api/memories", tags=["memories"])
 app.include_router(query.router, prefix="/api/query", tags=["query"])
 app.include_router(profile.router, prefix="/api/profile", tags=["profile"])
 app.include_router(rate_limits.router, prefix="/api", tags=["rate-limits"])
+app.include_router(monitoring.router, prefix="/api/monitoring", tags=["monitoring"])
 app.include_router(health.router, tags=["health"]) 
 app.include_router(websocket_router)
 
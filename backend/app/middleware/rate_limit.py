@@ -2,6 +2,7 @@ from fastapi import Request
 from fastapi.responses import JSONResponse
 from datetime import datetime, timedelta, date
 import redis
+import redis.asyncio as aioredis
 import logging
 import jwt
 from ..core.config import settings
@@ -10,6 +11,8 @@ logger = logging.getLogger(__name__)
 
 
 redis_client = redis.Redis.from_url(settings.redis_url_computed, decode_responses=True)
+# Middleware runs on the event loop for every request, so its checks must not block it
+async_redis_client = aioredis.Redis.from_url(settings.redis_url_computed, decode_responses=True)
 
 def get_user_id_from_token(request: Request) -> str | None:
     try:
@@ -32,13 +35,13 @@ def get_user_id_from_request(request: Request) -> str | None:
         user_id = get_user_id_from_token(request)
     return user_id
 
-def check_rate_limit(key: str, limit: int, window_seconds: int) -> dict:
+async def check_rate_limit(key: str, limit: int, window_seconds: int) -> dict:
     try:
-        current = redis_client.get(key)
+        current = await async_redis_client.get(key)
         current_count = int(current) if current else 0
         
         if current_count >= limit:
-            ttl = redis_client.ttl(key)
+            ttl = await async_redis_client.ttl(key)
             reset_at = datetime.utcnow() + timedelta(seconds=ttl) if ttl > 0 else None
             
             return {
@@ -59,11 +62,11 @@ def check_rate_limit(key: str, limit: int, window_seconds: int) -> dict:
         logger.warning(f"Rate limit check failed: {e}")
         return {"allowed": True, "remaining": limit}
 
-def increment_rate_limit(key: str, window_seconds: int):
+async def increment_rate_limit(key: str, window_seconds: int):
     try:
-        current = redis_client.incr(key)
+        current = await async_redis_client.incr(key)
         if current == 1:
-            redis_client.expire(key, window_seconds)
+            await async_redis_client.expire(key, window_seconds)
         logger.debug(f"Incremented {key} to {current}")
     except Exception as e:
         logger.warning(f"Failed to increment rate limit: {e}")
@@ -97,7 +100,7 @@ async def rate_limit_middleware(request: Request, call_next):
             today = date.today().isoformat()
             key = f"upload_limit:{user_id}:{today}"
             
-            limit_check = check_rate_limit(
+            limit_check = await check_rate_limit(
                 key, 
                 limit=settings.UPLOAD_LIMIT_PER_DAY, 
                 window_seconds=86400
@@ -122,18 +125,54 @@ async def rate_limit_middleware(request: Request, call_next):
             response = await call_next(request)
             
             if 200 <= response.status_code < 300:
-                increment_rate_limit(key, window_seconds=86400)
+                await increment_rate_limit(key, window_seconds=86400)
             
             return response
         
         return await call_next(request)
     
-    if request.url.path == "/api/query/search" and request.method == "POST":
+    if request.url.path == "/api/memories/import" and request.method == "POST":
+        if user_id:
+            today = date.today().isoformat()
+            key = f"import_limit:{user_id}:{today}"
+            
+            limit_check = await check_rate_limit(
+                key, 
+                limit=settings.BULK_IMPORT_LIMIT_PER_DAY, 
+                window_seconds=86400
+            )
+            
+            if not limit_check["allowed"]:
+                return create_rate_limit_response(
+                    status_code=429,
+                    content={
+                        "detail": {
+                            "error": "Daily import limit reached",
+                            "message": f"You can run a maximum of {settings.BULK_IMPORT_LIMIT_PER_DAY} bulk imports per day. Try again tomorrow!",
+                            "limit": limit_check["limit"],
+                            "used": limit_check["used"],
+                            "remaining": 0,
+                            "reset_at": limit_check["reset_at"]
+                        }
+                    },
+                    origin=origin
+                )
+            
+            response = await call_next(request)
+            
+            if 200 <= response.status_code < 300:
+                await increment_rate_limit(key, window_seconds=86400)
+            
+            return response
+        
+        return await call_next(request)
+    
+    if request.url.path in ("/api/query/search", "/api/query/search/stream") and request.method == "POST":
         if user_id:
             today = date.today().isoformat()
             key = f"query_limit:{user_id}:{today}"
             
-            limit_check = check_rate_limit(
+            limit_check = await check_rate_limit(
                 key, 
                 limit=settings.QUERY_LIMIT_PER_DAY, 
                 window_seconds=86400
@@ -158,7 +197,7 @@ async def rate_limit_middleware(request: Request, call_next):
             response = await call_next(request)
             
             if 200 <= response.status_code < 300:
-                increment_rate_limit(key, window_seconds=86400)
+                await increment_rate_limit(key, window_seconds=86400)
             
             return response
         
@@ -169,7 +208,7 @@ async def rate_limit_middleware(request: Request, call_next):
             today = date.today().isoformat()
             key = f"profile_update_limit:{user_id}:{today}"
             
-            limit_check = check_rate_limit(
+            limit_check = await check_rate_limit(
                 key, 
                 limit=settings.PROFILE_UPDATE_LIMIT_PER_DAY, 
                 window_seconds=86400
@@ -194,7 +233,7 @@ async def rate_limit_middleware(request: Request, call_next):
             response = await call_next(request)
             
             if 200 <= response.status_code < 300:
-                increment_rate_limit(key, window_seconds=86400)
+                await increment_rate_limit(key, window_seconds=86400)
             
             return response
         
@@ -203,7 +242,7 @@ async def rate_limit_middleware(request: Request, call_next):
     client_ip = request.client.host
     key = f"rate_limit:{client_ip}"
     
-    limit_check = check_rate_limit(
+    limit_check = await check_rate_limit(
         key, 
         limit=settings.RATE_LIMIT_PER_MINUTE, 
         window_seconds=60
@@ -220,6 +259,6 @@ async def rate_limit_middleware(request: Request, call_next):
     
     response = await call_next(request)
     
-    increment_rate_limit(key, window_seconds=60)
+    await increment_rate_limit(key, window_seconds=60)
     
     return response
\ No newline at end of file
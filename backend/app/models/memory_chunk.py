@@ -1,7 +1,7 @@
 from sqlalchemy.dialects.postgresql import JSON
 from sqlalchemy.sql import func
 import uuid
-from sqlalchemy import Column, Text, Integer, DateTime, ForeignKey, Index
+from sqlalchemy import Column, Text, Integer, DateTime, ForeignKey, Index, LargeBinary, literal_column
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from ..database import Base
@@ -15,6 +15,7 @@ class MemoryChunk(Base):
     chunk_index = Column(Integer, nullable=False)
     vector_id = Column(Text, unique=True, index=True)
     embedding_model = Column(Text)
+    embedding = Column(LargeBinary)  # packed float32, written by the embed stage
     chunk_metadata = Column(JSON)  
     char_count = Column(Integer)
     word_count = Column(Integer)
@@ -24,4 +25,10 @@ class MemoryChunk(Base):
     
     __table_args__ = (
         Index('idx_memory_order', 'memory_id', 'chunk_index'),
+        # Lexical half of hybrid retrieval (services/retrieval.py)
+        Index(
+            'idx_chunk_content_fts',
+            func.to_tsvector(literal_column("'english'"), content),
+            postgresql_using='gin'
+        ),
     )
\ No newline at end of file
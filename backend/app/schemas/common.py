@@ -1,5 +1,6 @@
+import uuid
 from datetime import datetime
-from typing import TypedDict, Optional, Literal
+from typing import NotRequired, TypedDict, Optional, Literal
 from pydantic import BaseModel, Field, ConfigDict
 from enum import Enum
 
@@ -30,16 +31,40 @@ class VisionAnalysisResult(TypedDict, total=False):
 class FileDataType(Enum):
     BASE64 = "base64"
     TEMP_FILE = "temp_file"
+    BLOB = "blob"
 
 
 class FileData(TypedDict, total=False):
     type: str  
     data: str  
     path: str  
+    key: str
     content_type: str
     extension: str
 
 
+class IngestedFile(TypedDict):
+    key: str
+    size: int
+    sha256: str
+    content_type: str
+
+
+class ImportRecord(TypedDict, total=False):
+    title: str
+    content: str
+    occasion: Optional[str]
+    emotion: Optional[str]
+    created_at: datetime
+    file: str
+
+
+class BulkImportJob(TypedDict):
+    job_id: str
+    total: int
+    memory_ids: list[str]
+
+
 class EmbeddingMetadata(TypedDict):
     user_id: str
     memory_id: str
@@ -50,6 +75,7 @@ class VectorSearchResult(TypedDict):
     distances: list[list[float]]
     metadatas: list[list[dict[str, str]]]
     documents: list[list[str]]
+    embeddings: NotRequired[list[list[list[float]]]]
 
 class CacheMetadata(TypedDict):
     query: str
@@ -64,6 +90,83 @@ class CacheStats(TypedDict):
     user_id: str
 
 
+class RecommendationCacheStats(TypedDict):
+    query_hits: int
+    exact_hits: int
+    semantic_hits: int
+    coalesced: int
+    misses: int
+    hit_rate: float
+    semantic_hit_rate: float
+
+
+class EmbeddingCacheStats(TypedDict):
+    local_hits: int
+    redis_hits: int
+    misses: int
+    hit_rate: float
+    local_entries: int
+
+
+class PreparedImage(TypedDict):
+    data: bytes
+    mime_type: str
+    detail: str
+    phash: Optional[str]
+    width: int
+    height: int
+    original_bytes: int
+    encoded_bytes: int
+    bytes_saved: int
+    decode_ms: float
+    resize_ms: float
+    encode_ms: float
+
+
+class EventPublisherStats(TypedDict):
+    published: int
+    round_trips: int
+    errors: int
+    no_subscribers: int
+    pending: int
+    avg_latency_ms: float
+    max_latency_ms: float
+
+
+class QueryLogWriterStats(TypedDict):
+    written: int
+    batches: int
+    errors: int
+    dropped: int
+    pending: int
+
+
+class ContextPassage(TypedDict):
+    memory_id: str
+    chunk_indices: list[int]
+    text: str
+
+
+class QueryCacheEntry(TypedDict):
+    response: str
+    sources: list[str]
+
+
+class QueryLogRecord(TypedDict):
+    id: uuid.UUID
+    user_id: uuid.UUID
+    query_text: str
+    query_type: str
+    retrieved_chunks: Optional[list[str]]
+    context_used: Optional[str]
+    llm_response: str
+    model_version: str
+    prompt_tokens: Optional[int]
+    completion_tokens: Optional[int]
+    latency_ms: int
+    created_at: datetime
+
+
 class CacheStatsError(TypedDict):
     error: str
 
@@ -72,6 +175,15 @@ class WebSocketMessage(TypedDict, total=False):
     event: str
     memory_id: str
     error: str
+    job_id: str
+    completed: int
+    failed: int
+    total: int
+    stream_id: str
+    delta: str
+    sources: list[str]
+    query_id: str
+    cached: bool
 
 
 class ExtractedScentResponse(BaseModel):
@@ -95,6 +207,12 @@ class MemoryUploadResponse(BaseModel):
     status: Literal["processing", "completed", "failed"] = "processing"
 
 
+class BulkImportResponse(BaseModel):
+    job_id: str
+    total: int
+    status: Literal["processing", "completed", "failed"] = "processing"
+
+
 class MemoryListItem(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
@@ -134,6 +252,11 @@ class SearchResponse(BaseModel):
     cached: bool = False
 
 
+class StreamStartResponse(BaseModel):
+    stream_id: str
+    status: Literal["streaming"] = "streaming"
+
+
 class FeedbackResponse(BaseModel):
     status: Literal["feedback recorded"] = "feedback recorded"
 
@@ -176,6 +299,34 @@ class RateLimitsResponse(BaseModel):
     profile_updates: RateLimitInfo
 
 
+class EmbeddingCacheStatsResponse(BaseModel):
+    local_hits: int
+    redis_hits: int
+    misses: int
+    hit_rate: float
+    local_entries: int
+
+
+class RecommendationCacheStatsResponse(BaseModel):
+    query_hits: int
+    exact_hits: int
+    semantic_hits: int
+    coalesced: int
+    misses: int
+    hit_rate: float
+    semantic_hit_rate: float
+
+
+class EventPublisherStatsResponse(BaseModel):
+    published: int
+    round_trips: int
+    errors: int
+    no_subscribers: int
+    pending: int
+    avg_latency_ms: float
+    max_latency_ms: float
+
+
 class HealthResponse(BaseModel):
     status: Literal["healthy", "degraded", "unhealthy"]
     version: str = "0.1.0"
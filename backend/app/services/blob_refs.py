@@ -0,0 +1,48 @@
+import logging
+import zlib
+from typing import Iterable, Optional
+from uuid import UUID
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..models import ScentMemory
+from .blob_store import BlobStore
+
+
+logger = logging.getLogger(__name__)
+
+# Upload keys are content-addressed, so identical files share one blob and
+# ScentMemory.file_path is its reference count. Adding a reference (writing
+# the blob and the row) and dropping one (checking for other holders and
+# deleting) both run under a transaction-scoped advisory lock on the key,
+# so a release can never see "no holders" while an upload of the same bytes
+# is between storing the blob and committing its row.
+BLOB_LOCK_CLASS = 7301
+BLOB_LOCK_SLOTS = 256  # keys share slots so a bulk import holds a bounded number of locks
+
+
+def lock_blob_keys(db: Session, keys: Iterable[str]) -> None:
+    # Held until the caller commits or rolls back; taken in slot order so
+    # two callers holding several slots cannot deadlock
+    for slot in sorted({zlib.crc32(key.encode()) % BLOB_LOCK_SLOTS for key in keys}):
+        db.execute(select(func.pg_advisory_xact_lock(BLOB_LOCK_CLASS, slot)))
+
+
+def release_blob(db: Session, store: BlobStore, key: str, memory_id: Optional[UUID] = None) -> None:
+    # Drops memory_id's reference (if any) and deletes the blob when no other
+    # memory holds one; commits, which also releases the lock
+    lock_blob_keys(db, [key])
+    holders = db.query(ScentMemory.id).filter(ScentMemory.file_path == key).with_for_update().all()
+    if memory_id is not None:
+        db.query(ScentMemory).filter(ScentMemory.id == memory_id, ScentMemory.file_path == key).update(
+            {ScentMemory.file_path: None}
+        )
+
+    if not any(holder.id != memory_id for holder in holders):
+        try:
+            store.delete(key)
+        except Exception:
+            logger.warning(f"Failed to delete blob {key}")
+
+    db.commit()
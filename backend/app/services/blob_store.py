@@ -0,0 +1,226 @@
+import hashlib
+import logging
+import os
+import tempfile
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, BinaryIO, Optional
+
+from ..core.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# Cached store instance
+_store: Optional["BlobStore"] = None
+
+
+def blob_key(digest: str, extension: str = "") -> str:
+    return f"{digest[:2]}/{digest}{extension}"
+
+
+# Incremental writer: bytes go straight to the backend's staging area and
+# are moved to their content-addressed key once the digest is known.
+class BlobWriter(ABC):
+
+    @abstractmethod
+    def write(self, chunk: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def commit(self, digest: str) -> str:
+        ...
+
+    @abstractmethod
+    def abort(self) -> None:
+        ...
+
+
+# Content-addressed storage for uploads, shared by API and workers
+class BlobStore(ABC):
+
+    @abstractmethod
+    def open_writer(self, extension: str = "") -> BlobWriter:
+        ...
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    def put(self, fileobj: BinaryIO, extension: str = "") -> str:
+        digest = hashlib.sha256()
+        writer = self.open_writer(extension)
+
+        try:
+            while chunk := fileobj.read(COPY_CHUNK_SIZE):
+                digest.update(chunk)
+                writer.write(chunk)
+        except Exception:
+            writer.abort()
+            raise
+
+        return writer.commit(digest.hexdigest())
+
+
+class LocalBlobWriter(BlobWriter):
+
+    def __init__(self, store: "LocalBlobStore", extension: str) -> None:
+        self.store = store
+        self.extension = extension
+        self.staging = store.root / f".staging-{uuid.uuid4()}"
+        self._file: BinaryIO = self.staging.open("wb")
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+
+    def commit(self, digest: str) -> str:
+        self._file.close()
+        key = blob_key(digest, self.extension)
+        path = self.store._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.staging, path)
+        return key
+
+    def abort(self) -> None:
+        self._file.close()
+        self.staging.unlink(missing_ok=True)
+
+
+class S3BlobWriter(BlobWriter):
+
+    def __init__(self, store: "S3BlobStore", extension: str) -> None:
+        self.store = store
+        self.extension = extension
+        # Spools to disk past 1MB; uploaded once the key is known
+        self._spool: BinaryIO = tempfile.SpooledTemporaryFile(max_size=COPY_CHUNK_SIZE)  # type: ignore[assignment]
+
+    def write(self, chunk: bytes) -> None:
+        self._spool.write(chunk)
+
+    def commit(self, digest: str) -> str:
+        key = blob_key(digest, self.extension)
+        try:
+            self._spool.seek(0)
+            self.store.client.upload_fileobj(self._spool, self.store.bucket, self.store._object_key(key))
+        finally:
+            self._spool.close()
+        return key
+
+    def abort(self) -> None:
+        self._spool.close()
+
+
+class LocalBlobStore(BlobStore):
+
+    def __init__(self, root: str) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Invalid blob key: {key}")
+        return path
+
+    def open_writer(self, extension: str = "") -> BlobWriter:
+        return LocalBlobWriter(self, extension)
+
+    def get(self, key: str) -> bytes:
+        return self._path(key).read_bytes()
+
+    def delete(self, key: str) -> None:
+        self._path(key).unlink(missing_ok=True)
+
+    def exists(self, key: str) -> bool:
+        return self._path(key).is_file()
+
+
+class S3BlobStore(BlobStore):
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        access_key_id: Optional[str] = None,
+        secret_access_key: Optional[str] = None,
+        region: Optional[str] = None,
+        prefix: str = "uploads/"
+    ) -> None:
+        try:
+            import boto3
+        except ImportError as e:
+            raise RuntimeError("boto3 is required for the S3 blob store") from e
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client: Any = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            region_name=region,
+        )
+        self._ensure_bucket()
+
+    def _ensure_bucket(self) -> None:
+        try:
+            self.client.head_bucket(Bucket=self.bucket)
+        except Exception:
+            self.client.create_bucket(Bucket=self.bucket)
+            logger.info(f"Created blob store bucket {self.bucket}")
+
+    def _object_key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def open_writer(self, extension: str = "") -> BlobWriter:
+        return S3BlobWriter(self, extension)
+
+    def get(self, key: str) -> bytes:
+        response = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        return response["Body"].read()
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except Exception:
+            return False
+
+
+def get_blob_store() -> BlobStore:
+    global _store
+
+    if _store is not None:
+        return _store
+
+    if settings.BLOB_STORE_BACKEND == "s3":
+        if not settings.S3_BUCKET:
+            raise RuntimeError("S3_BUCKET is required when BLOB_STORE_BACKEND=s3")
+        _store = S3BlobStore(
+            bucket=settings.S3_BUCKET,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            access_key_id=settings.S3_ACCESS_KEY_ID,
+            secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            region=settings.S3_REGION,
+        )
+        logger.info(f"Using S3 blob store (bucket={settings.S3_BUCKET})")
+    else:
+        _store = LocalBlobStore(settings.BLOB_STORE_PATH)
+        logger.info(f"Using local blob store at {settings.BLOB_STORE_PATH}")
+
+    return _store
+
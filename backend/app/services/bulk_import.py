@@ -0,0 +1,265 @@
+import json
+import logging
+import uuid
+import zipfile
+from datetime import datetime, timezone
+from pathlib import PurePosixPath
+from typing import Any, BinaryIO, Iterator, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.validation import sanitize_text
+from ..models import ScentMemory, MemoryType
+from ..schemas.common import BulkImportJob, ImportRecord
+from .blob_refs import lock_blob_keys, release_blob
+from .blob_store import BlobStore
+from .upload_ingest import SNIFF_BYTES, sniff_mime_type
+
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTACHMENT_SIZE = 10 * 1024 * 1024  # 10MB, same as single uploads
+MAX_TEXT_ENTRY_SIZE = 200 * 1024  # 50000 characters of UTF-8
+MAX_RECORD_SIZE = 1024 * 1024  # one JSONL line
+INSERT_CHUNK_SIZE = 1000
+
+TEXT_EXTENSIONS = {".txt", ".md"}
+
+ATTACHMENT_TYPES: dict[str, tuple[str, MemoryType]] = {
+    ".jpg": ("image/jpeg", MemoryType.PHOTO),
+    ".jpeg": ("image/jpeg", MemoryType.PHOTO),
+    ".png": ("image/png", MemoryType.PHOTO),
+    ".webp": ("image/webp", MemoryType.PHOTO),
+    ".pdf": ("application/pdf", MemoryType.PDF),
+}
+
+
+class BulkImportError(ValueError):
+    pass
+
+
+def _record_from_json(data: Any, source: str) -> ImportRecord:
+    if not isinstance(data, dict):
+        raise BulkImportError(f"{source}: expected a JSON object")
+
+    record: ImportRecord = {
+        "title": str(data.get("title") or ""),
+        "content": str(data.get("content") or ""),
+        "occasion": data.get("occasion"),
+        "emotion": data.get("emotion"),
+    }
+
+    if data.get("created_at"):
+        try:
+            created_at = datetime.fromisoformat(str(data["created_at"]))
+        except ValueError:
+            raise BulkImportError(f"{source}: invalid created_at")
+        record["created_at"] = created_at if created_at.tzinfo else created_at.replace(tzinfo=timezone.utc)
+
+    if data.get("file"):
+        record["file"] = str(data["file"])
+
+    return record
+
+
+def _read_capped(fileobj: BinaryIO, limit: int, name: str) -> bytes:
+    # Entry sizes in a zip header can lie; never decompress more than limit + 1
+    data = fileobj.read(limit + 1)
+    if len(data) > limit:
+        raise BulkImportError(f"{name}: file too large (max {limit // 1024}KB)")
+    return data
+
+
+def iter_jsonl_records(fileobj: BinaryIO, name: str = "import.jsonl") -> Iterator[ImportRecord]:
+    # readline is bounded so a single newline-free line can't be read whole
+    lines = iter(lambda: fileobj.readline(MAX_RECORD_SIZE + 1), b"")
+    for line_number, line in enumerate(lines, start=1):
+        if len(line.rstrip(b"\r\n")) > MAX_RECORD_SIZE:
+            raise BulkImportError(f"{name} line {line_number}: record too large")
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError:
+            raise BulkImportError(f"{name} line {line_number}: invalid JSON")
+        yield _record_from_json(data, f"{name} line {line_number}")
+
+
+def _store_attachment(
+    archive: zipfile.ZipFile,
+    info: zipfile.ZipInfo,
+    store: BlobStore
+) -> tuple[str, int, str]:
+    ext = PurePosixPath(info.filename).suffix.lower()
+    if ext not in ATTACHMENT_TYPES:
+        raise BulkImportError(f"{info.filename}: unsupported file type")
+    if info.file_size > MAX_ATTACHMENT_SIZE:
+        raise BulkImportError(f"{info.filename}: file too large (max 10MB)")
+
+    with archive.open(info) as f:
+        mime_type = sniff_mime_type(f.read(SNIFF_BYTES))
+    if mime_type is None or mime_type.split("/")[0] != ATTACHMENT_TYPES[ext][0].split("/")[0]:
+        raise BulkImportError(f"{info.filename}: content does not match its extension")
+
+    with archive.open(info) as f:
+        key = store.put(f, ext)
+
+    return key, info.file_size, mime_type
+
+
+def iter_zip_records(archive: zipfile.ZipFile) -> Iterator[ImportRecord]:
+    # Manifests (*.jsonl) may reference attachments via "file"; every other
+    # text, image or PDF entry becomes a memory titled after its file name.
+    entries = {
+        info.filename: info for info in archive.infolist()
+        if not info.is_dir()
+        and not info.filename.startswith("__MACOSX/")
+        and not PurePosixPath(info.filename).name.startswith(".")
+    }
+    referenced: set[str] = set()
+
+    for name, info in entries.items():
+        if PurePosixPath(name).suffix.lower() != ".jsonl":
+            continue
+        with archive.open(info) as f:
+            for record in iter_jsonl_records(f, name):
+                if "file" in record:
+                    # Paths are relative to the manifest
+                    path = str(PurePosixPath(name).parent / record["file"])
+                    if path not in entries:
+                        raise BulkImportError(f"{name}: referenced file {record['file']} not found")
+                    record["file"] = path
+                    referenced.add(path)
+                yield record
+
+    for name, info in entries.items():
+        path = PurePosixPath(name)
+        ext = path.suffix.lower()
+        if ext == ".jsonl" or name in referenced:
+            continue
+
+        if ext in TEXT_EXTENSIONS:
+            if info.file_size > MAX_TEXT_ENTRY_SIZE:
+                raise BulkImportError(f"{name}: file too large (max {MAX_TEXT_ENTRY_SIZE // 1024}KB)")
+            with archive.open(info) as f:
+                content = _read_capped(f, MAX_TEXT_ENTRY_SIZE, name).decode("utf-8", errors="replace")
+            yield {"title": path.stem, "content": content, "occasion": None, "emotion": None}
+        elif ext in ATTACHMENT_TYPES:
+            yield {"title": path.stem, "content": "", "occasion": None, "emotion": None, "file": name}
+        else:
+            logger.info(f"Skipping unsupported import entry {name}")
+
+
+def _memory_row(
+    record: ImportRecord,
+    user_id: uuid.UUID,
+    job_id: str,
+    source: str
+) -> dict[str, Any]:
+    try:
+        content = sanitize_text(record["content"], max_length=50000)
+        title = sanitize_text(record["title"], max_length=255) or content[:60] or "Imported memory"
+        occasion = sanitize_text(record["occasion"], max_length=100) if record.get("occasion") else None
+        emotion = sanitize_text(record["emotion"], max_length=100) if record.get("emotion") else None
+    except HTTPException as e:
+        raise BulkImportError(f"{source}: {e.detail}")
+
+    row: dict[str, Any] = {
+        "id": uuid.uuid4(),
+        "user_id": user_id,
+        "title": title,
+        "content": content,
+        "memory_type": MemoryType.TEXT,
+        "occasion": occasion,
+        "emotion": emotion,
+        "file_path": None,
+        "file_size": None,
+        "mime_type": None,
+        "processed": False,
+        "chunk_metadata": {"import_job": job_id},
+        # Same keys on every row keeps the whole chunk in one multi-row INSERT
+        "created_at": record.get("created_at") or datetime.now(timezone.utc),
+    }
+
+    return row
+
+
+def create_import(
+    db: Session,
+    user_id: uuid.UUID,
+    fileobj: BinaryIO,
+    store: BlobStore
+) -> BulkImportJob:
+    job_id = str(uuid.uuid4())
+    rows: list[dict[str, Any]] = []
+    stored: dict[str, zipfile.ZipInfo] = {}
+    archive: Optional[zipfile.ZipFile] = None
+
+    try:
+        if zipfile.is_zipfile(fileobj):
+            fileobj.seek(0)
+            archive = zipfile.ZipFile(fileobj)
+            records: Iterator[ImportRecord] = iter_zip_records(archive)
+        else:
+            fileobj.seek(0)
+            records = iter_jsonl_records(fileobj)
+
+        for n, record in enumerate(records, start=1):
+            if n > settings.BULK_IMPORT_MAX_MEMORIES:
+                raise BulkImportError(f"Import exceeds {settings.BULK_IMPORT_MAX_MEMORIES} memories")
+
+            row = _memory_row(record, user_id, job_id, f"Record {n}")
+
+            if "file" in record:
+                if archive is None:
+                    raise BulkImportError(f"Record {n}: attachments require a zip import")
+                info = archive.getinfo(record["file"])
+                key, size, mime_type = _store_attachment(archive, info, store)
+                stored[key] = info
+                row["memory_type"] = ATTACHMENT_TYPES[PurePosixPath(record["file"]).suffix.lower()][1]
+                row["file_path"] = key
+                row["file_size"] = size
+                row["mime_type"] = mime_type
+
+            rows.append(row)
+
+        if not rows:
+            raise BulkImportError("Import contains no memories")
+
+        # Blob keys are content-addressed and may be shared with other
+        # memories. Under their locks, put back any blob a worker released
+        # since it was stored; the rows then hold it from the commit on
+        lock_blob_keys(db, stored)
+        for key, info in stored.items():
+            if not store.exists(key) and archive is not None:
+                with archive.open(info) as f:
+                    store.put(f, PurePosixPath(info.filename).suffix.lower())
+
+        # Multi-row INSERTs instead of one ORM flush per memory
+        for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+            db.execute(insert(ScentMemory), rows[start:start + INSERT_CHUNK_SIZE])
+        db.commit()
+
+    except Exception as e:
+        db.rollback()
+        # Only blobs no other memory references are deleted
+        for key in stored:
+            try:
+                release_blob(db, store, key)
+            except Exception:
+                db.rollback()
+                logger.warning(f"Failed to release blob {key} of failed import {job_id}")
+        if isinstance(e, zipfile.BadZipFile):
+            raise BulkImportError("Invalid zip archive") from e
+        raise
+
+    logger.info(f"Created import {job_id} with {len(rows)} memories for user {user_id}")
+
+    return {
+        "job_id": job_id,
+        "total": len(rows),
+        "memory_ids": [str(row["id"]) for row in rows],
+    }
@@ -1,13 +1,19 @@
 import hashlib
 import json
 import logging
+import threading
+import time
+import uuid
 from datetime import datetime
-from typing import Optional, Union
+from typing import Iterable, Optional, Union
 
+import numpy as np
 import redis
+import redis.asyncio as aioredis
 
 from ..core.config import settings
-from ..schemas.common import CacheStats, CacheStatsError
+from ..schemas.common import CacheStats, CacheStatsError, QueryCacheEntry, RecommendationCacheStats
+from .embedding_cache import normalize_text, pack_embedding
 
 
 logger = logging.getLogger(__name__)
@@ -19,98 +25,330 @@ redis_client: redis.Redis = redis.Redis.from_url(  # type: ignore[type-arg]
     socket_timeout=5
 )
 
+# The search route is async; lookups and writes on its path use this client
+async_redis_client: aioredis.Redis = aioredis.Redis.from_url(  # type: ignore[type-arg]
+    settings.redis_url_computed,
+    decode_responses=True,
+    socket_connect_timeout=5,
+    socket_timeout=5
+)
+
+# Semantic index values are packed float32 query embeddings, not text
+async_binary_redis_client: aioredis.Redis = aioredis.Redis.from_url(  # type: ignore[type-arg]
+    settings.redis_url_computed,
+    decode_responses=False,
+    socket_connect_timeout=5,
+    socket_timeout=5
+)
+
+_stats_lock = threading.Lock()
+_stats: dict[str, int] = {"query_hits": 0, "exact_hits": 0, "semantic_hits": 0, "coalesced": 0, "misses": 0}
+
+
+def _count(stat: str) -> None:
+    with _stats_lock:
+        _stats[stat] += 1
+
+
+# Every recommendation cache key carries the user's data version, so bumping
+# it (one INCR) orphans all of that user's entries at once; they expire by TTL
+DATA_VERSION_TTL = 30 * 24 * 3600  # outlives every cache entry keyed on it
+
+# First-level lookup in one round trip: read the user's data version and the
+# (user, query) entry together, before any embedding or vector search. The
+# entry records the version it was stored under, so both keys are known up
+# front. Returns {version, entry-or-nil}.
+QUERY_CACHE_LOOKUP_SCRIPT = """
+return {redis.call('GET', KEYS[1]) or '0', redis.call('GET', KEYS[2])}
+"""
+_query_cache_lookup = async_redis_client.register_script(QUERY_CACHE_LOOKUP_SCRIPT)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(normalize_text(query).casefold().split())
+
+
+def _query_hash(query: str) -> str:
+    return hashlib.md5(normalize_query(query).encode()).hexdigest()
+
+
+def get_data_version_key(user_id: str) -> str:
+    return f"data_version:{user_id}"
 
-def get_cache_key(cache_key_data: str, user_id: str) -> str:
+
+def get_query_cache_key(user_id: str, query: str) -> str:
+    return f"qrec:{user_id}:{_query_hash(query)}"
+
+
+def get_user_data_version(user_id: str) -> str:
+    version: Optional[str] = redis_client.get(get_data_version_key(user_id))  # type: ignore[assignment]
+    return version or "0"
+
+
+def bump_user_data_version(user_id: str) -> None:
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.incr(get_data_version_key(user_id))
+        pipe.expire(get_data_version_key(user_id), DATA_VERSION_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Data version bump failed: {e}")
+
+
+async def get_query_cached_recommendation(
+    user_id: str,
+    query: str
+) -> tuple[Optional[str], Optional[QueryCacheEntry]]:
+    # A None version means Redis is unavailable and the caller skips caching
+    try:
+        version, cached = await _query_cache_lookup(
+            keys=[get_data_version_key(user_id), get_query_cache_key(user_id, query)]
+        )
+        if cached:
+            stored = json.loads(cached)
+            # Entries from before the user's data last changed are orphaned
+            if stored["version"] == version:
+                logger.info(f"Query cache hit for user {user_id}")
+                _count("query_hits")
+                return version, stored["entry"]
+        return version, None
+    except Exception as e:
+        logger.warning(f"Query cache retrieval failed: {e}")
+    return None, None
+
+
+async def cache_query_recommendation(
+    user_id: str,
+    version: str,
+    query: str,
+    entry: QueryCacheEntry,
+    ttl: int = 3600
+) -> None:
+    # Tagged with the version read before retrieval: if the user's data
+    # changed meanwhile, the entry is already orphaned
+    try:
+        key = get_query_cache_key(user_id, query)
+        await async_redis_client.setex(key, ttl, json.dumps({"version": version, "entry": entry}))
+    except Exception as e:
+        logger.warning(f"Query cache storage failed: {e}")
+
+
+def get_user_index_key(user_id: str, version: str) -> str:
+    return f"rec_idx:{user_id}:{version}"
+
+
+def _entry_keys(user_id: str, version: str, cache_hashes: Iterable[str]) -> list[str]:
+    keys: list[str] = []
+    for cache_hash in cache_hashes:
+        keys.append(f"rec:{user_id}:{version}:{cache_hash}")
+        keys.append(f"rec_meta:{user_id}:{version}:{cache_hash}")
+    return keys
+
+
+def get_semantic_index_key(user_id: str, version: str) -> str:
+    return f"rec_sem:{user_id}:{version}"
+
+
+def get_cache_key(cache_key_data: str, user_id: str, version: str) -> str:
     hash_key = hashlib.md5(cache_key_data.encode()).hexdigest()
-    return f"rec:{user_id}:{hash_key}"
+    return f"rec:{user_id}:{version}:{hash_key}"
 
 
-def get_cached_recommendation(cache_key_data: str, user_id: str) -> Optional[str]:
+async def get_cached_recommendation(cache_key_data: str, user_id: str, version: str) -> Optional[str]:
     try:
-        cache_key = get_cache_key(cache_key_data, user_id)
-        cached = redis_client.get(cache_key)
+        cache_key = get_cache_key(cache_key_data, user_id, version)
+        cached = await async_redis_client.get(cache_key)
         if cached:
             logger.info(f"Exact cache hit: {cache_key}")
+            _count("exact_hits")
             return cached
     except Exception as e:
         logger.warning(f"Cache retrieval failed: {e}")
     return None
 
 
-def cache_recommendation(
+async def cache_recommendation(
     cache_key_data: str,
     recommendation: str,
     query: str,
     user_id: str,
+    version: str,
     context_preview: str = "",
-    ttl: int = 3600
+    ttl: int = 3600,
+    query_embedding: Optional[list[float]] = None
 ) -> None:
 
     try:
-        cache_key = get_cache_key(cache_key_data, user_id)
-        redis_client.setex(cache_key, ttl, recommendation)
-        meta_key = f"rec_meta:{user_id}:{cache_key.split(':')[-1]}"
+        cache_key = get_cache_key(cache_key_data, user_id, version)
+        cache_hash = cache_key.split(':')[-1]
+        meta_key = f"rec_meta:{user_id}:{version}:{cache_hash}"
         metadata = {
             "query": query,
             "context_preview": context_preview,
             "timestamp": datetime.utcnow().isoformat(),
             "cache_key": cache_key
         }
-        redis_client.setex(meta_key, ttl, json.dumps(metadata))
+
+        # Entry, metadata and the user's index in one round trip. The index
+        # outlives every entry it lists, since each write refreshes its TTL
+        pipe = async_redis_client.pipeline(transaction=False)
+        pipe.setex(cache_key, ttl, recommendation)
+        pipe.setex(meta_key, ttl, json.dumps(metadata))
+        pipe.sadd(get_user_index_key(user_id, version), cache_hash)
+        pipe.expire(get_user_index_key(user_id, version), ttl)
+        await pipe.execute()
+
+        if query_embedding is not None:
+            await _index_query_embedding(user_id, version, cache_hash, query_embedding, ttl)
 
         logger.info(f"Cached recommendation: {cache_key}")
     except Exception as e:
         logger.warning(f"Cache storage failed: {e}")
 
 
-def find_similar_cached_query(
-    query: str,
+async def _index_query_embedding(
     user_id: str,
-    threshold: float = 0.85
-) -> Optional[str]:
+    version: str,
+    cache_hash: str,
+    query_embedding: list[float],
+    ttl: int
+) -> None:
+    # One hash per user, field = rec: key hash, value = packed float32 vector.
+    # Fields outlive their rec: entries until looked up or evicted; the hash
+    # itself expires with the newest entry
+    index_key = get_semantic_index_key(user_id, version)
+    pipe = async_binary_redis_client.pipeline(transaction=False)
+    pipe.hset(index_key, cache_hash, pack_embedding(query_embedding))
+    pipe.expire(index_key, ttl)
+    pipe.hlen(index_key)
+    _, _, size = await pipe.execute()
+
+    excess = size - settings.SEMANTIC_CACHE_MAX_ENTRIES
+    if excess > 0:
+        evicted = await async_binary_redis_client.hrandfield(index_key, excess)
+        if evicted:
+            await async_binary_redis_client.hdel(index_key, *evicted)
+
+
+# Release the single-flight lock only if this request still owns it, and
+# hand the result (empty on failure) to every request waiting on it
+INFLIGHT_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+return redis.call('PUBLISH', KEYS[2], ARGV[2])
+"""
+_inflight_release = async_redis_client.register_script(INFLIGHT_RELEASE_SCRIPT)
+
+
+def _inflight_keys(cache_key: str) -> tuple[str, str]:
+    return f"inflight:{cache_key}", f"inflight_done:{cache_key}"
+
+
+async def acquire_inflight(cache_key: str) -> Optional[str]:
+    # Returns a token when this request should produce the answer, or None
+    # when an identical request on any node already is
+    token = uuid.uuid4().hex
+    lock_key, _ = _inflight_keys(cache_key)
+    try:
+        acquired = await async_redis_client.set(lock_key, token, nx=True, ex=settings.SINGLE_FLIGHT_LOCK_TTL)
+        return token if acquired else None
+    except Exception as e:
+        logger.warning(f"Single-flight lock failed: {e}")
+    return token
+
+
+async def release_inflight(cache_key: str, token: str, response: Optional[str]) -> None:
     try:
-        pattern = f"rec_meta:{user_id}:*"
-        meta_keys: list[str] = redis_client.keys(pattern) 
+        await _inflight_release(keys=list(_inflight_keys(cache_key)), args=[token, response or ""])
+    except Exception as e:
+        logger.warning(f"Single-flight release failed: {e}")
+
+
+async def wait_for_inflight(cache_key: str, timeout: Optional[float] = None) -> Optional[str]:
+    # None means the other request failed or timed out; the caller then
+    # generates the answer itself
+    if timeout is None:
+        timeout = settings.SINGLE_FLIGHT_WAIT_SECONDS
 
-        if not meta_keys:
-            return None
+    lock_key, channel = _inflight_keys(cache_key)
+    try:
+        pubsub = async_redis_client.pubsub()
+        try:
+            await pubsub.subscribe(channel)
+
+            # The result may have landed before the subscription did
+            pipe = async_redis_client.pipeline(transaction=False)
+            pipe.get(cache_key)
+            pipe.exists(lock_key)
+            cached, locked = await pipe.execute()
+            if cached or not locked:
+                if cached:
+                    _count("coalesced")
+                return cached or None
+
+            deadline = time.monotonic() + timeout
+            while (remaining := deadline - time.monotonic()) > 0:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+                if message:
+                    if message["data"]:
+                        logger.info(f"Reused in-flight recommendation: {cache_key}")
+                        _count("coalesced")
+                    return message["data"] or None
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.close()
+    except Exception as e:
+        logger.warning(f"Single-flight wait failed: {e}")
 
-        query_lower = query.lower()
-        query_words = set(query_lower.split())
+    return None
 
-        best_match: Optional[str] = None
-        best_similarity: float = 0.0
 
-        for meta_key in meta_keys[:50]:
-            try:
-                meta_json = redis_client.get(meta_key)
-                if not meta_json:
-                    continue
+def _nearest(
+    entries: dict[bytes, bytes],
+    query_embedding: list[float]
+) -> tuple[Optional[str], float]:
+    query = np.asarray(query_embedding, dtype=np.float32)
+    width = query.nbytes
+    # Vectors from another embedding model have a different width; skip them
+    fields = [field for field, data in entries.items() if len(data) == width]
+    if not fields:
+        return None, 0.0
 
-                meta = json.loads(meta_json)
-                cached_query: str = meta['query'].lower()
-                cached_words = set(cached_query.split())
+    matrix = np.frombuffer(b"".join(entries[f] for f in fields), dtype=np.float32).reshape(len(fields), -1)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    similarities = (matrix @ query) / np.where(norms == 0, 1.0, norms)
 
-                intersection = query_words & cached_words
-                union = query_words | cached_words
+    best = int(np.argmax(similarities))
+    return fields[best].decode(), float(similarities[best])
 
-                if len(union) == 0:
-                    continue
 
-                similarity = len(intersection) / len(union)
+async def find_similar_cached_query(
+    query_embedding: list[float],
+    user_id: str,
+    version: str,
+    threshold: Optional[float] = None
+) -> Optional[str]:
+    # Nearest cached query by cosine similarity: one HGETALL for the user's
+    # vectors, compared in a single matrix product, then one GET on a hit
+    if threshold is None:
+        threshold = settings.SEMANTIC_CACHE_THRESHOLD
 
-                if similarity > best_similarity and similarity >= threshold:
-                    best_similarity = similarity
-                    best_match = meta['cache_key']
+    try:
+        index_key = get_semantic_index_key(user_id, version)
+        entries: dict[bytes, bytes] = await async_binary_redis_client.hgetall(index_key)
 
-            except Exception as e:
-                logger.warning(f"Error processing meta key {meta_key}: {e}")
-                continue
+        if entries:
+            cache_hash, similarity = _nearest(entries, query_embedding)
 
-        if best_match:
-            logger.info(f"Similar query found (similarity: {best_similarity:.2f})")
-            cached_response = redis_client.get(best_match)
-            return cached_response
+            if cache_hash and similarity >= threshold:
+                cached_response = await async_redis_client.get(f"rec:{user_id}:{version}:{cache_hash}")
+                if cached_response:
+                    logger.info(f"Similar query found (similarity: {similarity:.3f})")
+                    _count("semantic_hits")
+                    return cached_response
+                # The entry expired before its index field did
+                await async_binary_redis_client.hdel(index_key, cache_hash)
 
     except Exception as e:
         logger.warning(f"Similar query search failed: {e}")
@@ -119,34 +357,65 @@ def find_similar_cached_query(
 
 
 def invalidate_user_recommendations(user_id: str) -> None:
+    # Constant time however much is cached: entries under the old version
+    # are never read again and expire on their own
+    bump_user_data_version(user_id)
 
-    try:
-        rec_pattern = f"rec:{user_id}:*"
-        rec_keys: list[str] = redis_client.keys(rec_pattern)  # type: ignore[assignment]
 
-        meta_pattern = f"rec_meta:{user_id}:*"
-        meta_keys: list[str] = redis_client.keys(meta_pattern) 
+def get_cache_stats(user_id: str) -> Union[CacheStats, CacheStatsError]:
 
-        all_keys = rec_keys + meta_keys
+    try:
+        version = get_user_data_version(user_id)
+        index_key = get_user_index_key(user_id, version)
+        cache_hashes = sorted(redis_client.smembers(index_key))  # type: ignore[arg-type]
 
-        if all_keys:
-            redis_client.delete(*all_keys)
-            logger.info(f"Invalidated {len(all_keys)} cached entries for user {user_id}")
-    except Exception as e:
-        logger.warning(f"Cache invalidation failed: {e}")
+        pipe = redis_client.pipeline(transaction=False)
+        for key in _entry_keys(user_id, version, cache_hashes):
+            pipe.exists(key)
+        exists: list[int] = pipe.execute() if cache_hashes else []
 
+        rec_exists = exists[0::2]
+        meta_exists = exists[1::2]
 
-def get_cache_stats(user_id: str) -> Union[CacheStats, CacheStatsError]:
-
-    try:
-        rec_keys: list[str] = redis_client.keys(f"rec:{user_id}:*") 
-        meta_keys: list[str] = redis_client.keys(f"rec_meta:{user_id}:*") 
+        # Entries expire on their own; drop the index members they leave behind
+        expired = [h for h, rec, meta in zip(cache_hashes, rec_exists, meta_exists) if not rec and not meta]
+        if expired:
+            redis_client.srem(index_key, *expired)
 
         return {
-            "cached_recommendations": len(rec_keys),
-            "metadata_entries": len(meta_keys),
+            "cached_recommendations": sum(rec_exists),
+            "metadata_entries": sum(meta_exists),
             "user_id": user_id
         }
     except Exception as e:
         logger.warning(f"Cache stats retrieval failed: {e}")
         return {"error": str(e)}
+
+
+def record_cache_miss() -> None:
+    # Once per request, when it has fallen through every cache level and the
+    # single-flight wait; a lookup that misses but then coalesces is a hit
+    _count("misses")
+
+
+def get_recommendation_cache_stats() -> RecommendationCacheStats:
+    with _stats_lock:
+        hits = _stats["query_hits"] + _stats["exact_hits"] + _stats["semantic_hits"] + _stats["coalesced"]
+        lookups = hits + _stats["misses"]
+        # Coalesced requests missed the semantic cache before waiting
+        semantic_lookups = _stats["semantic_hits"] + _stats["coalesced"] + _stats["misses"]
+        return {
+            "query_hits": _stats["query_hits"],
+            "exact_hits": _stats["exact_hits"],
+            "semantic_hits": _stats["semantic_hits"],
+            "coalesced": _stats["coalesced"],
+            "misses": _stats["misses"],
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "semantic_hit_rate": _stats["semantic_hits"] / semantic_lookups if semantic_lookups else 0.0,
+        }
+
+
+def reset_recommendation_cache_stats() -> None:
+    with _stats_lock:
+        for stat in _stats:
+            _stats[stat] = 0
@@ -0,0 +1,82 @@
+import logging
+import uuid
+from typing import Any
+
+from sqlalchemy import case, delete, null
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from ..models import MemoryChunk
+from .embeddings import EMBEDDING_MODEL
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+CHUNK_STEP = 450  # 50 characters of overlap
+
+
+def split_into_chunks(content: str) -> list[str]:
+    return [content[i:i + CHUNK_SIZE] for i in range(0, len(content), CHUNK_STEP)]
+
+
+def chunk_id(memory_id: uuid.UUID, chunk_index: int) -> uuid.UUID:
+    # Deterministic per (memory, index): re-extraction overwrites the same rows
+    # and the same Chroma ids instead of minting new ones
+    return uuid.uuid5(memory_id, str(chunk_index))
+
+
+def write_chunks(db: Session, memory_id: uuid.UUID, texts: list[str]) -> int:
+    rows: list[dict[str, Any]] = []
+    for idx, text in enumerate(texts):
+        id_ = chunk_id(memory_id, idx)
+        rows.append({
+            "id": id_,
+            "memory_id": memory_id,
+            "content": text,
+            "chunk_index": idx,
+            "embedding_model": EMBEDDING_MODEL,
+            "char_count": len(text),
+            "word_count": len(text.split()),
+        })
+
+    # Chunks left over from a longer previous extraction (or written before
+    # ids were deterministic) go away in one DELETE; their vectors are removed
+    # by the index stage, after this transaction has committed
+    stale = delete(MemoryChunk).where(MemoryChunk.memory_id == memory_id)
+    if rows:
+        stale = stale.where(MemoryChunk.id.not_in([row["id"] for row in rows]))
+    removed = db.execute(stale, execution_options={"synchronize_session": "fetch"}).rowcount
+
+    if rows:
+        # Rendered as one multi-row INSERT ... RETURNING for the whole memory;
+        # populate_existing keeps chunks already loaded in the session current
+        stmt = pg_insert(MemoryChunk)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[MemoryChunk.id],
+            set_={
+                "content": stmt.excluded.content,
+                "embedding_model": stmt.excluded.embedding_model,
+                "char_count": stmt.excluded.char_count,
+                "word_count": stmt.excluded.word_count,
+                # Re-extracted text needs a fresh vector from the embed stage,
+                # and is not indexed until the index stage upserts it
+                "embedding": case(
+                    (MemoryChunk.content == stmt.excluded.content, MemoryChunk.embedding),
+                    else_=null()
+                ),
+                "vector_id": case(
+                    (MemoryChunk.content == stmt.excluded.content, MemoryChunk.vector_id),
+                    else_=null()
+                ),
+            }
+        )
+        db.scalars(
+            stmt.returning(MemoryChunk),
+            rows,
+            execution_options={"populate_existing": True}
+        ).all()
+
+    logger.info(f"Wrote {len(rows)} chunks for memory {memory_id}, removed {removed} stale")
+
+    return removed
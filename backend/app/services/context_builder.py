@@ -0,0 +1,111 @@
+import logging
+from functools import lru_cache
+from typing import Optional, Sequence
+
+import tiktoken
+
+from ..core.config import settings
+from ..models import MemoryChunk
+from ..schemas.common import ContextPassage
+from .chunk_writer import CHUNK_SIZE, CHUNK_STEP
+
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_MODEL = "gpt-4"
+CHUNK_OVERLAP = CHUNK_SIZE - CHUNK_STEP
+PASSAGE_PREFIX = "Memory: "
+PASSAGE_SEPARATOR = "\n\n"
+MIN_TRUNCATED_TOKENS = 50  # a shorter tail isn't worth its place in the prompt
+
+
+@lru_cache(maxsize=1)
+def _encoding() -> Optional[tiktoken.Encoding]:
+    # The BPE file is downloaded on first use unless TIKTOKEN_CACHE_DIR has it;
+    # without it, token counts are estimated rather than failing the search
+    try:
+        return tiktoken.encoding_for_model(CONTEXT_MODEL)
+    except Exception as e:
+        logger.warning(f"Tokenizer unavailable, estimating context tokens: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    encoding = _encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text)[:max_tokens])
+
+
+def _join_overlapping(left: str, right: str) -> str:
+    # Consecutive chunks are windows that share CHUNK_OVERLAP characters
+    overlap = min(CHUNK_OVERLAP, len(right))
+    if overlap and left.endswith(right[:overlap]):
+        return left + right[overlap:]
+    return f"{left} {right}"
+
+
+def merge_chunks(chunks: Sequence[MemoryChunk]) -> list[ContextPassage]:
+    # chunks arrive in relevance order. Memories keep the rank of their best
+    # chunk; within a memory, runs of consecutive chunk indices become one
+    # passage in document order
+    by_memory: dict[str, list[MemoryChunk]] = {}
+    for chunk in chunks:
+        by_memory.setdefault(str(chunk.memory_id), []).append(chunk)
+
+    passages: list[ContextPassage] = []
+    for memory_id, memory_chunks in by_memory.items():
+        current: Optional[ContextPassage] = None
+        for chunk in sorted(memory_chunks, key=lambda c: c.chunk_index):
+            if current and chunk.chunk_index == current["chunk_indices"][-1] + 1:
+                current["text"] = _join_overlapping(current["text"], chunk.content)
+                current["chunk_indices"].append(chunk.chunk_index)
+            else:
+                current = {"memory_id": memory_id, "chunk_indices": [chunk.chunk_index], "text": chunk.content}
+                passages.append(current)
+
+    return passages
+
+
+def build_context(
+    chunks: Sequence[MemoryChunk],
+    token_budget: Optional[int] = None
+) -> tuple[str, list[ContextPassage]]:
+    if token_budget is None:
+        token_budget = settings.CONTEXT_TOKEN_BUDGET
+
+    separator_tokens = count_tokens(PASSAGE_SEPARATOR)
+    parts: list[str] = []
+    packed: list[ContextPassage] = []
+    used = 0
+
+    for passage in merge_chunks(chunks):
+        block = f"{PASSAGE_PREFIX}{passage['text']}"
+        separator = separator_tokens if parts else 0
+        cost = count_tokens(block) + separator
+
+        if used + cost <= token_budget:
+            parts.append(block)
+            packed.append(passage)
+            used += cost
+            continue
+
+        # Less relevant passages may still fit whole; only cut one when the
+        # remainder of the budget is worth filling
+        remaining = token_budget - used - separator
+        if remaining >= MIN_TRUNCATED_TOKENS:
+            parts.append(truncate_to_tokens(block, remaining))
+            packed.append(passage)
+            used = token_budget
+            break
+
+    logger.info(f"Packed {len(packed)} passages from {len(chunks)} chunks into {used}/{token_budget} tokens")
+
+    return PASSAGE_SEPARATOR.join(parts), packed
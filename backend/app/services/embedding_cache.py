@@ -0,0 +1,194 @@
+import hashlib
+import logging
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from ..core.config import settings
+from ..schemas.common import EmbeddingCacheStats
+
+
+logger = logging.getLogger(__name__)
+
+# Binary client: vectors are stored as packed float32 bytes, not JSON
+redis_client: redis.Redis = redis.Redis.from_url(  # type: ignore[type-arg]
+    settings.redis_url_computed,
+    decode_responses=False,
+    socket_connect_timeout=5,
+    socket_timeout=5
+)
+
+# Same cache for async routes, so lookups don't block the event loop
+async_redis_client: aioredis.Redis = aioredis.Redis.from_url(  # type: ignore[type-arg]
+    settings.redis_url_computed,
+    decode_responses=False,
+    socket_connect_timeout=5,
+    socket_timeout=5
+)
+
+_lock = threading.Lock()
+_local: "OrderedDict[str, bytes]" = OrderedDict()
+_stats: dict[str, int] = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+
+
+def normalize_text(text: str) -> str:
+    return unicodedata.normalize("NFC", text).strip()
+
+
+def get_embedding_cache_key(model: str, text: str) -> str:
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"emb:{model}:{digest}"
+
+
+def pack_embedding(embedding: list[float]) -> bytes:
+    return array("f", embedding).tobytes()
+
+
+def unpack_embedding(data: bytes) -> list[float]:
+    values = array("f")
+    values.frombytes(data)
+    return values.tolist()
+
+
+def _local_get(key: str) -> Optional[bytes]:
+    with _lock:
+        data = _local.get(key)
+        if data is not None:
+            _local.move_to_end(key)
+        return data
+
+
+def _local_set(key: str, data: bytes) -> None:
+    with _lock:
+        _local[key] = data
+        _local.move_to_end(key)
+        while len(_local) > settings.EMBEDDING_CACHE_SIZE:
+            _local.popitem(last=False)
+
+
+def _count(stat: str, amount: int = 1) -> None:
+    with _lock:
+        _stats[stat] += amount
+
+
+def _lookup_local(
+    keys: list[str]
+) -> tuple[list[Optional[list[float]]], list[int]]:
+    results: list[Optional[list[float]]] = [None] * len(keys)
+    remote: list[int] = []
+
+    for i, key in enumerate(keys):
+        data = _local_get(key)
+        if data is not None:
+            results[i] = unpack_embedding(data)
+        else:
+            remote.append(i)
+
+    _count("local_hits", len(keys) - len(remote))
+    return results, remote
+
+
+def _apply_remote(
+    keys: list[str],
+    results: list[Optional[list[float]]],
+    remote: list[int],
+    values: list[Optional[bytes]]
+) -> None:
+    redis_hits = 0
+    for i, data in zip(remote, values):
+        if data:
+            _local_set(keys[i], data)
+            results[i] = unpack_embedding(data)
+            redis_hits += 1
+
+    _count("redis_hits", redis_hits)
+    _count("misses", len(remote) - redis_hits)
+
+
+def get_cached_embeddings(model: str, texts: list[str]) -> list[Optional[list[float]]]:
+    keys = [get_embedding_cache_key(model, text) for text in texts]
+    results, remote = _lookup_local(keys)
+
+    if remote:
+        try:
+            values = redis_client.mget([keys[i] for i in remote])
+        except Exception as e:
+            logger.warning(f"Embedding cache retrieval failed: {e}")
+            values = [None] * len(remote)
+
+        _apply_remote(keys, results, remote, values)
+
+    return results
+
+
+async def get_cached_embeddings_async(model: str, texts: list[str]) -> list[Optional[list[float]]]:
+    keys = [get_embedding_cache_key(model, text) for text in texts]
+    results, remote = _lookup_local(keys)
+
+    if remote:
+        try:
+            values = await async_redis_client.mget([keys[i] for i in remote])
+        except Exception as e:
+            logger.warning(f"Embedding cache retrieval failed: {e}")
+            values = [None] * len(remote)
+
+        _apply_remote(keys, results, remote, values)
+
+    return results
+
+
+def cache_embeddings(model: str, texts: list[str], embeddings: list[list[float]]) -> None:
+    if not texts:
+        return
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for text, embedding in zip(texts, embeddings):
+            key = get_embedding_cache_key(model, text)
+            data = pack_embedding(embedding)
+            _local_set(key, data)
+            pipe.setex(key, settings.EMBEDDING_CACHE_TTL, data)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Embedding cache storage failed: {e}")
+
+
+async def cache_embeddings_async(model: str, texts: list[str], embeddings: list[list[float]]) -> None:
+    if not texts:
+        return
+
+    try:
+        pipe = async_redis_client.pipeline(transaction=False)
+        for text, embedding in zip(texts, embeddings):
+            key = get_embedding_cache_key(model, text)
+            data = pack_embedding(embedding)
+            _local_set(key, data)
+            pipe.setex(key, settings.EMBEDDING_CACHE_TTL, data)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Embedding cache storage failed: {e}")
+
+
+def get_embedding_cache_stats() -> EmbeddingCacheStats:
+    with _lock:
+        hits = _stats["local_hits"] + _stats["redis_hits"]
+        lookups = hits + _stats["misses"]
+        return {
+            "local_hits": _stats["local_hits"],
+            "redis_hits": _stats["redis_hits"],
+            "misses": _stats["misses"],
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "local_entries": len(_local),
+        }
+
+
+def clear_local_cache() -> None:
+    with _lock:
+        _local.clear()
+        for stat in _stats:
+            _stats[stat] = 0
@@ -1,11 +1,137 @@
-from openai import OpenAI
+from typing import Optional
+
+from openai import AsyncOpenAI, OpenAI
+from openai.types import Embedding
 from ..core.config import settings
+from .openai_limits import async_openai_slot, openai_slot
+from .embedding_cache import (
+    cache_embeddings,
+    cache_embeddings_async,
+    get_cached_embeddings,
+    get_cached_embeddings_async,
+    normalize_text
+)
 
 client = OpenAI(api_key=settings.OPENAI_API_KEY)
+async_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
 
 def generate_embedding(text: str) -> list[float]:
-    response = client.embeddings.create(
-        model="text-embedding-3-small",
-        input=text
-    )
-    return response.data[0].embedding
\ No newline at end of file
+    return generate_embeddings([text])[0]
+
+
+async def generate_embedding_async(text: str) -> list[float]:
+    return (await generate_embeddings_async([text]))[0]
+
+
+def _batch_texts(texts: list[str]) -> list[list[str]]:
+    # OpenAI caps a request at 2048 inputs and ~300k tokens, so batches are
+    # bounded by both item count and total characters.
+    batches: list[list[str]] = []
+    current: list[str] = []
+    current_chars = 0
+
+    for text in texts:
+        if current and (
+            len(current) >= settings.EMBEDDING_BATCH_SIZE
+            or current_chars + len(text) > settings.EMBEDDING_BATCH_MAX_CHARS
+        ):
+            batches.append(current)
+            current = []
+            current_chars = 0
+        current.append(text)
+        current_chars += len(text)
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _ordered(data: list[Embedding], expected: int) -> list[list[float]]:
+    # Results are matched to inputs by index; a short response must not shift them
+    if len(data) != expected:
+        raise RuntimeError(f"Expected {expected} embeddings, got {len(data)}")
+    return [item.embedding for item in sorted(data, key=lambda item: item.index)]
+
+
+def _embed_uncached(texts: list[str]) -> list[list[float]]:
+    embeddings: list[list[float]] = []
+
+    for batch in _batch_texts(texts):
+        with openai_slot():
+            response = client.embeddings.create(
+                model=EMBEDDING_MODEL,
+                input=batch
+            )
+        embeddings.extend(_ordered(response.data, len(batch)))
+
+    return embeddings
+
+
+async def _embed_uncached_async(texts: list[str]) -> list[list[float]]:
+    embeddings: list[list[float]] = []
+
+    for batch in _batch_texts(texts):
+        async with async_openai_slot():
+            response = await async_client.embeddings.create(
+                model=EMBEDDING_MODEL,
+                input=batch
+            )
+        embeddings.extend(_ordered(response.data, len(batch)))
+
+    return embeddings
+
+
+def _unique_missing(texts: list[str], results: list[Optional[list[float]]]) -> dict[str, str]:
+    # Cache key -> the first original text with that key. Normalization only
+    # decides what counts as the same text; OpenAI gets the text as written
+    unique: dict[str, str] = {}
+    for text, embedding in zip(texts, results):
+        if embedding is None:
+            unique.setdefault(normalize_text(text), text)
+    return unique
+
+
+def _fill(
+    texts: list[str],
+    results: list[Optional[list[float]]],
+    fresh: dict[str, list[float]]
+) -> list[list[float]]:
+    filled: list[list[float]] = []
+    for text, embedding in zip(texts, results):
+        if embedding is None:
+            embedding = fresh.get(normalize_text(text))
+        if embedding is None:
+            raise RuntimeError(f"No embedding returned for input {len(filled)}")
+        filled.append(embedding)
+    return filled
+
+
+def generate_embeddings(texts: list[str]) -> list[list[float]]:
+    results: list[Optional[list[float]]] = get_cached_embeddings(EMBEDDING_MODEL, texts)
+
+    fresh: dict[str, list[float]] = {}
+    unique = _unique_missing(texts, results)
+    if unique:
+        to_embed = list(unique.values())
+        embeddings = _embed_uncached(to_embed)
+        fresh = dict(zip(unique, embeddings))
+        cache_embeddings(EMBEDDING_MODEL, to_embed, embeddings)
+
+    return _fill(texts, results, fresh)
+
+
+async def generate_embeddings_async(texts: list[str]) -> list[list[float]]:
+    results: list[Optional[list[float]]] = await get_cached_embeddings_async(EMBEDDING_MODEL, texts)
+
+    fresh: dict[str, list[float]] = {}
+    unique = _unique_missing(texts, results)
+    if unique:
+        to_embed = list(unique.values())
+        embeddings = await _embed_uncached_async(to_embed)
+        fresh = dict(zip(unique, embeddings))
+        await cache_embeddings_async(EMBEDDING_MODEL, to_embed, embeddings)
+
+    return _fill(texts, results, fresh)
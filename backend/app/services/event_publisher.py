@@ -0,0 +1,178 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+import redis
+import redis.asyncio as aioredis
+
+from ..core.config import settings
+from ..schemas.common import EventPublisherStats, WebSocketMessage
+
+
+logger = logging.getLogger(__name__)
+
+EVENTS_CHANNEL = "memory_events"
+STATS_LOG_INTERVAL = 100  # publish round trips
+
+# Shared by every task in the process (redis-py resets the pool after a
+# fork), so events reuse warm connections instead of a new TCP/TLS/AUTH
+# handshake per memory.
+_pool = redis.ConnectionPool.from_url(
+    settings.redis_url_computed,
+    decode_responses=True,
+    max_connections=settings.EVENT_PUBLISHER_MAX_CONNECTIONS,
+    socket_connect_timeout=5,
+    socket_timeout=5,
+    health_check_interval=30
+)
+redis_client: redis.Redis = redis.Redis(connection_pool=_pool)  # type: ignore[type-arg]
+
+# API processes publish from the event loop (e.g. streamed recommendations)
+async_redis_client: aioredis.Redis = aioredis.Redis.from_url(  # type: ignore[type-arg]
+    settings.redis_url_computed,
+    decode_responses=True,
+    max_connections=settings.EVENT_PUBLISHER_MAX_CONNECTIONS,
+    socket_connect_timeout=5,
+    socket_timeout=5
+)
+
+_lock = threading.Lock()
+_buffer: list[tuple[str, str]] = []
+_flusher_pid: Optional[int] = None
+_stats: dict[str, float] = {
+    "published": 0,
+    "round_trips": 0,
+    "errors": 0,
+    "no_subscribers": 0,
+    "latency_ms": 0.0,
+    "max_latency_ms": 0.0,
+}
+
+
+def _record(events: int, elapsed_ms: float, no_subscribers: int) -> None:
+    with _lock:
+        _stats["published"] += events
+        _stats["round_trips"] += 1
+        _stats["no_subscribers"] += no_subscribers
+        _stats["latency_ms"] += elapsed_ms
+        _stats["max_latency_ms"] = max(_stats["max_latency_ms"], elapsed_ms)
+        log_summary = _stats["round_trips"] % STATS_LOG_INTERVAL == 0
+
+    if log_summary:
+        stats = get_event_publisher_stats()
+        logger.info(
+            f"Event publishing: {stats['published']} events in {stats['round_trips']} round trips, "
+            f"avg {stats['avg_latency_ms']:.2f}ms, max {stats['max_latency_ms']:.2f}ms"
+        )
+
+
+def _send(events: list[tuple[str, str]]) -> None:
+    started = time.perf_counter()
+
+    try:
+        if len(events) == 1:
+            receivers = [redis_client.publish(*events[0])]
+        else:
+            pipe = redis_client.pipeline(transaction=False)
+            for channel, payload in events:
+                pipe.publish(channel, payload)
+            receivers = pipe.execute()
+    except Exception as e:
+        with _lock:
+            _stats["errors"] += len(events)
+        logger.warning(f"Failed to publish {len(events)} event(s): {e}")
+        return
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    no_subscribers = sum(1 for count in receivers if count == 0)
+    if no_subscribers:
+        logger.info(f"No subscribers listening to {events[0][0]}!")
+
+    _record(len(events), elapsed_ms, no_subscribers)
+
+
+def _flush_loop() -> None:
+    while True:
+        time.sleep(settings.EVENT_PUBLISH_BATCH_MS / 1000)
+        flush_events()
+
+
+def _enqueue(channel: str, payload: str) -> None:
+    global _flusher_pid
+
+    with _lock:
+        # Threads do not survive a fork: start one flusher per process
+        if _flusher_pid != os.getpid():
+            _flusher_pid = os.getpid()
+            _buffer.clear()
+            threading.Thread(target=_flush_loop, name="event-publisher", daemon=True).start()
+
+        _buffer.append((channel, payload))
+        full = len(_buffer) >= settings.EVENT_PUBLISH_BATCH_SIZE
+
+    if full:
+        flush_events()
+
+
+def publish_events(messages: list[WebSocketMessage], channel: str = EVENTS_CHANNEL) -> None:
+    if not messages:
+        return
+
+    events = [(channel, json.dumps(message)) for message in messages]
+
+    # With batching on, bursts (import progress, many small memories) leave
+    # in one pipelined round trip every EVENT_PUBLISH_BATCH_MS
+    if settings.EVENT_PUBLISH_BATCH_MS > 0:
+        for event_channel, payload in events:
+            _enqueue(event_channel, payload)
+        return
+
+    _send(events)
+
+
+def publish_event(message: WebSocketMessage, channel: str = EVENTS_CHANNEL) -> None:
+    publish_events([message], channel)
+
+
+async def publish_event_async(message: WebSocketMessage, channel: str = EVENTS_CHANNEL) -> None:
+    started = time.perf_counter()
+
+    try:
+        receivers = await async_redis_client.publish(channel, json.dumps(message))
+    except Exception as e:
+        with _lock:
+            _stats["errors"] += 1
+        logger.warning(f"Failed to publish event: {e}")
+        return
+
+    _record(1, (time.perf_counter() - started) * 1000, 1 if receivers == 0 else 0)
+
+
+def flush_events() -> None:
+    with _lock:
+        events = list(_buffer)
+        _buffer.clear()
+
+    if events:
+        _send(events)
+
+
+def get_event_publisher_stats() -> EventPublisherStats:
+    with _lock:
+        round_trips = int(_stats["round_trips"])
+        return {
+            "published": int(_stats["published"]),
+            "round_trips": round_trips,
+            "errors": int(_stats["errors"]),
+            "no_subscribers": int(_stats["no_subscribers"]),
+            "pending": len(_buffer),
+            "avg_latency_ms": _stats["latency_ms"] / round_trips if round_trips else 0.0,
+            "max_latency_ms": _stats["max_latency_ms"],
+        }
+
+
+atexit.register(flush_events)
@@ -0,0 +1,140 @@
+import logging
+import time
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from ..core.config import settings
+from ..schemas.common import PreparedImage
+from .upload_ingest import sniff_mime_type
+
+
+logger = logging.getLogger(__name__)
+
+FORMAT_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+PHASH_SIZE = 8
+
+
+def choose_detail(width: int, height: int) -> str:
+    if settings.VISION_DETAIL != "auto":
+        return settings.VISION_DETAIL
+    # Nothing to gain from high-detail tiles when the image already fits
+    # into the single low-detail tile
+    if max(width, height) <= settings.VISION_LOW_DETAIL_MAX_SIDE:
+        return "low"
+    return "high"
+
+
+def target_size(width: int, height: int, detail: str) -> tuple[int, int]:
+    # Mirrors the model's own downscaling: low detail sees one 512px tile,
+    # high detail fits 2048px then scales the short side to 768px.
+    if detail == "low":
+        scale = settings.VISION_LOW_DETAIL_MAX_SIDE / max(width, height)
+    else:
+        scale = min(
+            settings.VISION_HIGH_DETAIL_MAX_SIDE / max(width, height),
+            settings.VISION_HIGH_DETAIL_SHORT_SIDE / min(width, height)
+        )
+
+    if scale >= 1:
+        return width, height
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def perceptual_hash(image: Image.Image) -> str:
+    # 64-bit difference hash: robust to re-encoding, resizing and small edits
+    pixels = list(
+        image.convert("L").resize((PHASH_SIZE + 1, PHASH_SIZE), Image.Resampling.LANCZOS).getdata()
+    )
+    bits = 0
+    for row in range(PHASH_SIZE):
+        for col in range(PHASH_SIZE):
+            left = pixels[row * (PHASH_SIZE + 1) + col]
+            right = pixels[row * (PHASH_SIZE + 1) + col + 1]
+            bits = (bits << 1) | int(left > right)
+    return f"{bits:016x}"
+
+
+def _flatten(image: Image.Image, image_format: str) -> Image.Image:
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+
+    if not has_alpha:
+        return image if image.mode == "RGB" else image.convert("RGB")
+
+    image = image.convert("RGBA")
+    if image_format == "WEBP":
+        return image
+
+    background = Image.new("RGB", image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+def prepare_image(image_bytes: bytes) -> PreparedImage:
+    image_format = settings.VISION_IMAGE_FORMAT
+
+    try:
+        started = time.perf_counter()
+        image = Image.open(BytesIO(image_bytes))
+        detail = choose_detail(*image.size)
+        # JPEGs can be decoded directly at a reduced scale
+        image.draft("RGB", target_size(*image.size, detail))
+        image.load()
+        # Applies the EXIF orientation; the re-encode below drops all metadata
+        image = ImageOps.exif_transpose(image)
+        decoded = time.perf_counter()
+
+        size = target_size(*image.size, detail)
+        if size != image.size:
+            image = image.resize(size, Image.Resampling.LANCZOS)
+        image = _flatten(image, image_format)
+        resized = time.perf_counter()
+
+        output = BytesIO()
+        image.save(output, format=image_format, quality=settings.VISION_IMAGE_QUALITY)
+        data = output.getvalue()
+        encoded = time.perf_counter()
+
+        phash = perceptual_hash(image)
+
+    except Exception as e:
+        logger.warning(f"Image pre-processing failed, sending original: {e}")
+        return {
+            "data": image_bytes,
+            "mime_type": sniff_mime_type(image_bytes[:16]) or "image/jpeg",
+            "detail": "auto",
+            "phash": None,
+            "width": 0,
+            "height": 0,
+            "original_bytes": len(image_bytes),
+            "encoded_bytes": len(image_bytes),
+            "bytes_saved": 0,
+            "decode_ms": 0.0,
+            "resize_ms": 0.0,
+            "encode_ms": 0.0,
+        }
+
+    prepared: PreparedImage = {
+        "data": data,
+        "mime_type": FORMAT_MIME_TYPES[image_format],
+        "detail": detail,
+        "phash": phash,
+        "width": image.width,
+        "height": image.height,
+        "original_bytes": len(image_bytes),
+        "encoded_bytes": len(data),
+        "bytes_saved": len(image_bytes) - len(data),
+        "decode_ms": (decoded - started) * 1000,
+        "resize_ms": (resized - decoded) * 1000,
+        "encode_ms": (encoded - resized) * 1000,
+    }
+
+    logger.info(
+        f"Image prepared: {prepared['width']}x{prepared['height']} {image_format} detail={detail}, "
+        f"{prepared['original_bytes']} -> {prepared['encoded_bytes']} bytes "
+        f"(decode {prepared['decode_ms']:.1f}ms, resize {prepared['resize_ms']:.1f}ms, "
+        f"encode {prepared['encode_ms']:.1f}ms)"
+    )
+
+    return prepared
+
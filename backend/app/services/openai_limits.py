@@ -0,0 +1,27 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator
+
+from ..core.config import settings
+
+
+# Caps concurrent OpenAI requests per process. With the threads/gevent worker
+# pools many tasks share one process, so this bounds in-flight calls (and the
+# request/response buffers they hold) independently of task concurrency.
+_slots = threading.BoundedSemaphore(settings.OPENAI_MAX_IN_FLIGHT)
+
+# Same cap for coroutines on the API event loop
+_async_slots = asyncio.BoundedSemaphore(settings.OPENAI_MAX_IN_FLIGHT)
+
+
+@contextmanager
+def openai_slot() -> Iterator[None]:
+    with _slots:
+        yield
+
+
+@asynccontextmanager
+async def async_openai_slot() -> AsyncIterator[None]:
+    async with _async_slots:
+        yield
@@ -1,23 +1,175 @@
 import logging
+import multiprocessing
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import closing
 from io import BytesIO
+from typing import Iterator, Optional
 
 import pdfplumber
+import pypdfium2 as pdfium
+
+from ..core.config import settings
 
 
 logger = logging.getLogger(__name__)
 
+PAGES_PER_TASK = 8
+
+# Reused across documents; created on first parallel extraction
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.PDF_WORKERS,
+            mp_context=multiprocessing.get_context("forkserver")
+        )
+    return _pool
+
+
+def _extract_page_range(
+    source: str | bytes,
+    start: int,
+    stop: int,
+    layout: bool
+) -> list[tuple[int, str]]:
+    # Runs in pool workers: source is a temp file path there, bytes inline
+    if layout:
+        with pdfplumber.open(BytesIO(source) if isinstance(source, bytes) else source) as pdf:
+            return [(i + 1, pdf.pages[i].extract_text() or "") for i in range(start, stop)]
+
+    # pdfium's text layer is far faster than pdfplumber's layout analysis
+    pdf = pdfium.PdfDocument(source)
+    try:
+        pages: list[tuple[int, str]] = []
+        for i in range(start, stop):
+            page = pdf[i]
+            textpage = page.get_textpage()
+            pages.append((i + 1, textpage.get_text_range()))
+            textpage.close()
+            page.close()
+        return pages
+    finally:
+        pdf.close()
+
+
+def _iter_ranges_inline(
+    pdf_bytes: bytes,
+    ranges: list[tuple[int, int]],
+    layout: bool
+) -> Iterator[list[tuple[int, str]]]:
+    for start, stop in ranges:
+        yield _extract_page_range(pdf_bytes, start, stop, layout)
+
+
+def _iter_ranges_parallel(
+    pdf_bytes: bytes,
+    ranges: list[tuple[int, int]],
+    layout: bool
+) -> Iterator[list[tuple[int, str]]]:
+    # Workers read the document from a temp file instead of receiving the
+    # bytes per task, and only PDF_WORKERS ranges are in flight at a time so
+    # stopping early (budget reached) never extracts far past the cut-off.
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    pending: deque[Future[list[tuple[int, str]]]] = deque()
+    remaining = deque(ranges)
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf_bytes)
+
+        pool = _get_pool()
+
+        def submit_next() -> None:
+            if remaining:
+                start, stop = remaining.popleft()
+                pending.append(pool.submit(_extract_page_range, path, start, stop, layout))
+
+        for _ in range(settings.PDF_WORKERS):
+            submit_next()
+
+        while pending:
+            batch = pending.popleft().result()
+            submit_next()
+            yield batch
+
+    finally:
+        for future in pending:
+            future.cancel()
+        for future in pending:
+            if not future.cancelled():
+                try:
+                    future.result()
+                except Exception:
+                    pass
+        os.unlink(path)
+
+
+def iter_pdf_pages(
+    pdf_bytes: bytes,
+    max_chars: Optional[int] = None,
+    max_pages: Optional[int] = None,
+    layout: Optional[bool] = None
+) -> Iterator[tuple[int, str]]:
+    max_chars = settings.PDF_MAX_CHARS if max_chars is None else max_chars
+    max_pages = settings.PDF_MAX_PAGES if max_pages is None else max_pages
+    layout = settings.PDF_LAYOUT if layout is None else layout
+
+    pdf = pdfium.PdfDocument(pdf_bytes)
+    try:
+        page_count = min(len(pdf), max_pages)
+    finally:
+        pdf.close()
+
+    ranges = [
+        (start, min(start + PAGES_PER_TASK, page_count))
+        for start in range(0, page_count, PAGES_PER_TASK)
+    ]
+
+    # Only layout analysis is CPU-heavy enough to beat the pool's IPC cost
+    # (see benchmarks/bench_pdf_extraction.py). Celery prefork children are
+    # daemonic and cannot start a process pool.
+    parallel = (
+        layout
+        and page_count >= settings.PDF_PARALLEL_MIN_PAGES
+        and settings.PDF_WORKERS > 1
+        and not multiprocessing.current_process().daemon
+    )
+    batches = (
+        _iter_ranges_parallel(pdf_bytes, ranges, layout)
+        if parallel
+        else _iter_ranges_inline(pdf_bytes, ranges, layout)
+    )
+
+    used = 0
+    with closing(batches):
+        for batch in batches:
+            for page_num, text in batch:
+                text = text.strip()
+                if not text:
+                    continue
+
+                if used + len(text) >= max_chars:
+                    yield page_num, text[:max_chars - used]
+                    logger.info(f"PDF text budget of {max_chars} chars reached at page {page_num}")
+                    return
+
+                used += len(text)
+                yield page_num, text
+
 
 def extract_text_from_pdf(pdf_bytes: bytes) -> str:
     text_content: list[str] = []
 
     try:
-        pdf_file = BytesIO(pdf_bytes)
-
-        with pdfplumber.open(pdf_file) as pdf:
-            for page_num, page in enumerate(pdf.pages, 1):
-                text = page.extract_text()
-                if text:
-                    text_content.append(f"[Page {page_num}]\n{text}")
+        for page_num, text in iter_pdf_pages(pdf_bytes):
+            text_content.append(f"[Page {page_num}]\n{text}")
 
         return "\n\n".join(text_content)
 
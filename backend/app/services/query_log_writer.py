@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import threading
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..database import get_async_session_factory
+from ..models import QueryLog
+from ..schemas.common import QueryLogRecord, QueryLogWriterStats
+
+
+logger = logging.getLogger(__name__)
+
+# Searches append here and return; the writer task started with the app
+# inserts whatever has accumulated every QUERY_LOG_FLUSH_INTERVAL seconds.
+# Rows carry their own ids, so a response can reference one before it exists
+_lock = threading.Lock()
+_flush_lock = asyncio.Lock()
+_buffer: list[QueryLogRecord] = []
+_stats: dict[str, int] = {
+    "written": 0,
+    "batches": 0,
+    "errors": 0,
+    "dropped": 0,
+}
+
+
+def enqueue_query_log(record: QueryLogRecord) -> None:
+    with _lock:
+        if len(_buffer) >= settings.QUERY_LOG_MAX_PENDING:
+            _stats["dropped"] += 1
+            dropped = True
+        else:
+            _buffer.append(record)
+            dropped = False
+
+    if dropped:
+        logger.warning(f"Query log buffer full, dropped log {record['id']}")
+
+
+async def flush_query_logs() -> int:
+    # Serialized so a caller that needs its row in the table (feedback on a
+    # fresh query) waits for a flush already in progress
+    async with _flush_lock:
+        with _lock:
+            records = list(_buffer)
+            _buffer.clear()
+
+        if not records:
+            return 0
+
+        async with get_async_session_factory()() as db:
+            try:
+                # Multi-row INSERTs instead of an add/commit/refresh per search
+                for start in range(0, len(records), settings.QUERY_LOG_BATCH_SIZE):
+                    await db.execute(insert(QueryLog), records[start:start + settings.QUERY_LOG_BATCH_SIZE])
+                await db.commit()
+                written = len(records)
+            except Exception as e:
+                await db.rollback()
+                with _lock:
+                    _stats["errors"] += 1
+
+                if _is_connection_error(e):
+                    # Every row would fail the same way, one round trip at a
+                    # time, while feedback requests wait on _flush_lock
+                    with _lock:
+                        _stats["dropped"] += len(records)
+                    logger.error(f"Failed to write {len(records)} query logs: {e}")
+                    written = 0
+                else:
+                    logger.warning(f"Failed to write {len(records)} query logs, retrying row by row: {e}")
+                    written = await _write_rows(db, records)
+
+    with _lock:
+        _stats["written"] += written
+        _stats["batches"] += 1
+
+    logger.debug(f"Wrote {written} query logs")
+    return written
+
+
+def _is_connection_error(e: Exception) -> bool:
+    if isinstance(e, DBAPIError) and e.connection_invalidated:
+        return True
+    return isinstance(e, (OperationalError, InterfaceError, OSError))
+
+
+async def _write_rows(db: AsyncSession, records: list[QueryLogRecord]) -> int:
+    # Logs are best-effort: only a row that fails on its own (e.g. its user
+    # was deleted meanwhile) is dropped, not the rest of its batch
+    written = 0
+    for record in records:
+        try:
+            await db.execute(insert(QueryLog), [record])
+            await db.commit()
+            written += 1
+        except Exception as e:
+            await db.rollback()
+            with _lock:
+                _stats["dropped"] += 1
+            logger.error(f"Failed to write query log {record['id']}: {e}")
+    return written
+
+
+async def run_query_log_writer() -> None:
+    try:
+        while True:
+            await asyncio.sleep(settings.QUERY_LOG_FLUSH_INTERVAL)
+            try:
+                await flush_query_logs()
+            except Exception as e:
+                # The task must outlive a failed flush, or logs pile up until
+                # QUERY_LOG_MAX_PENDING and are then dropped silently
+                logger.error(f"Query log flush failed: {e}")
+    finally:
+        # Shutdown cancels the task; write what is left before the engine goes
+        try:
+            await flush_query_logs()
+        except Exception as e:
+            logger.error(f"Final query log flush failed: {e}")
+
+
+def get_query_log_writer_stats() -> QueryLogWriterStats:
+    with _lock:
+        return {
+            "written": _stats["written"],
+            "batches": _stats["batches"],
+            "errors": _stats["errors"],
+            "dropped": _stats["dropped"],
+            "pending": len(_buffer),
+        }
@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import uuid
+from typing import Any, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import ColumnElement, Text, cast, func, literal_column, select
+from sqlalchemy.dialects.postgresql import TSQUERY
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..models import ExtractedScent, MemoryChunk, ScentMemory
+from .vector_db import search_similar_async
+
+
+logger = logging.getLogger(__name__)
+
+# Inlined, not bound, so the planner can match idx_chunk_content_fts
+TEXT_SEARCH_CONFIG = literal_column("'english'")
+
+
+def _any_term_query(query: str) -> ColumnElement[Any]:
+    # plainto_tsquery ANDs every term; a recommendation question rarely
+    # contains all of them, so OR the normalised lexemes and let ts_rank_cd
+    # reward documents that match more of them
+    return cast(
+        func.replace(cast(func.plainto_tsquery(TEXT_SEARCH_CONFIG, query), Text), "&", "|"),
+        TSQUERY
+    )
+
+
+def _chunk_document() -> ColumnElement[Any]:
+    # Same expression as idx_chunk_content_fts
+    return func.to_tsvector(TEXT_SEARCH_CONFIG, MemoryChunk.content)
+
+
+def _scent_document() -> ColumnElement[Any]:
+    return func.to_tsvector(
+        TEXT_SEARCH_CONFIG,
+        func.concat_ws(
+            " ",
+            ExtractedScent.scent_name,
+            ExtractedScent.brand,
+            ExtractedScent.scent_family,
+            func.array_to_string(ExtractedScent.top_notes, " "),
+            func.array_to_string(ExtractedScent.heart_notes, " "),
+            func.array_to_string(ExtractedScent.base_notes, " "),
+        )
+    )
+
+
+async def lexical_search(
+    db: AsyncSession,
+    query: str,
+    user_id: str,
+    limit: int
+) -> list[list[str]]:
+    # Two rankings of chunk ids: chunk text, and memories whose extracted
+    # perfume names, brands or notes match (represented by their first chunk)
+    tsquery = _any_term_query(query)
+    owner = uuid.UUID(user_id)
+
+    chunk_document = _chunk_document()
+    chunk_rank = func.ts_rank_cd(chunk_document, tsquery)
+    chunk_hits = await db.scalars(
+        select(MemoryChunk.id)
+        .join(ScentMemory, ScentMemory.id == MemoryChunk.memory_id)
+        .where(ScentMemory.user_id == owner, chunk_document.bool_op("@@")(tsquery))
+        .order_by(chunk_rank.desc())
+        .limit(limit)
+    )
+
+    scent_document = _scent_document()
+    scent_rank = func.max(func.ts_rank_cd(scent_document, tsquery))
+    scent_hits = await db.scalars(
+        select(MemoryChunk.id)
+        .select_from(ExtractedScent)
+        .join(ScentMemory, ScentMemory.id == ExtractedScent.memory_id)
+        .join(MemoryChunk, (MemoryChunk.memory_id == ExtractedScent.memory_id) & (MemoryChunk.chunk_index == 0))
+        .where(ScentMemory.user_id == owner, scent_document.bool_op("@@")(tsquery))
+        .group_by(MemoryChunk.id)
+        .order_by(scent_rank.desc())
+        .limit(limit)
+    )
+
+    return [[str(id_) for id_ in chunk_hits], [str(id_) for id_ in scent_hits]]
+
+
+async def vector_search(query_embedding: list[float], user_id: str, limit: int) -> tuple[list[str], np.ndarray]:
+    # Ranked chunk ids and their embeddings, row-aligned (empty rows if the
+    # store didn't return any)
+    results = await search_similar_async(query_embedding, user_id, top_k=limit)
+    ids = results['ids'][0] if results['ids'] else []
+    embeddings = results.get('embeddings')
+    if embeddings is None or len(embeddings) == 0:
+        return ids, np.zeros((0, len(query_embedding)), dtype=np.float32)
+    return ids, np.asarray(embeddings[0], dtype=np.float32)
+
+
+def rrf_scores(rankings: Sequence[Sequence[str]], k: Optional[int] = None) -> dict[str, float]:
+    # score(d) = sum over rankings of 1 / (k + rank); only ranks matter, so
+    # cosine distances and ts_rank scores never have to be put on one scale
+    if k is None:
+        k = settings.RRF_K
+
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking, start=1):
+            scores[id_] = scores.get(id_, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: Optional[int] = None) -> list[str]:
+    scores = rrf_scores(rankings, k)
+    return sorted(scores, key=lambda id_: scores[id_], reverse=True)
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def mmr_select(relevance: np.ndarray, embeddings: np.ndarray, k: int, lambda_: float) -> list[int]:
+    # Maximal marginal relevance: repeatedly take the candidate maximising
+    # lambda * relevance - (1 - lambda) * max cosine to anything already taken.
+    # Zero embedding rows count as similar to nothing
+    n = len(relevance)
+    if n == 0:
+        return []
+
+    unit = _unit_rows(embeddings)
+    similarity = unit @ unit.T
+
+    selected = [int(np.argmax(relevance))]
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    max_similarity = similarity[selected[0]].copy()
+
+    for _ in range(min(k, n) - 1):
+        scores = lambda_ * relevance - (1.0 - lambda_) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+
+    return selected
+
+
+def _diversify(ids: list[str], relevance: np.ndarray, embeddings: np.ndarray, top_k: int) -> list[str]:
+    lambda_ = settings.MMR_LAMBDA
+    if lambda_ >= 1.0 or len(embeddings) != len(ids):
+        order = np.argsort(-relevance, kind="stable")[:top_k]
+    else:
+        order = mmr_select(relevance, embeddings, top_k, lambda_)
+    return [ids[i] for i in order]
+
+
+async def retrieve_chunk_ids(
+    db: AsyncSession,
+    query: str,
+    query_embedding: list[float],
+    user_id: str,
+    top_k: Optional[int] = None,
+    mode: Optional[str] = None
+) -> list[str]:
+    if top_k is None:
+        top_k = settings.RETRIEVAL_TOP_K
+    if mode is None:
+        mode = settings.RETRIEVAL_MODE
+
+    if mode == "lexical":
+        return reciprocal_rank_fusion(await lexical_search(db, query, user_id, top_k))[:top_k]
+
+    # Over-fetch so re-ranking has near-duplicates to skip and, in hybrid
+    # mode, a chunk ranked modestly by both retrievers can still make top_k
+    candidates = max(top_k, settings.RETRIEVAL_CANDIDATES)
+
+    if mode == "vector":
+        vector_ids, vectors = await vector_search(query_embedding, user_id, candidates)
+        if len(vectors) == len(vector_ids):
+            relevance = _unit_rows(vectors) @ _unit_rows(np.asarray(query_embedding, dtype=np.float32))
+        else:
+            relevance = np.linspace(1.0, 0.0, len(vector_ids))  # store order
+        return _diversify(vector_ids, relevance, vectors, top_k)
+
+    # Chroma and Postgres are queried concurrently
+    (vector_ids, vectors), lexical_ids = await asyncio.gather(
+        vector_search(query_embedding, user_id, candidates),
+        lexical_search(db, query, user_id, candidates)
+    )
+    logger.info(
+        f"Hybrid retrieval for user {user_id}: {len(vector_ids)} vector, "
+        f"{len(lexical_ids[0])} chunk text and {len(lexical_ids[1])} scent candidates"
+    )
+
+    scores = rrf_scores([vector_ids, *lexical_ids])
+    fused = sorted(scores, key=lambda id_: scores[id_], reverse=True)[:candidates]
+    if not fused:
+        return []
+
+    # Lexical-only candidates have no embedding to hand; they get zero rows
+    embeddings = np.zeros((len(fused), vectors.shape[1]), dtype=np.float32)
+    if len(vectors) == len(vector_ids):
+        rows = {id_: i for i, id_ in enumerate(vector_ids)}
+        for j, id_ in enumerate(fused):
+            if id_ in rows:
+                embeddings[j] = vectors[rows[id_]]
+
+    relevance = np.array([scores[id_] for id_ in fused])
+    return _diversify(fused, relevance / relevance.max(), embeddings, top_k)
@@ -7,6 +7,7 @@ from openai import OpenAI
 
 from ..core.config import settings
 from ..schemas.common import ScentData
+from .openai_limits import openai_slot
 
 
 logger = logging.getLogger(__name__)
@@ -75,20 +76,21 @@ def extract_scents(
         occasion=occasion or "not specified"
     )
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {
-                "role": "system",
-                "content": formatted_prompt
-            },
-            {
-                "role": "user",
-                "content": f"Extract scent information from:\n\n{text}"
-            }
-        ],
-        response_format={"type": "json_object"}
-    )
+    with openai_slot():
+        response = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {
+                    "role": "system",
+                    "content": formatted_prompt
+                },
+                {
+                    "role": "user",
+                    "content": f"Extract scent information from:\n\n{text}"
+                }
+            ],
+            response_format={"type": "json_object"}
+        )
 
     usage = response.usage
     if usage and hasattr(usage, 'prompt_tokens_details'):
@@ -100,3 +102,56 @@ def extract_scents(
     if content:
         return json.loads(content)
     return {}
+
+
+BATCH_EXTRACTION_INSTRUCTIONS = """
+
+You will receive several memories at once, numbered [1], [2], ... Each memory states its own emotion and occasion; use those instead of the ones above.
+Analyze every memory independently and return a JSON object {"results": [...]} with exactly one analysis object per memory, in the same order, each with the fields listed above."""
+
+
+def extract_scents_batch(
+    items: list[tuple[str, Optional[str], Optional[str]]]
+) -> list[ScentData]:
+    # One request for several (text, emotion, occasion) items; the shared
+    # system prompt is paid once per batch instead of once per memory
+    if len(items) == 1:
+        text, emotion, occasion = items[0]
+        return [extract_scents(text, emotion, occasion)]
+
+    logger.info(f"API call started to extract {len(items)} memories")
+
+    formatted_prompt = SCENT_EXTRACTION_PROMPT.format(
+        emotion="given per memory",
+        occasion="given per memory"
+    ) + BATCH_EXTRACTION_INSTRUCTIONS
+
+    memories = "\n\n".join(
+        f"[{i}] (emotion: {emotion or 'not specified'}, occasion: {occasion or 'not specified'})\n{text}"
+        for i, (text, emotion, occasion) in enumerate(items, start=1)
+    )
+
+    with openai_slot():
+        response = client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {
+                    "role": "system",
+                    "content": formatted_prompt
+                },
+                {
+                    "role": "user",
+                    "content": f"Extract scent information from each memory:\n\n{memories}"
+                }
+            ],
+            response_format={"type": "json_object"}
+        )
+
+    content = response.choices[0].message.content
+    results = json.loads(content).get("results", []) if content else []
+
+    if not isinstance(results, list) or len(results) != len(items):
+        logger.warning(f"Batch extraction returned {len(results)} results for {len(items)} memories, retrying individually")
+        return [extract_scents(text, emotion, occasion) for text, emotion, occasion in items]
+
+    return [result if isinstance(result, dict) else {} for result in results]
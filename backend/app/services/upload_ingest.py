@@ -0,0 +1,92 @@
+import hashlib
+import logging
+from typing import Callable, Optional
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from ..schemas.common import IngestedFile
+from .blob_store import BlobStore, blob_key
+
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 64 * 1024  # 64KB
+SNIFF_BYTES = 16
+
+
+class UploadTooLargeError(ValueError):
+    pass
+
+
+class UnsupportedUploadError(ValueError):
+    pass
+
+
+def sniff_mime_type(header: bytes) -> Optional[str]:
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header.startswith(b"%PDF-"):
+        return "application/pdf"
+    return None
+
+
+async def ingest_upload(
+    file: UploadFile,
+    store: BlobStore,
+    max_size: int,
+    allowed_mime_types: set[str],
+    extension: str = "",
+    claim: Optional[Callable[[str], None]] = None
+) -> IngestedFile:
+    # Peak memory stays at one chunk: the size limit is enforced, the hash
+    # computed and the MIME type sniffed while bytes stream into the store.
+    digest = hashlib.sha256()
+    writer = await run_in_threadpool(store.open_writer, extension)
+    header = b""
+    mime_type: Optional[str] = None
+    size = 0
+
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLargeError(f"Upload exceeds {max_size} bytes")
+
+            if mime_type is None and len(header) < SNIFF_BYTES:
+                header += chunk[:SNIFF_BYTES - len(header)]
+                if len(header) >= SNIFF_BYTES:
+                    mime_type = sniff_mime_type(header)
+                    if mime_type not in allowed_mime_types:
+                        raise UnsupportedUploadError("File content does not match an allowed type")
+
+            digest.update(chunk)
+            await run_in_threadpool(writer.write, chunk)
+
+        if mime_type is None:
+            mime_type = sniff_mime_type(header)
+            if mime_type not in allowed_mime_types:
+                raise UnsupportedUploadError("File content does not match an allowed type")
+
+        # The caller records its reference to the content-addressed key
+        # before the blob is moved into place (see blob_refs)
+        if claim is not None:
+            await run_in_threadpool(claim, blob_key(digest.hexdigest(), extension))
+        key = await run_in_threadpool(writer.commit, digest.hexdigest())
+
+    except Exception:
+        await run_in_threadpool(writer.abort)
+        raise
+
+    logger.info(f"Ingested upload {key} ({size} bytes, {mime_type})")
+
+    return {
+        "key": key,
+        "size": size,
+        "sha256": digest.hexdigest(),
+        "content_type": mime_type,
+    }
@@ -3,6 +3,7 @@ import logging
 from typing import Any, Optional
 
 import chromadb
+from chromadb.api import AsyncClientAPI
 from chromadb.config import Settings as ChromaSettings
 
 from ..core.config import settings
@@ -13,6 +14,7 @@ logger = logging.getLogger(__name__)
 
 # Cached client instance
 _client: Optional[chromadb.HttpClient] = None
+_async_client: Optional[AsyncClientAPI] = None
 
 
 def get_client() -> chromadb.HttpClient:
@@ -46,6 +48,24 @@ def get_client() -> chromadb.HttpClient:
     return _client
 
 
+async def get_async_client() -> AsyncClientAPI:
+    global _async_client
+
+    if _async_client is not None:
+        return _async_client
+
+    # Used by async routes; reuses one HTTP connection pool on the event loop
+    headers = {"X-Chroma-Token": settings.CHROMA_AUTH_TOKEN} if settings.CHROMA_AUTH_TOKEN else None
+    _async_client = await chromadb.AsyncHttpClient(
+        host=settings.CHROMA_HOST,
+        port=settings.CHROMA_PORT,
+        settings=ChromaSettings(anonymized_telemetry=False),
+        headers=headers
+    )
+
+    return _async_client
+
+
 def get_collection() -> Any:
     client = get_client()
     return client.get_or_create_collection(name="memory_chunks")
@@ -60,6 +80,20 @@ def store_embedding(
     collection.add(ids=[chunk_id], embeddings=[embedding], metadatas=[metadata])
 
 
+def store_embeddings(
+    chunk_ids: list[str],
+    embeddings: list[list[float]],
+    metadatas: list[EmbeddingMetadata]
+) -> None:
+    if not chunk_ids:
+        return
+
+    # Upsert keeps re-indexing a memory idempotent
+    collection = get_collection()
+    collection.upsert(ids=chunk_ids, embeddings=embeddings, metadatas=metadatas)
+    logger.info(f"Stored {len(chunk_ids)} embeddings in ChromaDB")
+
+
 def search_similar(
     query_embedding: list[float],
     user_id: str,
@@ -74,6 +108,24 @@ def search_similar(
     return result
 
 
+async def search_similar_async(
+    query_embedding: list[float],
+    user_id: str,
+    top_k: int = 5
+) -> VectorSearchResult:
+    client = await get_async_client()
+    collection = await client.get_or_create_collection(name="memory_chunks")
+    # The search path reads chunk text from Postgres; the embeddings come
+    # back with the ids so re-ranking needs no second round trip
+    result: Any = await collection.query(
+        query_embeddings=[query_embedding],
+        n_results=top_k,
+        where={"user_id": user_id},
+        include=["distances", "embeddings"]
+    )
+    return result
+
+
 def delete_embeddings(chunk_ids: list[str]) -> None:
     if not chunk_ids:
         return
@@ -83,6 +135,23 @@ def delete_embeddings(chunk_ids: list[str]) -> None:
     logger.info(f"Deleted {len(chunk_ids)} embeddings from ChromaDB")
 
 
+def delete_stale_embeddings(memory_ids: list[str], keep: list[str]) -> int:
+    if not memory_ids:
+        return 0
+
+    # Vectors of chunks that a re-extraction removed; their rows are already
+    # gone, so only ids the memory no longer has are deleted
+    collection = get_collection()
+    results = collection.get(where={"memory_id": {"$in": memory_ids}}, include=[])
+    stale = sorted(set(results['ids']) - set(keep))
+
+    if stale:
+        collection.delete(ids=stale)
+        logger.info(f"Deleted {len(stale)} stale embeddings")
+
+    return len(stale)
+
+
 def delete_user_embeddings(user_id: str) -> int:
     collection = get_collection()
 
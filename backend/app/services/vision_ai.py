@@ -7,7 +7,8 @@ from typing import Optional
 from openai import OpenAI
 
 from ..core.config import settings
-from ..schemas.common import VisionAnalysisResult
+from ..schemas.common import PreparedImage, VisionAnalysisResult
+from .openai_limits import openai_slot
 
 
 logger = logging.getLogger(__name__)
@@ -63,43 +64,46 @@ Example response:
 
 
 def analyze_image(
-    image_bytes: bytes,
+    image: PreparedImage,
     content: str,
     emotion: Optional[str],
     occasion: Optional[str]
 ) -> VisionAnalysisResult:
     logger.info("Vision API call started")
-    base64_image = base64.b64encode(image_bytes).decode('utf-8')
-    # Processed in transit, images never stored in S3 buckets, no file I/O
+    base64_image = base64.b64encode(image["data"]).decode('utf-8')
 
     formatted_prompt = VISION_SYSTEM_PROMPT.format(
         emotion=emotion or "not specified",
         occasion=occasion or "not specified"
     )
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {
-                "role": "system",
-                "content": formatted_prompt
-            },
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "Analyze this image:"
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}
-                    }
-                ]
-            }
-        ],
-        response_format={"type": "json_object"}
-    )
+    with openai_slot():
+        response = client.chat.completions.create(
+            model="gpt-4o",
+            messages=[
+                {
+                    "role": "system",
+                    "content": formatted_prompt
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": "Analyze this image:"
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": f"data:{image['mime_type']};base64,{base64_image}",
+                                "detail": image["detail"]
+                            }
+                        }
+                    ]
+                }
+            ],
+            response_format={"type": "json_object"}
+        )
 
     usage = response.usage
     if usage and hasattr(usage, 'prompt_tokens_details'):
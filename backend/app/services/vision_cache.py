@@ -0,0 +1,123 @@
+import hashlib
+import json
+import logging
+from typing import Optional
+
+import redis
+
+from ..core.config import settings
+from ..schemas.common import VisionAnalysisResult
+
+
+logger = logging.getLogger(__name__)
+
+PHASH_BITS = 64
+
+redis_client: redis.Redis = redis.Redis.from_url(  # type: ignore[type-arg]
+    settings.redis_url_computed,
+    decode_responses=True,
+    socket_connect_timeout=5,
+    socket_timeout=5
+)
+
+
+def hamming_distance(a: str, b: str) -> int:
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
+def _context(user_id: str, emotion: Optional[str], occasion: Optional[str]) -> str:
+    # Results are private to the user (image_description describes their
+    # photo); within a user the vision prompt varies by emotion/occasion
+    data = f"{user_id}|{(emotion or '').strip().lower()}|{(occasion or '').strip().lower()}"
+    return hashlib.sha256(data.encode()).hexdigest()[:16]
+
+
+def _result_key(context: str, phash: str) -> str:
+    return f"vision:{context}:{phash}"
+
+
+def _band_keys(context: str, phash: str) -> list[str]:
+    # Multi-index hashing: with max_distance + 1 bands, any hash within
+    # max_distance bits agrees with the stored one on at least one band
+    bands = settings.VISION_CACHE_MAX_DISTANCE + 1
+    value = int(phash, 16)
+    keys: list[str] = []
+    start = 0
+
+    for i in range(bands):
+        width = PHASH_BITS // bands + (1 if i < PHASH_BITS % bands else 0)
+        band = (value >> (PHASH_BITS - start - width)) & ((1 << width) - 1)
+        keys.append(f"vision_band:{context}:{bands}:{i}:{band:x}")
+        start += width
+
+    return keys
+
+
+def get_cached_vision_result(
+    phash: Optional[str],
+    user_id: str,
+    emotion: Optional[str],
+    occasion: Optional[str]
+) -> Optional[VisionAnalysisResult]:
+    if not settings.VISION_CACHE_ENABLED or not phash:
+        return None
+
+    context = _context(user_id, emotion, occasion)
+
+    try:
+        cached = redis_client.get(_result_key(context, phash))
+        if cached:
+            logger.info(f"Vision cache hit: {phash}")
+            return json.loads(cached)
+
+        if settings.VISION_CACHE_MAX_DISTANCE == 0:
+            return None
+
+        pipe = redis_client.pipeline(transaction=False)
+        for band_key in _band_keys(context, phash):
+            pipe.smembers(band_key)
+        candidates: set[str] = set().union(*pipe.execute())
+
+        nearby = sorted(
+            (distance, candidate)
+            for candidate in candidates
+            if (distance := hamming_distance(phash, candidate)) <= settings.VISION_CACHE_MAX_DISTANCE
+        )
+        if not nearby:
+            return None
+
+        # Band sets can outlive their results, take the closest that remains
+        values = redis_client.mget([_result_key(context, candidate) for _, candidate in nearby])
+        for (distance, candidate), value in zip(nearby, values):
+            if value:
+                logger.info(f"Vision cache near hit: {phash} ~ {candidate} (distance {distance})")
+                return json.loads(value)
+
+    except Exception as e:
+        logger.warning(f"Vision cache retrieval failed: {e}")
+
+    return None
+
+
+def cache_vision_result(
+    phash: Optional[str],
+    user_id: str,
+    emotion: Optional[str],
+    occasion: Optional[str],
+    result: VisionAnalysisResult
+) -> None:
+    if not settings.VISION_CACHE_ENABLED or not phash or not result:
+        return
+
+    context = _context(user_id, emotion, occasion)
+    ttl = settings.VISION_CACHE_TTL
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.setex(_result_key(context, phash), ttl, json.dumps(result))
+        for band_key in _band_keys(context, phash):
+            pipe.sadd(band_key, phash)
+            pipe.expire(band_key, ttl)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"Vision cache storage failed: {e}")
@@ -1,4 +1,5 @@
 from .celery_app import celery_app
 from .process_memory import process_memory_task
 from .proccess_music import process_music_task
-__all__ = ['celery_app', 'process_memory_task', 'process_music_task']
\ No newline at end of file
+from .bulk_import import import_memories_batch
+__all__ = ['celery_app', 'process_memory_task', 'process_music_task', 'import_memories_batch']
\ No newline at end of file
@@ -0,0 +1,258 @@
+import logging
+from pathlib import PurePosixPath
+from uuid import UUID
+
+import redis
+from celery import Task
+from sqlalchemy.orm import Session
+
+from .celery_app import celery_app
+from .process_memory import (
+    STAGE_MAX_RETRIES,
+    _extract,
+    _finalize,
+    _mark_stage_done,
+    _release_blob,
+    _stage_done,
+    process_text,
+)
+from ..core.config import settings
+from ..database import SessionLocal
+from ..models import ScentMemory, MemoryChunk
+from ..schemas.common import BulkImportJob, EmbeddingMetadata, FileData, WebSocketMessage
+from ..services.cache import invalidate_user_recommendations
+from ..services.embedding_cache import pack_embedding, unpack_embedding
+from ..services.embeddings import generate_embeddings
+from ..services.event_publisher import publish_events
+from ..services.scent_extractor import extract_scents_batch
+from ..services.vector_db import delete_stale_embeddings, store_embeddings
+
+
+logger = logging.getLogger(__name__)
+
+IMPORT_PROGRESS_TTL = 24 * 3600
+
+redis_client: redis.Redis = redis.Redis.from_url(  # type: ignore[type-arg]
+    settings.redis_url_computed,
+    decode_responses=True,
+    socket_connect_timeout=5,
+    socket_timeout=5
+)
+
+
+# Imported memories skip the per-memory extract -> embed -> index -> finalize
+# chain: each batch task makes one extraction call per BULK_EXTRACTION_BATCH_SIZE
+# texts, embeds every chunk of the batch together and indexes them in one
+# upsert. Stage checkpoints are shared with process_memory, so a memory that
+# finished here is skipped if it is ever re-run through the regular pipeline.
+def start_import(user_id: str, job: BulkImportJob) -> None:
+    memory_ids = job["memory_ids"]
+    batch_size = settings.BULK_IMPORT_BATCH_SIZE
+
+    for start in range(0, len(memory_ids), batch_size):
+        import_memories_batch.delay(
+            user_id,
+            job["job_id"],
+            memory_ids[start:start + batch_size],
+            job["total"]
+        )
+
+    logger.info(f"Queued import {job['job_id']}: {job['total']} memories")
+
+
+@celery_app.task(bind=True, max_retries=STAGE_MAX_RETRIES, rate_limit=settings.BULK_IMPORT_RATE_LIMIT)
+def import_memories_batch(
+    self: Task,
+    user_id: str,
+    job_id: str,
+    memory_ids: list[str],
+    total: int
+) -> None:
+    db: Session = SessionLocal()
+
+    try:
+        # Finished (or permanently failed) memories are skipped on retries
+        memories: list[ScentMemory] = db.query(ScentMemory).filter(
+            ScentMemory.id.in_([UUID(memory_id) for memory_id in memory_ids]),
+            ScentMemory.processed.is_(False),
+            ScentMemory.processing_error.is_(None)
+        ).all()
+
+        _extract_batch(db, memories)
+
+        ready = [memory for memory in memories if memory.processing_error is None]
+        _index_batch(db, user_id, ready)
+
+        for memory in ready:
+            _finalize(db, memory)
+            for stage in ("embed", "index", "finalize"):
+                _mark_stage_done(memory, stage)
+
+        db.commit()
+
+        # Counted over the whole batch: a retry does not reload memories whose
+        # extraction already failed in an earlier attempt
+        completed = db.query(ScentMemory).filter(
+            ScentMemory.id.in_([UUID(memory_id) for memory_id in memory_ids]),
+            ScentMemory.processed.is_(True)
+        ).count()
+
+    except Exception as e:
+        db.rollback()
+
+        if self.request.retries < self.max_retries:
+            countdown = 5 * 2 ** self.request.retries
+            logger.warning(f"Import batch for job {job_id} failed, retrying in {countdown}s: {e}")
+            raise self.retry(exc=e, countdown=countdown)
+
+        logger.error(f"Import batch for job {job_id} failed", exc_info=True)
+        db.query(ScentMemory).filter(
+            ScentMemory.id.in_([UUID(memory_id) for memory_id in memory_ids]),
+            ScentMemory.processed.is_(False),
+            ScentMemory.processing_error.is_(None)
+        ).update({"processing_error": f"import: {e}"[:500]}, synchronize_session=False)
+        db.commit()
+
+        _record_progress(user_id, job_id, 0, len(memory_ids), total)
+        raise
+
+    finally:
+        db.close()
+
+    invalidate_user_recommendations(user_id)
+    _record_progress(user_id, job_id, completed, len(memory_ids) - completed, total)
+
+
+def _extraction_batches(memories: list[ScentMemory]) -> list[list[ScentMemory]]:
+    batches: list[list[ScentMemory]] = []
+    current: list[ScentMemory] = []
+    chars = 0
+
+    for memory in memories:
+        length = len(memory.content or "")
+        if current and (
+            len(current) >= settings.BULK_EXTRACTION_BATCH_SIZE
+            or chars + length > settings.BULK_EXTRACTION_MAX_CHARS
+        ):
+            batches.append(current)
+            current, chars = [], 0
+        current.append(memory)
+        chars += length
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _extract_batch(db: Session, memories: list[ScentMemory]) -> None:
+    pending = [memory for memory in memories if not _stage_done(memory, "extract")]
+    texts = [memory for memory in pending if not memory.file_path]
+    files = [memory for memory in pending if memory.file_path]
+
+    for batch in _extraction_batches(texts):
+        results = extract_scents_batch([
+            (memory.content or "", memory.emotion, memory.occasion) for memory in batch
+        ])
+
+        for memory, scent_data in zip(batch, results):
+            original_content = memory.content or ""
+            description = process_text(memory, db, original_content, scent_data)
+            memory.content = f"{original_content}\n\n{description}"
+            _mark_stage_done(memory, "extract")
+
+        # Checkpoint each extraction call so a retry never repeats it
+        db.commit()
+
+    # Images and PDFs still need one vision/extraction call each
+    for memory in files:
+        file_data: FileData = {
+            "type": "blob",
+            "key": memory.file_path,
+            "content_type": memory.mime_type or "",
+            "extension": PurePosixPath(memory.file_path).suffix,
+        }
+
+        try:
+            with db.begin_nested():
+                _extract(db, memory, file_data)
+                _mark_stage_done(memory, "extract")
+        except ValueError as e:
+            logger.warning(f"Import extraction failed for memory {memory.id}: {e}")
+            memory.processing_error = f"extract: {e}"[:500]
+
+        db.commit()
+        _release_blob(db, memory.file_path, memory.id)
+
+
+def _index_batch(db: Session, user_id: str, memories: list[ScentMemory]) -> None:
+    if not memories:
+        return
+
+    chunks: list[MemoryChunk] = db.query(MemoryChunk).filter(
+        MemoryChunk.memory_id.in_([memory.id for memory in memories])
+    ).order_by(MemoryChunk.memory_id, MemoryChunk.chunk_index).all()
+
+    if not chunks:
+        return
+
+    # Stored on the rows like the embed stage does, so a retried batch only
+    # embeds what is missing; generate_embeddings splits into
+    # EMBEDDING_BATCH_SIZE requests itself
+    missing = [chunk for chunk in chunks if chunk.embedding is None]
+    if missing:
+        for chunk, embedding in zip(missing, generate_embeddings([chunk.content for chunk in missing])):
+            chunk.embedding = pack_embedding(embedding)
+        # Kept even if indexing fails and the batch is retried
+        db.commit()
+    embeddings: list[list[float]] = [unpack_embedding(chunk.embedding) for chunk in chunks]
+
+    chunk_ids: list[str] = [chunk.vector_id or str(chunk.id) for chunk in chunks]
+    metadatas: list[EmbeddingMetadata] = [
+        {"user_id": user_id, "memory_id": str(chunk.memory_id)} for chunk in chunks
+    ]
+
+    store_embeddings(
+        chunk_ids=chunk_ids,
+        embeddings=embeddings,
+        metadatas=metadatas
+    )
+    delete_stale_embeddings([str(memory.id) for memory in memories], keep=chunk_ids)
+
+    for chunk, vector_id in zip(chunks, chunk_ids):
+        chunk.vector_id = vector_id
+
+
+def _record_progress(
+    user_id: str,
+    job_id: str,
+    completed: int,
+    failed: int,
+    total: int
+) -> None:
+    key = f"import_progress:{job_id}"
+
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hincrby(key, "completed", completed)
+        pipe.hincrby(key, "failed", failed)
+        pipe.expire(key, IMPORT_PROGRESS_TTL)
+        done_completed, done_failed, _ = pipe.execute()
+
+        message: WebSocketMessage = {
+            "user_id": user_id,
+            "event": "import_progress",
+            "job_id": job_id,
+            "completed": done_completed,
+            "failed": done_failed,
+            "total": total,
+        }
+        messages = [message]
+
+        if done_completed + done_failed >= total:
+            messages.append({**message, "event": "import_completed"})
+            logger.info(f"Import {job_id} finished: {done_completed} processed, {done_failed} failed")
+
+        publish_events(messages)
+
+    except Exception as e:
+        logger.warning(f"Failed to record import progress for {job_id}: {e}")
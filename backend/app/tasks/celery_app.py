@@ -1,28 +1,82 @@
+import logging
 import os
 
 from celery import Celery
+from celery.signals import worker_process_shutdown, worker_shutdown
 from ..core.config import settings
+from ..services.event_publisher import flush_events
 
 celery_app = Celery("scent_memory", broker=settings.REDIS_URL, backend=settings.REDIS_URL)
 
+# Pipeline tasks mostly wait on OpenAI/Chroma HTTP, so an I/O pool ("threads",
+# or "gevent" when installed) keeps many calls in flight in one process.
+# prefork stays the default: one process per slot, so keep it small.
+CELERY_POOL = os.getenv("CELERY_POOL", "prefork")
+IO_POOLS = {"threads", "gevent", "eventlet"}
+
 # Limit concurrency to prevent memory issues on Railway
-# Default to 2 workers
-CELERY_CONCURRENCY = int(os.getenv("CELERY_CONCURRENCY", "2"))
+# Default to 2 prefork workers, 16 threads/greenlets for I/O pools
+CELERY_CONCURRENCY = int(os.getenv(
+    "CELERY_CONCURRENCY",
+    "16" if CELERY_POOL in IO_POOLS else "2"
+))
+
+if CELERY_POOL == "gevent":
+    try:
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
+    except ImportError:
+        logging.getLogger(__name__).warning(
+            "psycogreen not installed - Postgres calls will block the gevent hub"
+        )
+
+# One queue per memory pipeline stage so slow vision/extraction calls cannot
+# starve embedding and indexing work; run a worker per queue to tune each.
+MEMORY_PIPELINE_QUEUES = {
+    "app.tasks.process_memory.extract_memory_stage": "memory_extract",
+    "app.tasks.process_memory.embed_memory_stage": "memory_embed",
+    "app.tasks.process_memory.index_memory_stage": "memory_index",
+    "app.tasks.process_memory.finalize_memory_stage": "memory_finalize",
+}
+
+# Bulk imports get their own queue so a 10k-memory onboarding cannot delay
+# interactive uploads; its worker concurrency throttles the import.
+BULK_IMPORT_QUEUE = "memory_import"
 
 celery_app.conf.update(
     task_serializer='json',
     accept_content=['json'],
     result_serializer='json',
     timezone='UTC',
+    worker_pool=CELERY_POOL,
     worker_concurrency=CELERY_CONCURRENCY,
     worker_prefetch_multiplier=1,  # Prevent memory bloat from prefetching
     task_acks_late=True,  # Acknowledge after task completes
+    worker_max_memory_per_child=int(os.getenv("CELERY_MAX_MEMORY_PER_CHILD_KB", "400000")),  # prefork only
+    task_routes={
+        **{
+            task_name: {"queue": queue}
+            for task_name, queue in MEMORY_PIPELINE_QUEUES.items()
+        },
+        "app.tasks.bulk_import.import_memories_batch": {"queue": BULK_IMPORT_QUEUE},
+    },
 )
 
 
+# prefork children exit without running atexit hooks, so buffered events
+# (EVENT_PUBLISH_BATCH_MS > 0) are flushed explicitly
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def flush_buffered_events(**kwargs: object) -> None:
+    flush_events()
+
+
 #sudo systemctl stop redis
 #sudo systemctl start redis
 #redis-server
 #redis-cli ping
-#celery -A app.tasks.celery_app worker --loglevel=info from backend
+#celery -A app.tasks.celery_app worker --loglevel=info -Q celery,memory_extract,memory_embed,memory_index,memory_finalize,memory_import from backend
+#io mode: CELERY_POOL=threads celery -A app.tasks.celery_app worker -P threads --concurrency=16
+#per stage: celery -A app.tasks.celery_app worker -Q memory_extract --concurrency=4 -n extract@%h
+#imports: celery -A app.tasks.celery_app worker -Q memory_import --concurrency=4 -n import@%h
 #uvicorn app.main:app --reload
@@ -1,10 +1,8 @@
 from .celery_app import celery_app
 from ..database import SessionLocal
 from ..models import SpotifyLink, ExtractedScent, ScentMemory
+from ..services.event_publisher import publish_event
 from ..services.music_service import search_and_analyze_song
-import redis
-import json
-from app.core.config import settings
 
 
 #not used anymore 
@@ -45,20 +43,11 @@ def process_music_task(user_id: str, memory_id: str, artist: str, track: str, sp
         
         db.commit()
 
-        r = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
-        
-        message = {
+        publish_event({
             "user_id": user_id,
             "event": "memory_processed",
             "memory_id": memory_id,
-        }
-        
-        
-        song_result = r.publish("memory_events", json.dumps(message))
-        
-    
-
-        r.close()
+        })
 
         return {"status": "processed", "analysis": result['analysis']}
         
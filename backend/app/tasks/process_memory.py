@@ -1,96 +1,152 @@
 import base64
-import json
 import logging
 import os
-from typing import Optional
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
 from uuid import UUID
 
-import redis
+from celery import Task, chain
+from celery.exceptions import Retry
+from sqlalchemy import Integer, String, any_, case, cast, func, null
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, array, insert as pg_insert
 from sqlalchemy.orm import Session
-from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy.sql.elements import ColumnElement
 
 from .celery_app import celery_app
-from ..core.config import settings
 from ..database import SessionLocal
 from ..models import ScentMemory, MemoryChunk, ExtractedScent, ScentProfile
-from ..schemas.common import FileData, ScentData, VisionAnalysisResult
+from ..schemas.common import EmbeddingMetadata, FileData, ScentData, VisionAnalysisResult, WebSocketMessage
+from ..services.blob_refs import release_blob
+from ..services.blob_store import get_blob_store
+from ..services.chunk_writer import split_into_chunks, write_chunks
 from ..services.cache import invalidate_user_recommendations
-from ..services.embeddings import generate_embedding
+from ..services.embedding_cache import pack_embedding, unpack_embedding
+from ..services.embeddings import generate_embeddings
+from ..services.event_publisher import publish_event
+from ..services.image_preprocess import prepare_image
 from ..services.pdf_extractor import extract_text_from_pdf
 from ..services.scent_extractor import extract_scents
-from ..services.vector_db import store_embedding
+from ..services.vector_db import delete_stale_embeddings, store_embeddings
 from ..services.vision_ai import analyze_image
+from ..services.vision_cache import cache_vision_result, get_cached_vision_result
 
 
 logger = logging.getLogger(__name__)
 
 
+STAGE_MAX_RETRIES = 3
+
+
+# Pipeline: extract -> embed -> index -> finalize. Every stage runs on its own
+# queue (see celery_app.task_routes) and only receives memory/user ids; state
+# lives in Postgres (extracted scents, chunk rows and their vectors).
+# Completed stages are checkpointed in ScentMemory.chunk_metadata["stages"]
+# in the same commit as their writes, so retries and re-runs skip finished
+# stages and never repeat the LLM call or double-count the profile.
 @celery_app.task
 def process_memory_task(
     memory_id: str,
     user_id: str,
     file_data: Optional[FileData] = None
 ) -> None:
-    db: Session = SessionLocal()
+    chain(
+        extract_memory_stage.si(memory_id, user_id, file_data),
+        embed_memory_stage.si(memory_id, user_id),
+        index_memory_stage.si(memory_id, user_id),
+        finalize_memory_stage.si(memory_id, user_id),
+    ).apply_async()
+
 
+@celery_app.task(bind=True, max_retries=STAGE_MAX_RETRIES)
+def extract_memory_stage(
+    self: Task,
+    memory_id: str,
+    user_id: str,
+    file_data: Optional[FileData] = None
+) -> None:
     try:
-        memory: Optional[ScentMemory] = db.get(ScentMemory, memory_id)
+        _run_stage(self, "extract", memory_id, user_id, lambda db, memory: _extract(db, memory, file_data))
+    except Retry:
+        # Keep the upload so the retry can re-read it
+        raise
+    except Exception:
+        _release_upload(file_data, memory_id)
+        raise
 
-        if not memory:
-            raise ValueError(f"Memory {memory_id} not found")
+    _release_upload(file_data, memory_id)
 
-        file_bytes: Optional[bytes] = None
 
-        if file_data:
-            if file_data["type"] == "base64":
-                file_bytes = base64.b64decode(file_data["data"])
-            elif file_data["type"] == "temp_file":
-                with open(file_data["path"], "rb") as f:
-                    file_bytes = f.read()
-                os.remove(file_data["path"])
+@celery_app.task(bind=True, max_retries=STAGE_MAX_RETRIES)
+def embed_memory_stage(self: Task, memory_id: str, user_id: str) -> None:
+    _run_stage(self, "embed", memory_id, user_id, _embed)
 
-            if file_bytes and file_data["content_type"].startswith("image"):
-                original_content = memory.content or ""
-                description = process_image(memory, db, file_bytes)
-                memory.content = f"{original_content}\n\n{description}"
 
-            elif file_bytes and file_data["content_type"] == "application/pdf":
-                extracted_text = extract_text_from_pdf(file_bytes)
-                original_content = memory.content or ""
-                if extracted_text:
-                    memory.content = f"{memory.content}\n\nAttached PDF Content:\n{extracted_text}"
-                else:
-                    memory.content = f"{memory.content}\n\n[PDF extraction failed]"
+@celery_app.task(bind=True, max_retries=STAGE_MAX_RETRIES)
+def index_memory_stage(self: Task, memory_id: str, user_id: str) -> None:
+    _run_stage(self, "index", memory_id, user_id, _index)
 
-                description = process_text(memory, db)
-                memory.content = f"{original_content}\n\n{description}"
 
-        else:
-            original_content = memory.content or ""
-            description = process_text(memory, db)
-            memory.content = f"{original_content}\n\n{description}"
+@celery_app.task(bind=True, max_retries=STAGE_MAX_RETRIES)
+def finalize_memory_stage(self: Task, memory_id: str, user_id: str) -> None:
+    _run_stage(self, "finalize", memory_id, user_id, _finalize)
 
-        memory.processed = True
-        db.commit()
-        invalidate_user_recommendations(user_id)
-        logger.info(f"Successfully processed memory {memory_id} and invalidated cache")
+    invalidate_user_recommendations(user_id)
+    logger.info(f"Successfully processed memory {memory_id} and invalidated cache")
+
+    _publish_event(user_id, "memory_processed", memory_id)
+
+
+def _stage_done(memory: ScentMemory, stage: str) -> bool:
+    return stage in (memory.chunk_metadata or {}).get("stages", {})
+
+
+def _mark_stage_done(memory: ScentMemory, stage: str) -> None:
+    metadata = dict(memory.chunk_metadata or {})
+    stages = dict(metadata.get("stages", {}))
+    stages[stage] = datetime.now(timezone.utc).isoformat()
+    metadata["stages"] = stages
+    memory.chunk_metadata = metadata
+
+
+def _run_stage(
+    task: Task,
+    stage: str,
+    memory_id: str,
+    user_id: str,
+    work: Callable[[Session, ScentMemory], None]
+) -> None:
+    db: Session = SessionLocal()
+
+    try:
+        memory: Optional[ScentMemory] = db.get(ScentMemory, UUID(memory_id))
+
+        if not memory:
+            raise ValueError(f"Memory {memory_id} not found")
+
+        if _stage_done(memory, stage):
+            logger.info(f"Stage {stage} already completed for memory {memory_id}, skipping")
+            return
 
-        _publish_event(user_id, "memory_processed", memory_id)
+        work(db, memory)
+        _mark_stage_done(memory, stage)
+        db.commit()
 
     except Exception as e:
         db.rollback()
-        logger.error(f"Task failed for memory {memory_id}", exc_info=True)
 
-        if file_data and file_data.get("type") == "temp_file":
-            temp_path = file_data.get("path", "")
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)
+        if not isinstance(e, ValueError) and task.request.retries < task.max_retries:
+            countdown = 5 * 2 ** task.request.retries
+            logger.warning(f"Stage {stage} failed for memory {memory_id}, retrying in {countdown}s: {e}")
+            raise task.retry(exc=e, countdown=countdown)
+
+        logger.error(f"Stage {stage} failed for memory {memory_id}", exc_info=True)
 
         try:
-            memory = db.get(ScentMemory, memory_id)
+            memory = db.get(ScentMemory, UUID(memory_id))
             if memory:
                 memory.processed = False
-                memory.processing_error = str(e)[:500]
+                memory.processing_error = f"{stage}: {e}"[:500]
                 db.commit()
         except Exception:
             logger.warning(f"Failed to update memory error status for {memory_id}")
@@ -102,18 +158,134 @@ def process_memory_task(
         db.close()
 
 
+def _load_file_bytes(file_data: FileData) -> Optional[bytes]:
+    if file_data["type"] == "blob":
+        return get_blob_store().get(file_data["key"])
+    if file_data["type"] == "base64":
+        return base64.b64decode(file_data["data"])
+    if file_data["type"] == "temp_file":
+        with open(file_data["path"], "rb") as f:
+            return f.read()
+    return None
+
+
+def _extract(db: Session, memory: ScentMemory, file_data: Optional[FileData]) -> None:
+    original_content = memory.content or ""
+
+    if not file_data:
+        description = process_text(memory, db, original_content)
+        memory.content = f"{original_content}\n\n{description}"
+        return
+
+    file_bytes = _load_file_bytes(file_data)
+
+    if file_bytes and file_data["content_type"].startswith("image"):
+        description = process_image(memory, db, file_bytes)
+        memory.content = f"{original_content}\n\n{description}"
+
+    elif file_bytes and file_data["content_type"] == "application/pdf":
+        extracted_text = extract_text_from_pdf(file_bytes)
+        if extracted_text:
+            source_text = f"{original_content}\n\nAttached PDF Content:\n{extracted_text}"
+        else:
+            source_text = f"{original_content}\n\n[PDF extraction failed]"
+
+        description = process_text(memory, db, source_text)
+        memory.content = f"{original_content}\n\n{description}"
+
+
+def _embed(db: Session, memory: ScentMemory) -> None:
+    # Vectors are stored on the chunk rows in this stage's commit, so the
+    # index stage never calls OpenAI again
+    chunks = [chunk for chunk in _memory_chunks(db, memory) if chunk.embedding is None]
+    if chunks:
+        embeddings = generate_embeddings([chunk.content for chunk in chunks])
+        for chunk, embedding in zip(chunks, embeddings):
+            chunk.embedding = pack_embedding(embedding)
+
+
+def _index(db: Session, memory: ScentMemory) -> None:
+    chunks = _memory_chunks(db, memory)
+    if not chunks:
+        delete_stale_embeddings([str(memory.id)], keep=[])
+        return
+
+    # Chunks embedded before vectors were stored on the rows
+    _embed(db, memory)
+    embeddings: list[list[float]] = [unpack_embedding(chunk.embedding) for chunk in chunks]
+
+    # Older rows may carry a vector_id that predates deterministic chunk ids
+    chunk_ids: list[str] = [chunk.vector_id or str(chunk.id) for chunk in chunks]
+    metadata: EmbeddingMetadata = {"user_id": str(memory.user_id), "memory_id": str(memory.id)}
+
+    store_embeddings(
+        chunk_ids=chunk_ids,
+        embeddings=embeddings,
+        metadatas=[metadata] * len(chunk_ids)
+    )
+    delete_stale_embeddings([str(memory.id)], keep=chunk_ids)
+
+    # Set only once Chroma has the vector; committed with the stage checkpoint
+    for chunk, vector_id in zip(chunks, chunk_ids):
+        chunk.vector_id = vector_id
+
+
+def _finalize(db: Session, memory: ScentMemory) -> None:
+    extracted: Optional[ExtractedScent] = db.query(ExtractedScent).filter(
+        ExtractedScent.memory_id == memory.id
+    ).order_by(ExtractedScent.created_at.desc()).first()
+
+    if extracted:
+        scent_data: ScentData = {
+            "top_notes": extracted.top_notes or [],
+            "heart_notes": extracted.heart_notes or [],
+            "base_notes": extracted.base_notes or [],
+        }
+        if extracted.scent_family:
+            scent_data["scent_family"] = extracted.scent_family
+        if extracted.emotion:
+            scent_data["emotion"] = extracted.emotion
+
+        update_scent_profile(memory.user_id, scent_data, memory, db)
+
+    memory.processed = True
+    memory.processing_error = None
+
+
+def _memory_chunks(db: Session, memory: ScentMemory) -> list[MemoryChunk]:
+    return db.query(MemoryChunk).filter(
+        MemoryChunk.memory_id == memory.id
+    ).order_by(MemoryChunk.chunk_index).all()
+
+
+def _release_upload(file_data: Optional[FileData], memory_id: str) -> None:
+    if not file_data:
+        return
+
+    if file_data.get("type") == "temp_file":
+        temp_path = file_data.get("path", "")
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    elif file_data.get("type") == "blob":
+        db = SessionLocal()
+        try:
+            _release_blob(db, file_data["key"], UUID(memory_id))
+        finally:
+            db.close()
+
+
+def _release_blob(db: Session, key: str, memory_id: UUID) -> None:
+    release_blob(db, get_blob_store(), key, memory_id)
+
+
 def _publish_event(
     user_id: str,
     event: str,
     memory_id: str,
     error: Optional[str] = None
 ) -> None:
-    r: redis.Redis[str] = redis.Redis.from_url(
-        settings.redis_url_computed,
-        decode_responses=True
-    )
-
-    message: dict[str, str] = {
+    message: WebSocketMessage = {
         "user_id": user_id,
         "event": event,
         "memory_id": memory_id,
@@ -122,168 +294,184 @@ def _publish_event(
     if error:
         message["error"] = error
 
-    result = r.publish("memory_events", json.dumps(message))
+    publish_event(message)
 
-    if result == 0:
-        logger.info("No subscribers listening to memory_events!")
 
-    r.close()
+def _save_extracted_scent(
+    db: Session,
+    memory: ScentMemory,
+    scent_data: ScentData | VisionAnalysisResult,
+    description: Optional[str],
+    source: str
+) -> ExtractedScent:
+    # Upsert: re-running extraction replaces the previous LLM result
+    extracted: Optional[ExtractedScent] = db.query(ExtractedScent).filter(
+        ExtractedScent.memory_id == memory.id,
+        ExtractedScent.source == source,
+        ExtractedScent.extraction_method == 'llm'
+    ).first()
+
+    if not extracted:
+        extracted = ExtractedScent(
+            memory_id=memory.id,
+            source=source,
+            extraction_method='llm'
+        )
+        db.add(extracted)
+
+    extracted.scent_name = scent_data.get('scent_name')
+    extracted.brand = scent_data.get('brand')
+    extracted.top_notes = scent_data.get('top_notes', [])
+    extracted.heart_notes = scent_data.get('heart_notes', [])
+    extracted.base_notes = scent_data.get('base_notes', [])
+    extracted.description = description
+    extracted.emotion = scent_data.get('emotion')
+    extracted.scent_family = scent_data.get('scent_family')
+    extracted.color = scent_data.get('color')
+    extracted.confidence = 0.85
+
+    db.flush()
+    return extracted
 
 
 def process_image(memory: ScentMemory, db: Session, file_bytes: bytes) -> str:
 
-    vision_result: VisionAnalysisResult = analyze_image(
-        file_bytes,
-        memory.content or "",
-        memory.emotion,
-        memory.occasion
-    )
+    image = prepare_image(file_bytes)
+
+    cached_result = get_cached_vision_result(image["phash"], str(memory.user_id), memory.emotion, memory.occasion)
+    if cached_result is not None:
+        vision_result: VisionAnalysisResult = cached_result
+    else:
+        vision_result = analyze_image(
+            image,
+            memory.content or "",
+            memory.emotion,
+            memory.occasion
+        )
+        cache_vision_result(image["phash"], str(memory.user_id), memory.emotion, memory.occasion, vision_result)
 
-    extracted = ExtractedScent(
-        memory_id=memory.id,
-        scent_name=vision_result.get('scent_name'),
-        brand=vision_result.get('brand'),
-        top_notes=vision_result.get('top_notes', []),
-        heart_notes=vision_result.get('heart_notes', []),
-        base_notes=vision_result.get('base_notes', []),
-        description=vision_result.get('image_description'),
-        emotion=vision_result.get('emotion'),
-        scent_family=vision_result.get('scent_family'),
-        color=vision_result.get('color'),
-        confidence=0.85,
-        source='image',
-        extraction_method='llm'
-    )
+    metadata = dict(memory.chunk_metadata or {})
+    metadata["image"] = {key: value for key, value in image.items() if key != "data"}
+    metadata["image"]["vision_cache_hit"] = cached_result is not None
+    memory.chunk_metadata = metadata
 
-    db.add(extracted)
-    db.flush()
+    _save_extracted_scent(db, memory, vision_result, vision_result.get('image_description'), 'image')
 
     enhanced_content = f"{memory.content}\n\nAttached image description: {vision_result.get('image_description')}"
 
-    update_scent_profile(memory.user_id, vision_result, memory, db)
-
-    _create_chunks_and_embeddings(memory, enhanced_content, db)
+    _create_chunks(memory, enhanced_content, db)
 
     return vision_result.get('image_description', '')
 
 
-def process_text(memory: ScentMemory, db: Session) -> str:
-
-    scent_data: ScentData = extract_scents(
-        memory.content or "",
-        memory.emotion,
-        memory.occasion
-    )
-
-    extracted = ExtractedScent(
-        memory_id=memory.id,
-        scent_name=scent_data.get('scent_name'),
-        brand=scent_data.get('brand'),
-        top_notes=scent_data.get('top_notes', []),
-        heart_notes=scent_data.get('heart_notes', []),
-        base_notes=scent_data.get('base_notes', []),
-        description=scent_data.get('description'),
-        scent_family=scent_data.get('scent_family'),
-        emotion=scent_data.get('emotion'),
-        color=scent_data.get('color'),
-        confidence=0.85,
-        source='text',
-        extraction_method='llm'
-    )
-
-    db.add(extracted)
-    db.flush()
+def process_text(
+    memory: ScentMemory,
+    db: Session,
+    text: str,
+    scent_data: Optional[ScentData] = None
+) -> str:
+
+    # Bulk imports pass in results from a batched extraction call
+    if scent_data is None:
+        scent_data = extract_scents(
+            text,
+            memory.emotion,
+            memory.occasion
+        )
 
-    enhanced_content = f"{memory.content}\n\nMemory description: {scent_data.get('description')}"
+    _save_extracted_scent(db, memory, scent_data, scent_data.get('description'), 'text')
 
-    update_scent_profile(memory.user_id, scent_data, memory, db)
+    enhanced_content = f"{text}\n\nMemory description: {scent_data.get('description')}"
 
-    _create_chunks_and_embeddings(memory, enhanced_content, db)
+    _create_chunks(memory, enhanced_content, db)
 
     return scent_data.get('description', '')
 
 
-def _create_chunks_and_embeddings(
+def _create_chunks(
     memory: ScentMemory,
     content: str,
     db: Session
 ) -> None:
-    chunks: list[str] = [content[i:i+500] for i in range(0, len(content), 450)]
-
-    for idx, chunk_text in enumerate(chunks):
-        embedding: list[float] = generate_embedding(chunk_text)
-        chunk = MemoryChunk(
-            memory_id=memory.id,
-            content=chunk_text,
-            chunk_index=idx
-        )
-        db.add(chunk)
-        db.flush()
-
-        store_embedding(
-            chunk_id=str(chunk.id),
-            embedding=embedding,
-            metadata={"user_id": str(memory.user_id), "memory_id": str(memory.id)}
-        )
+    write_chunks(db, memory.id, split_into_chunks(content))
 
-        chunk.vector_id = str(chunk.id)
 
+NOTE_LAYERS = ("top", "heart", "base")
+NOTE_PAIRS_PER_CALL = 50  # Postgres functions take at most 100 arguments
 
-def update_scent_profile(
-    user_id: UUID,
-    scent_data: ScentData | VisionAnalysisResult,
-    memory: ScentMemory,
-    db: Session
-) -> None:
-    profile: Optional[ScentProfile] = db.query(ScentProfile).filter_by(
-        user_id=user_id
-    ).first()
 
-    if not profile:
-        profile = ScentProfile(
-            user_id=user_id,
-            preferred_families=[],
-            disliked_notes=[],
-            note_occurrence_counts={"top": {}, "heart": {}, "base": {}},
-            emotional_preferences=[],
-        )
-        db.add(profile)
-        db.flush()
+def _note_counts_update(counts: dict[str, Counter[str]]) -> ColumnElement[Any]:
+    # counts || {layer: counts->layer || {note: (counts#>>'{layer,note}')::int + n}}
+    # Only this memory's notes appear in the expression and each increment
+    # reads the locked row, so concurrent workers never lose updates.
+    column = ScentProfile.note_occurrence_counts
+    layers: list[Any] = []
 
-    if not profile.note_occurrence_counts:
-        profile.note_occurrence_counts = {"top": {}, "heart": {}, "base": {}}
+    for layer, notes in counts.items():
+        increments: list[Any] = []
+        for note, n in notes.items():
+            increments.append(cast(note, String))
+            increments.append(func.coalesce(column[(layer, note)].astext.cast(Integer), 0) + n)
 
-    for note in scent_data.get('top_notes', []):
-        if note:
-            profile.note_occurrence_counts["top"][note] = (
-                profile.note_occurrence_counts["top"].get(note, 0) + 1
+        # Long note lists are split over several ||-joined objects
+        layer_counts = func.coalesce(column[layer], cast({}, JSONB))
+        for start in range(0, len(increments), 2 * NOTE_PAIRS_PER_CALL):
+            layer_counts = layer_counts.op("||")(
+                func.jsonb_build_object(*increments[start:start + 2 * NOTE_PAIRS_PER_CALL])
             )
 
-    for note in scent_data.get('heart_notes', []):
-        if note:
-            profile.note_occurrence_counts["heart"][note] = (
-                profile.note_occurrence_counts["heart"].get(note, 0) + 1
-            )
+        layers.append(cast(layer, String))
+        layers.append(layer_counts)
 
-    for note in scent_data.get('base_notes', []):
-        if note:
-            profile.note_occurrence_counts["base"][note] = (
-                profile.note_occurrence_counts["base"].get(note, 0) + 1
-            )
+    return func.coalesce(column, cast({}, JSONB)).op("||")(func.jsonb_build_object(*layers))
 
-    family = scent_data.get('scent_family')
-    if family and family not in profile.preferred_families:
-        profile.preferred_families.append(family)
 
-    if memory.emotion and memory.emotion not in profile.emotional_preferences:
-        profile.emotional_preferences.append(memory.emotion)
+def _append_missing(column: Any, values: list[str]) -> ColumnElement[Any]:
+    # column || array_remove(ARRAY[CASE WHEN v = ANY(column) THEN NULL ELSE v END, ...], NULL)
+    missing = array([
+        case((cast(value, String) == any_(column), null()), else_=cast(value, String))
+        for value in values
+    ])
+    return func.coalesce(column, cast([], ARRAY(String))).op("||")(func.array_remove(missing, null()))
 
-    emotion = scent_data.get('emotion')
-    if emotion and emotion not in profile.emotional_preferences:
-        profile.emotional_preferences.append(emotion)
 
-    flag_modified(profile, 'preferred_families')
-    flag_modified(profile, 'emotional_preferences')
-    flag_modified(profile, 'note_occurrence_counts')
+def update_scent_profile(
+    user_id: UUID,
+    scent_data: ScentData | VisionAnalysisResult,
+    memory: ScentMemory,
+    db: Session
+) -> None:
+    counts: dict[str, Counter[str]] = {}
+    for layer in NOTE_LAYERS:
+        notes = Counter(note for note in scent_data.get(f'{layer}_notes', []) or [] if note)
+        if notes:
+            counts[layer] = notes
+
+    family = scent_data.get('scent_family')
+    families = [family] if family else []
+    emotions = list(dict.fromkeys(e for e in (memory.emotion, scent_data.get('emotion')) if e))
+
+    # One INSERT ... ON CONFLICT DO UPDATE: the profile row is created or
+    # incremented in place, no read-modify-write of the whole document.
+    stmt = pg_insert(ScentProfile).values(
+        user_id=user_id,
+        preferred_families=families,
+        disliked_notes=[],
+        note_occurrence_counts={layer: dict(counts.get(layer, {})) for layer in NOTE_LAYERS},
+        emotional_preferences=emotions,
+        total_memories=1,
+        total_queries=0,
+    )
 
-    profile.total_memories += 1
+    update_values: dict[str, Any] = {
+        "total_memories": func.coalesce(ScentProfile.total_memories, 0) + 1,
+        "last_updated": func.now(),
+    }
+    if counts:
+        update_values["note_occurrence_counts"] = _note_counts_update(counts)
+    if families:
+        update_values["preferred_families"] = _append_missing(ScentProfile.preferred_families, families)
+    if emotions:
+        update_values["emotional_preferences"] = _append_missing(ScentProfile.emotional_preferences, emotions)
+
+    db.execute(stmt.on_conflict_do_update(index_elements=[ScentProfile.user_id], set_=update_values))
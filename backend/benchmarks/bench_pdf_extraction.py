@@ -0,0 +1,111 @@
+"""Benchmark PDF text extraction throughput (pages/second).
+
+Usage (from backend/):
+    python -m benchmarks.bench_pdf_extraction path/to/pdfs/
+    python -m benchmarks.bench_pdf_extraction --synthetic 5 --pages 120
+
+Compares the pdfplumber layout backend, inline and across the process pool,
+with the pdfium text-only backend, with the character budget disabled.
+iter_pdf_pages only uses the pool for layout extraction: pdfium's text
+layer is fast enough that process IPC costs more than it saves, so text
+mode is timed inline only.
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import pypdfium2 as pdfium
+
+from app.core.config import settings
+from app.services.pdf_extractor import iter_pdf_pages
+
+
+def build_text_pdf(pages: list[str]) -> bytes:
+    objects: list[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # page tree, filled in below
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids: list[int] = []
+
+    for text in pages:
+        lines = [text[i:i + 90] for i in range(0, len(text), 90)] or [""]
+        stream = "BT /F1 10 Tf 40 800 Td 12 TL " + " ".join(
+            "({}) '".format(line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)"))
+            for line in lines
+        ) + " ET"
+        data = stream.encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(data), data))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects))
+        )
+        kids.append(len(objects))
+
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids)
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets: list[int] = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def load_corpus(args: argparse.Namespace) -> list[tuple[str, bytes]]:
+    if args.path:
+        root = Path(args.path)
+        files = sorted(root.glob("*.pdf")) if root.is_dir() else [root]
+        return [(f.name, f.read_bytes()) for f in files]
+
+    paragraph = "Bergamot, neroli and a trace of sea salt drift over warm cedar and ambroxan. "
+    return [
+        (f"synthetic-{i}.pdf", build_text_pdf([paragraph * 30] * args.pages))
+        for i in range(args.synthetic)
+    ]
+
+
+def run(corpus: list[tuple[str, bytes]], layout: bool, workers: int) -> tuple[int, float]:
+    settings.PDF_WORKERS = workers
+    settings.PDF_PARALLEL_MIN_PAGES = 1
+    pages = 0
+    started = time.perf_counter()
+
+    for _, data in corpus:
+        pages += sum(1 for _ in iter_pdf_pages(data, max_chars=10**12, layout=layout))
+
+    return pages, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", help="PDF file or directory of PDFs")
+    parser.add_argument("--synthetic", type=int, default=3, help="synthetic PDFs when no path is given")
+    parser.add_argument("--pages", type=int, default=100, help="pages per synthetic PDF")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args)
+    total_pages = sum(len(pdfium.PdfDocument(data)) for _, data in corpus)
+    print(f"{len(corpus)} PDFs, {total_pages} pages")
+
+    for label, layout, workers in [
+        ("pdfplumber (layout), inline", True, 1),
+        (f"pdfplumber (layout), {args.workers} processes", True, args.workers),
+        ("pdfium (text), inline", False, 1),
+    ]:
+        pages, elapsed = run(corpus, layout, workers)
+        print(f"{label:<32} {pages:>6} pages  {elapsed:7.2f}s  {pages / elapsed:8.1f} pages/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Load test /api/query/search against a single uvicorn worker.
+
+Usage (from backend/, with the API running as one worker):
+    uvicorn app.main:app --workers 1 --port 8000
+    python -m benchmarks.bench_search_concurrency --email me@example.com --password ...
+    python -m benchmarks.bench_search_concurrency --token <jwt> --concurrency 1 8 32 64 128
+
+Fires --requests searches at each concurrency level and reports throughput
+and latency percentiles, while a probe polls /health to show whether other
+routes stay responsive under load. Searches bypass the recommendation cache
+by default so every request pays for the full completion.
+
+Raise QUERY_LIMIT_PER_DAY for the test account first; 429 responses are
+counted separately and excluded from the latency figures.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+QUERIES = [
+    "Something that smells like a summer rainstorm",
+    "A warm perfume for autumn evenings",
+    "What would remind me of my grandmother's garden?",
+    "Fresh citrus for the office",
+    "Something smoky and woody for winter",
+]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def login(client: httpx.AsyncClient, email: str, password: str) -> str:
+    response = await client.post("/api/auth/login", data={"username": email, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def probe_health(client: httpx.AsyncClient, stop: asyncio.Event, latencies: list[float]) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            await client.get("/health")
+            latencies.append((time.perf_counter() - started) * 1000)
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.1)
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    token: str,
+    concurrency: int,
+    requests: int,
+    use_cache: bool
+) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    health_latencies: list[float] = []
+    statuses: dict[int, int] = {}
+
+    async def search(i: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post(
+                    "/api/query/search",
+                    params={"use_cache": str(use_cache).lower()},
+                    headers={"Authorization": f"Bearer {token}"},
+                    json={"query": f"{QUERIES[i % len(QUERIES)]} ({i})"}
+                )
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_health(client, stop, health_latencies))
+
+    started = time.perf_counter()
+    await asyncio.gather(*[search(i) for i in range(requests)])
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await probe
+
+    ok = statuses.get(200, 0)
+    print(
+        f"conc {concurrency:>4}  ok {ok:>5}/{requests:<5} {ok / elapsed:8.2f} req/s  "
+        f"p50 {percentile(latencies, 50):8.0f}ms  p95 {percentile(latencies, 95):8.0f}ms  "
+        f"health p95 {percentile(health_latencies, 95):6.0f}ms  "
+        f"(mean {statistics.fmean(health_latencies) if health_latencies else 0:.0f}ms)  "
+        f"other statuses {dict((k, v) for k, v in statuses.items() if k != 200)}"
+    )
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 10)
+    timeout = httpx.Timeout(args.timeout)
+
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout) as client:
+        token = args.token or await login(client, args.email, args.password)
+
+        for concurrency in args.concurrency:
+            await run_level(client, token, concurrency, args.requests or concurrency * 4, args.use_cache)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token", help="bearer token; otherwise log in with --email/--password")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--requests", type=int, default=0, help="requests per level (default 4x concurrency)")
+    parser.add_argument("--use-cache", action="store_true", help="allow recommendation cache hits")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    if not args.token and not (args.email and args.password):
+        parser.error("pass --token or --email and --password")
+
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Offline retrieval evaluation: recall@k and latency per retriever.
+
+Usage (from backend/, with Postgres, ChromaDB and an OpenAI key configured):
+    python -m benchmarks.eval_retrieval
+    python -m benchmarks.eval_retrieval --fixture my_memories.json --k 1 3 5 10 --repeat 5
+
+Seeds the fixture memories (chunks, extracted scents and embeddings) for a
+throwaway user, runs every query through the vector, lexical and hybrid
+retrievers, with and without MMR re-ranking, and prints mean recall@k over
+the memories behind the returned chunks, plus retrieval latency
+percentiles. Query embeddings are computed up front, so latency covers
+retrieval only. The user and their vectors are deleted afterwards.
+
+Fixture format: {"memories": [{"title", "content", "scent": {...}}],
+"queries": [{"query", "relevant": [memory titles]}]}.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+from app.core.config import settings
+from app.database import SessionLocal, get_async_session_factory
+from app.models import ExtractedScent, MemoryChunk, MemoryType, ScentMemory, User
+from app.services.chunk_writer import split_into_chunks, write_chunks
+from app.services.embeddings import generate_embeddings
+from app.services.retrieval import retrieve_chunk_ids
+from app.services.vector_db import delete_user_embeddings, store_embeddings
+
+
+DEFAULT_FIXTURE = Path(__file__).parent / "fixtures" / "retrieval_eval.json"
+# (label, RETRIEVAL_MODE, MMR_LAMBDA); lambda 1.0 disables MMR
+RETRIEVERS = [
+    ("vector", "vector", 1.0),
+    ("vector+mmr", "vector", settings.MMR_LAMBDA),
+    ("lexical", "lexical", 1.0),
+    ("hybrid", "hybrid", 1.0),
+    ("hybrid+mmr", "hybrid", settings.MMR_LAMBDA),
+]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def seed(fixture: dict[str, Any]) -> tuple[str, dict[str, str]]:
+    # Returns the user id and a chunk id -> memory title map
+    db = SessionLocal()
+    try:
+        user = User(email=f"retrieval-eval-{uuid.uuid4().hex[:8]}@example.invalid", hashed_password="!")
+        db.add(user)
+        db.flush()
+
+        for item in fixture["memories"]:
+            memory = ScentMemory(
+                user_id=user.id,
+                title=item["title"],
+                content=item["content"],
+                memory_type=MemoryType.TEXT,
+                processed=True
+            )
+            db.add(memory)
+            db.flush()
+
+            write_chunks(db, memory.id, split_into_chunks(item["content"]))
+            if item.get("scent"):
+                db.add(ExtractedScent(memory_id=memory.id, confidence=1.0, source="eval", **item["scent"]))
+
+        db.commit()
+
+        chunks = db.query(MemoryChunk).join(ScentMemory).filter(ScentMemory.user_id == user.id).all()
+        titles = {m.id: m.title for m in db.query(ScentMemory).filter_by(user_id=user.id)}
+        chunk_titles = {str(c.id): titles[c.memory_id] for c in chunks}
+
+        store_embeddings(
+            chunk_ids=[str(c.id) for c in chunks],
+            embeddings=generate_embeddings([c.content for c in chunks]),
+            metadatas=[{"user_id": str(user.id), "memory_id": str(c.memory_id)} for c in chunks]
+        )
+        return str(user.id), chunk_titles
+    finally:
+        db.close()
+
+
+def cleanup(user_id: str) -> None:
+    delete_user_embeddings(user_id)
+    db = SessionLocal()
+    try:
+        user = db.get(User, uuid.UUID(user_id))
+        if user:
+            db.delete(user)
+            db.commit()
+    finally:
+        db.close()
+
+
+async def evaluate(
+    fixture: dict[str, Any],
+    user_id: str,
+    chunk_titles: dict[str, str],
+    ks: list[int],
+    repeat: int
+) -> None:
+    queries = fixture["queries"]
+    embeddings = generate_embeddings([q["query"] for q in queries])
+    top_k = max(ks)
+
+    print(f"{'retriever':<12}" + "".join(f"  recall@{k:<3}" for k in ks) + "     p50 ms    p95 ms")
+
+    async with get_async_session_factory()() as db:
+        for label, mode, mmr_lambda in RETRIEVERS:
+            settings.MMR_LAMBDA = mmr_lambda
+            recalls: dict[int, list[float]] = {k: [] for k in ks}
+            latencies: list[float] = []
+
+            for query, embedding in zip(queries, embeddings):
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    chunk_ids = await retrieve_chunk_ids(db, query["query"], embedding, user_id, top_k=top_k, mode=mode)
+                    latencies.append((time.perf_counter() - started) * 1000)
+
+                relevant = set(query["relevant"])
+                for k in ks:
+                    found = {chunk_titles[c] for c in chunk_ids[:k] if c in chunk_titles}
+                    recalls[k].append(len(found & relevant) / len(relevant))
+
+            print(
+                f"{label:<12}"
+                + "".join(f"  {sum(recalls[k]) / len(recalls[k]):<9.3f}" for k in ks)
+                + f"  {percentile(latencies, 50):8.1f}  {percentile(latencies, 95):8.1f}"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", type=Path, default=DEFAULT_FIXTURE)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per query and retriever")
+    args = parser.parse_args()
+
+    fixture = json.loads(args.fixture.read_text())
+    user_id, chunk_titles = seed(fixture)
+    try:
+        asyncio.run(evaluate(fixture, user_id, chunk_titles, sorted(args.k), args.repeat))
+    finally:
+        cleanup(user_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,19 @@ until redis-cli -u "$REDIS_URL" ping 2>/dev/null; do
   sleep 2
 done
 
-echo "Starting Celery worker with concurrency=${CELERY_CONCURRENCY:-2}..."
+CELERY_POOL=${CELERY_POOL:-prefork}
+if [ "$CELERY_POOL" = "prefork" ]; then
+  CELERY_CONCURRENCY=${CELERY_CONCURRENCY:-2}
+else
+  CELERY_CONCURRENCY=${CELERY_CONCURRENCY:-16}
+fi
+export CELERY_POOL CELERY_CONCURRENCY
+
+CELERY_QUEUES=${CELERY_QUEUES:-celery,memory_extract,memory_embed,memory_index,memory_finalize,memory_import}
+
+echo "Starting Celery ${CELERY_POOL} worker with concurrency=${CELERY_CONCURRENCY} on queues ${CELERY_QUEUES}..."
 exec celery -A app.tasks.celery_app worker \
     --loglevel=info \
-    --concurrency=${CELERY_CONCURRENCY:-2}
+    --pool=${CELERY_POOL} \
+    --concurrency=${CELERY_CONCURRENCY} \
+    --queues=${CELERY_QUEUES}
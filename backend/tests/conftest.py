@@ -1,12 +1,15 @@
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from unittest.mock import Mock, patch
 import uuid
 import os
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import Mock, patch, MagicMock, AsyncMock
 from app.main import app
+from app.core.config import settings
 from app.database import get_db, engine, SessionLocal, Base
 from app.models import User, ScentMemory, MemoryChunk, ScentProfile, QueryLog
 from app.api.auth import get_password_hash, create_access_token
@@ -49,8 +52,15 @@ def mock_chromadb():
         mock_client_instance.get_or_create_collection.return_value = mock_collection
         mock_client_instance.get_collection.return_value = mock_collection
         mock_client.return_value = mock_client_instance
-        
-        yield mock_collection
+
+        # Async client used by the search route returns the same results
+        mock_async_collection = MagicMock()
+        mock_async_collection.query = AsyncMock(side_effect=lambda **kwargs: mock_collection.query(**kwargs))
+        mock_async_client = MagicMock()
+        mock_async_client.get_or_create_collection = AsyncMock(return_value=mock_async_collection)
+
+        with patch('app.services.vector_db._async_client', mock_async_client):
+            yield mock_collection
 
 
 
@@ -91,12 +101,26 @@ def client(db_session):
         finally:
             pass
     
+    # Async routes (and streams opening their own sessions) get connections
+    # to the same test database; NullPool because every TestClient runs on a
+    # fresh event loop
+    async_engine = create_async_engine(settings.async_database_url, poolclass=NullPool)
+    async_session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+
     app.dependency_overrides[get_db] = override_get_db
-    with TestClient(app) as test_client:
+    with patch('app.database._async_session_factory', async_session_factory), TestClient(app) as test_client:
         yield test_client
     app.dependency_overrides.clear()
 
 
+@pytest.fixture
+def flush_query_logs(client):
+    """Write queued query logs now instead of waiting for the background writer."""
+    from app.services.query_log_writer import flush_query_logs as flush
+
+    return lambda: client.portal.call(flush)
+
+
 @pytest.fixture
 def test_user(db_session):
     """Create a test user."""
@@ -160,6 +184,29 @@ def test_scent_profile(db_session, test_user):
     return profile
 
 
+@pytest.fixture(autouse=True)
+def blob_store(tmp_path):
+    """Use a per-test local blob store instead of the configured backend."""
+    from app.services.blob_store import LocalBlobStore
+
+    store = LocalBlobStore(str(tmp_path / "blobs"))
+    with patch('app.api.memories.get_blob_store', return_value=store), \
+         patch('app.tasks.process_memory.get_blob_store', return_value=store):
+        yield store
+
+
+@pytest.fixture(autouse=True)
+def celery_eager():
+    """Run Celery chains in-process so pipeline stages execute synchronously."""
+    from app.tasks.celery_app import celery_app
+
+    celery_app.conf.task_always_eager = True
+    celery_app.conf.task_eager_propagates = True
+    yield
+    celery_app.conf.task_always_eager = False
+    celery_app.conf.task_eager_propagates = False
+
+
 @pytest.fixture
 def mock_celery():
     """Mock Celery task execution."""
@@ -193,15 +240,75 @@ def mock_redis():
         yield mock_redis
 
 
+@pytest.fixture(autouse=True)
+def embedding_cache_redis():
+    """Isolate the embedding cache from Redis and from other tests."""
+    from app.services.embedding_cache import clear_local_cache
+
+    clear_local_cache()
+    with patch('app.services.embedding_cache.redis_client') as mock, \
+         patch('app.services.embedding_cache.async_redis_client') as async_mock:
+        mock.mget.side_effect = lambda keys: [None] * len(keys)
+        async_mock.mget = AsyncMock(side_effect=lambda keys: [None] * len(keys))
+        async_mock.pipeline.return_value.execute = AsyncMock(return_value=[])
+        yield mock
+    clear_local_cache()
+
+
+@pytest.fixture(autouse=True)
+def recommendation_cache_redis():
+    """Keep the async recommendation cache out of Redis; every lookup misses."""
+    from app.services.cache import reset_recommendation_cache_stats
+
+    reset_recommendation_cache_stats()
+    with patch('app.services.cache.async_redis_client') as mock, \
+         patch('app.services.cache.async_binary_redis_client') as binary_mock, \
+         patch('app.services.cache._query_cache_lookup', AsyncMock(return_value=["0", None])), \
+         patch('app.services.cache._inflight_release', AsyncMock(return_value=0)):
+        mock.get = AsyncMock(return_value=None)
+        mock.setex = AsyncMock(return_value=True)
+        mock.set = AsyncMock(return_value=True)
+        mock.pipeline = Mock()
+        mock.pipeline.return_value.execute = AsyncMock(return_value=[True, True, 1, True])
+        binary_mock.hgetall = AsyncMock(return_value={})
+        binary_mock.pipeline = Mock()
+        binary_mock.pipeline.return_value.execute = AsyncMock(return_value=[1, True, 1])
+        yield mock
+
+
+@pytest.fixture(autouse=True)
+def vision_cache_redis():
+    """Keep the vision result cache out of Redis; every lookup misses."""
+    with patch('app.services.vision_cache.redis_client') as mock:
+        mock.get.return_value = None
+        mock.pipeline.return_value.execute.return_value = [set()]
+        yield mock
+
+
+@pytest.fixture(autouse=True)
+def event_publisher_redis():
+    """Capture worker events instead of publishing them to Redis."""
+    with patch('app.services.event_publisher.redis_client') as mock:
+        mock.publish.return_value = 1
+        mock.pipeline.return_value.execute.side_effect = lambda: [1]
+        yield mock
+
+
 @pytest.fixture
 def mock_embedding():
     """Mock embedding generation."""
-    with patch('app.services.embeddings.client') as mock:
+    def create_embeddings(model, input):
+        inputs = input if isinstance(input, list) else [input]
         mock_response = Mock()
-        mock_embedding = Mock()
-        mock_embedding.embedding = [0.1] * 1536
-        mock_response.data = [mock_embedding]
-        mock.embeddings.create.return_value = mock_response
+        mock_response.data = [
+            Mock(embedding=[0.1] * 1536, index=i) for i in range(len(inputs))
+        ]
+        return mock_response
+
+    with patch('app.services.embeddings.client') as mock, \
+         patch('app.services.embeddings.async_client') as async_mock:
+        mock.embeddings.create.side_effect = create_embeddings
+        async_mock.embeddings.create = AsyncMock(side_effect=create_embeddings)
         yield mock
 
 
@@ -209,6 +316,7 @@ def mock_embedding():
 def mock_vector_db():
     """Mock vector database operations."""
     with patch('app.services.vector_db.store_embedding') as store_mock, \
+         patch('app.services.vector_db.store_embeddings') as store_many_mock, \
          patch('app.services.vector_db.search_similar') as search_mock:
         search_mock.return_value = {'ids': [[]], 'distances': [[]]}
-        yield {'store': store_mock, 'search': search_mock}
\ No newline at end of file
+        yield {'store': store_mock, 'store_many': store_many_mock, 'search': search_mock}
\ No newline at end of file
@@ -0,0 +1,61 @@
+import os
+import uuid
+from io import BytesIO
+
+import pytest
+
+from app.services.blob_store import LocalBlobStore, S3BlobStore
+
+
+class TestLocalBlobStore:
+    """Test the local directory blob store."""
+
+    def test_put_is_content_addressed(self, tmp_path):
+        """Test identical content maps to the same key."""
+        store = LocalBlobStore(str(tmp_path))
+
+        key_a = store.put(BytesIO(b"rose and oud"), ".pdf")
+        key_b = store.put(BytesIO(b"rose and oud"), ".pdf")
+
+        assert key_a == key_b
+        assert key_a.endswith(".pdf")
+        assert store.get(key_a) == b"rose and oud"
+
+    def test_delete(self, tmp_path):
+        """Test deleting a blob."""
+        store = LocalBlobStore(str(tmp_path))
+        key = store.put(BytesIO(b"vetiver"))
+
+        store.delete(key)
+
+        assert not store.exists(key)
+
+    def test_rejects_path_traversal(self, tmp_path):
+        """Test keys cannot escape the store directory."""
+        store = LocalBlobStore(str(tmp_path / "blobs"))
+
+        with pytest.raises(ValueError):
+            store.get("../secret")
+
+
+@pytest.mark.integration
+@pytest.mark.skipif(not os.getenv("S3_ENDPOINT_URL"), reason="S3_ENDPOINT_URL not set (start MinIO)")
+class TestS3BlobStore:
+    """Test the S3 blob store against MinIO."""
+
+    def test_round_trip(self):
+        """Test put/get/delete against an S3-compatible endpoint."""
+        store = S3BlobStore(
+            bucket=os.getenv("S3_BUCKET", "scent-uploads"),
+            endpoint_url=os.getenv("S3_ENDPOINT_URL"),
+            access_key_id=os.getenv("S3_ACCESS_KEY_ID"),
+            secret_access_key=os.getenv("S3_SECRET_ACCESS_KEY"),
+            prefix=f"test-{uuid.uuid4()}/"
+        )
+        key = store.put(BytesIO(b"bergamot"), ".jpg")
+
+        assert store.exists(key)
+        assert store.get(key) == b"bergamot"
+
+        store.delete(key)
+        assert not store.exists(key)
@@ -0,0 +1,264 @@
+import json
+import zipfile
+from io import BytesIO
+from unittest.mock import patch
+from uuid import UUID
+
+import pytest
+from fastapi import status
+from PIL import Image
+
+from app.models import ScentMemory, MemoryChunk, MemoryType
+from app.services.bulk_import import BulkImportError, iter_jsonl_records, iter_zip_records
+from app.tasks.bulk_import import _extraction_batches, import_memories_batch
+
+
+def _jsonl(records: list[dict]) -> bytes:
+    return "\n".join(json.dumps(record) for record in records).encode()
+
+
+def _zip(entries: dict[str, bytes]) -> BytesIO:
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in entries.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def _jpeg() -> bytes:
+    output = BytesIO()
+    Image.new('RGB', (50, 50), color='purple').save(output, format='JPEG')
+    return output.getvalue()
+
+
+class TestImportParsing:
+    """Test reading import files into records."""
+
+    def test_jsonl_records(self):
+        """Test JSONL lines become records and blank lines are skipped."""
+        data = _jsonl([
+            {"title": "Rain", "content": "Petrichor walk", "emotion": "calm"},
+            {"title": "Market", "content": "Spices", "created_at": "2021-05-01T10:00:00"},
+        ]) + b"\n\n"
+
+        records = list(iter_jsonl_records(BytesIO(data)))
+
+        assert [r["title"] for r in records] == ["Rain", "Market"]
+        assert records[0]["emotion"] == "calm"
+        assert records[1]["created_at"].year == 2021
+
+    def test_jsonl_invalid_line(self):
+        """Test malformed lines report their line number."""
+        data = _jsonl([{"title": "Ok", "content": "fine"}]) + b"\n{not json"
+
+        with pytest.raises(BulkImportError, match="line 2"):
+            list(iter_jsonl_records(BytesIO(data)))
+
+    def test_zip_manifest_and_loose_files(self):
+        """Test manifests reference attachments and other entries become memories."""
+        archive = zipfile.ZipFile(_zip({
+            "journal/memories.jsonl": _jsonl([
+                {"title": "Bottle", "content": "Grandma's perfume", "file": "photos/bottle.jpg"},
+            ]),
+            "journal/photos/bottle.jpg": _jpeg(),
+            "notes/summer.txt": b"Sunscreen and salt",
+            "__MACOSX/notes/._summer.txt": b"",
+        }))
+
+        records = list(iter_zip_records(archive))
+
+        assert len(records) == 2
+        assert records[0]["file"] == "journal/photos/bottle.jpg"
+        assert records[1]["title"] == "summer"
+        assert records[1]["content"] == "Sunscreen and salt"
+
+    def test_zip_missing_reference(self):
+        """Test a manifest pointing at a missing file is rejected."""
+        archive = zipfile.ZipFile(_zip({
+            "memories.jsonl": _jsonl([{"title": "Lost", "content": "", "file": "nope.jpg"}]),
+        }))
+
+        with pytest.raises(BulkImportError, match="nope.jpg"):
+            list(iter_zip_records(archive))
+
+    def test_zip_oversized_text_entry(self, monkeypatch):
+        """Test a text entry over the size cap is rejected without reading it whole."""
+        monkeypatch.setattr("app.services.bulk_import.MAX_TEXT_ENTRY_SIZE", 1024)
+        archive = zipfile.ZipFile(_zip({"notes/huge.txt": b"a" * 10_000}))
+
+        with patch.object(archive, "open", wraps=archive.open) as mock_open, \
+             pytest.raises(BulkImportError, match="huge.txt"):
+            list(iter_zip_records(archive))
+
+        mock_open.assert_not_called()
+
+    def test_jsonl_oversized_line(self, monkeypatch):
+        """Test a single line over the record cap is rejected."""
+        monkeypatch.setattr("app.services.bulk_import.MAX_RECORD_SIZE", 100)
+        data = _jsonl([{"title": "Ok", "content": "x" * 500}])
+
+        with pytest.raises(BulkImportError, match="line 1: record too large"):
+            list(iter_jsonl_records(BytesIO(data)))
+
+    def test_extraction_batches_respect_limits(self, monkeypatch):
+        """Test extraction batches are capped by item count and characters."""
+        monkeypatch.setattr("app.tasks.bulk_import.settings.BULK_EXTRACTION_BATCH_SIZE", 3)
+        monkeypatch.setattr("app.tasks.bulk_import.settings.BULK_EXTRACTION_MAX_CHARS", 100)
+
+        memories = [ScentMemory(content="x" * 10) for _ in range(5)] + [ScentMemory(content="y" * 95)]
+
+        batches = _extraction_batches(memories)
+
+        assert [len(batch) for batch in batches] == [3, 2, 1]
+
+
+class TestImportEndpoint:
+    """Test the bulk import endpoint."""
+
+    def test_import_jsonl(self, client, auth_headers, db_session, test_user):
+        """Test a JSONL import inserts all memories and queues processing."""
+        data = _jsonl([{"title": f"Memory {i}", "content": f"Scent {i}"} for i in range(5)])
+
+        with patch('app.api.memories.start_import') as mock_start:
+            response = client.post(
+                "/api/memories/import",
+                headers=auth_headers,
+                files={"file": ("journal.jsonl", BytesIO(data), "application/jsonl")}
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        body = response.json()
+        assert body["total"] == 5
+        assert body["status"] == "processing"
+        mock_start.assert_called_once()
+
+        memories = db_session.query(ScentMemory).filter_by(user_id=test_user.id).all()
+        assert len(memories) == 5
+        assert all(m.chunk_metadata["import_job"] == body["job_id"] for m in memories)
+
+    def test_import_zip_with_image(self, client, auth_headers, db_session, test_user, blob_store):
+        """Test zip attachments are stored in the blob store."""
+        archive = _zip({"bottle.jpg": _jpeg(), "note.md": b"Cedar and smoke"})
+
+        with patch('app.api.memories.start_import'):
+            response = client.post(
+                "/api/memories/import",
+                headers=auth_headers,
+                files={"file": ("journal.zip", archive, "application/zip")}
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        photo = db_session.query(ScentMemory).filter_by(memory_type=MemoryType.PHOTO).one()
+        assert photo.mime_type == "image/jpeg"
+        assert blob_store.exists(photo.file_path)
+
+    def test_import_invalid_file(self, client, auth_headers, db_session):
+        """Test invalid imports are rejected without inserting anything."""
+        with patch('app.api.memories.start_import') as mock_start:
+            response = client.post(
+                "/api/memories/import",
+                headers=auth_headers,
+                files={"file": ("journal.jsonl", BytesIO(b"{broken"), "application/jsonl")}
+            )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        mock_start.assert_not_called()
+        assert db_session.query(ScentMemory).count() == 0
+
+    def test_failed_import_keeps_shared_blobs(self, client, auth_headers, db_session, test_user, blob_store):
+        """Test rolling back an import deletes only blobs no other memory references."""
+        photo = _jpeg()
+        key = blob_store.put(BytesIO(photo), ".jpg")
+        db_session.add(ScentMemory(user_id=test_user.id, title="Earlier", content="Bottle",
+                                   memory_type=MemoryType.PHOTO, file_path=key))
+        db_session.commit()
+        archive = _zip({
+            "memories.jsonl": _jsonl([
+                {"title": "Same bottle", "content": "", "file": "bottle.jpg"},
+                {"title": "Other bottle", "content": "", "file": "other.png"},
+            ]) + b"\n{broken",
+            "bottle.jpg": photo,
+            "other.png": b"\x89PNG\r\n\x1a\n" + b"\x00" * 64,
+        })
+
+        with patch('app.api.memories.start_import') as mock_start:
+            response = client.post(
+                "/api/memories/import",
+                headers=auth_headers,
+                files={"file": ("journal.zip", archive, "application/zip")}
+            )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        mock_start.assert_not_called()
+        assert blob_store.exists(key)
+        assert [path.name for path in blob_store.root.rglob("*") if path.is_file()] == [key.split("/")[1]]
+
+
+class TestImportBatchTask:
+    """Test batched processing of imported memories."""
+
+    def test_batch_processes_memories_together(self, client, auth_headers, db_session, test_user,
+                                               mock_embedding, mock_vector_db, event_publisher_redis):
+        """Test one extraction call and one embedding call cover the whole batch."""
+        data = _jsonl([{"title": f"Memory {i}", "content": f"Walk through the garden {i}"} for i in range(4)])
+
+        with patch('app.api.memories.start_import') as mock_start:
+            client.post(
+                "/api/memories/import",
+                headers=auth_headers,
+                files={"file": ("journal.jsonl", BytesIO(data), "application/jsonl")}
+            )
+        job = mock_start.call_args[0][1]
+
+        def extract(items):
+            return [{"description": "Green", "top_notes": ["grass"], "heart_notes": [], "base_notes": []}
+                    for _ in items]
+
+        with patch('app.tasks.bulk_import.extract_scents_batch', side_effect=extract) as mock_extract, \
+             patch('app.tasks.bulk_import.redis_client') as mock_redis:
+            mock_redis.pipeline.return_value.execute.return_value = [4, 0, True]
+
+            import_memories_batch(str(test_user.id), job["job_id"], job["memory_ids"], job["total"])
+
+        assert mock_extract.call_count == 1
+        assert mock_embedding.embeddings.create.call_count == 1
+
+        memories = db_session.query(ScentMemory).filter_by(user_id=test_user.id).all()
+        assert all(m.processed for m in memories)
+        assert db_session.query(MemoryChunk).count() == 4
+        assert db_session.query(MemoryChunk).filter(MemoryChunk.embedding.is_(None)).count() == 0
+
+        pipe = event_publisher_redis.pipeline.return_value
+        events = [json.loads(call[0][1])["event"] for call in pipe.publish.call_args_list]
+        assert events == ["import_progress", "import_completed"]
+
+    def test_retry_counts_earlier_failures(self, client, auth_headers, db_session, test_user,
+                                          mock_embedding, mock_vector_db, event_publisher_redis):
+        """Test a memory that failed in an earlier attempt is still reported as failed."""
+        data = _jsonl([{"title": f"Memory {i}", "content": f"Cut grass {i}"} for i in range(3)])
+
+        with patch('app.api.memories.start_import') as mock_start:
+            client.post(
+                "/api/memories/import",
+                headers=auth_headers,
+                files={"file": ("journal.jsonl", BytesIO(data), "application/jsonl")}
+            )
+        job = mock_start.call_args[0][1]
+
+        failed = db_session.get(ScentMemory, UUID(job["memory_ids"][0]))
+        failed.processing_error = "extract: unreadable"
+        db_session.commit()
+
+        def extract(items):
+            return [{"description": "Green", "top_notes": ["grass"], "heart_notes": [], "base_notes": []}
+                    for _ in items]
+
+        with patch('app.tasks.bulk_import.extract_scents_batch', side_effect=extract), \
+             patch('app.tasks.bulk_import.redis_client') as mock_redis:
+            mock_redis.pipeline.return_value.execute.return_value = [2, 1, True]
+
+            import_memories_batch(str(test_user.id), job["job_id"], job["memory_ids"], job["total"])
+
+        pipe = mock_redis.pipeline.return_value
+        assert [call.args[1:] for call in pipe.hincrby.call_args_list] == [("completed", 2), ("failed", 1)]
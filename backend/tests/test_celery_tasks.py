@@ -2,8 +2,18 @@ import pytest
 from unittest.mock import patch, Mock
 import uuid
 import base64
+import json
 from app.models import ScentMemory, ScentProfile
-from app.tasks.process_memory import process_memory_task
+from app.tasks.celery_app import celery_app
+from app.tasks.process_memory import (
+    process_memory_task,
+    extract_memory_stage,
+    embed_memory_stage,
+    index_memory_stage,
+    finalize_memory_stage,
+    update_scent_profile,
+    _release_blob,
+)
 from PIL import Image
 from io import BytesIO
 
@@ -47,6 +57,45 @@ class TestProcessMemoryTask:
             assert len(memory.chunks) > 0
             assert len(memory.extracted_scents) > 0
     
+    def test_process_long_memory_batches_embeddings(self, db_session, test_user,
+                                                    mock_embedding, mock_redis):
+        """Test long memories embed and index all chunks in one round trip each."""
+
+        memory = ScentMemory(
+            id=uuid.uuid4(),
+            user_id=test_user.id,
+            title="Long Memory",
+            content="Rose petals in the garden after rain. " * 100,
+            memory_type="TEXT",
+            processed=False
+        )
+        db_session.add(memory)
+        db_session.commit()
+
+        with patch('app.tasks.process_memory.extract_scents') as mock_extract, \
+             patch('app.tasks.process_memory.store_embeddings') as mock_store:
+            mock_extract.return_value = {
+                'top_notes': ['rose'],
+                'heart_notes': [],
+                'base_notes': [],
+                'description': 'Rainy rose garden',
+                'scent_family': 'floral'
+            }
+
+            process_memory_task(str(memory.id), str(test_user.id))
+
+            db_session.refresh(memory)
+            assert len(memory.chunks) > 1
+            assert mock_embedding.embeddings.create.call_count == 1
+            mock_store.assert_called_once()
+            stored_ids = mock_store.call_args.kwargs['chunk_ids']
+            assert len(stored_ids) == len(memory.chunks)
+            assert {c.vector_id for c in memory.chunks} == set(stored_ids)
+            assert all(c.vector_id == str(c.id) for c in memory.chunks)
+            assert all(c.char_count == len(c.content) for c in memory.chunks)
+            assert all(c.word_count == len(c.content.split()) for c in memory.chunks)
+            assert {c.embedding_model for c in memory.chunks} == {"text-embedding-3-small"}
+
     def test_process_image_memory(self, db_session, test_user, mock_embedding,
                                   mock_vector_db, mock_redis):
         """Test processing memory with image."""
@@ -95,6 +144,117 @@ class TestProcessMemoryTask:
             assert memory.processed is True
             assert 'Classic perfume bottle' in memory.content
     
+    def test_process_image_memory_from_blob(self, db_session, test_user, mock_embedding,
+                                            mock_vector_db, mock_redis, blob_store):
+        """Test processing reads the upload from the blob store and releases it."""
+
+        img = Image.new('RGB', (100, 100), color='green')
+        img_bytes = BytesIO()
+        img.save(img_bytes, format='JPEG')
+        img_bytes.seek(0)
+        blob_size = len(img_bytes.getvalue())
+        key = blob_store.put(img_bytes, ".jpg")
+
+        memory = ScentMemory(
+            id=uuid.uuid4(),
+            user_id=test_user.id,
+            title="Garden",
+            content="Green garden",
+            memory_type="PHOTO",
+            file_path=key,
+            processed=False
+        )
+        db_session.add(memory)
+        db_session.commit()
+
+        file_data = {
+            "type": "blob",
+            "key": key,
+            "content_type": "image/jpeg",
+            "extension": ".jpg"
+        }
+
+        with patch('app.tasks.process_memory.analyze_image') as mock_analyze:
+            mock_analyze.return_value = {
+                'top_notes': ['grass'],
+                'heart_notes': [],
+                'base_notes': [],
+                'image_description': 'Green garden',
+            }
+
+            process_memory_task(str(memory.id), str(test_user.id), file_data)
+
+            db_session.refresh(memory)
+            assert memory.processed is True
+            assert mock_analyze.call_args[0][0]["original_bytes"] == blob_size
+            assert memory.chunk_metadata["image"]["original_bytes"] == blob_size
+            assert not blob_store.exists(key)
+            assert memory.file_path is None
+
+    def test_shared_blob_released_by_last_holder(self, db_session, test_user, blob_store):
+        """Test a blob shared by identical uploads is deleted only after its last reference."""
+        key = blob_store.put(BytesIO(b"same bytes"), ".jpg")
+        first, second = [
+            ScentMemory(id=uuid.uuid4(), user_id=test_user.id, title="Twin", content="Twin",
+                        memory_type="PHOTO", file_path=key, processed=True)
+            for _ in range(2)
+        ]
+        db_session.add_all([first, second])
+        db_session.commit()
+
+        _release_blob(db_session, key, first.id)
+
+        db_session.refresh(first)
+        assert first.file_path is None
+        assert blob_store.exists(key)
+
+        _release_blob(db_session, key, second.id)
+
+        assert not blob_store.exists(key)
+    
+    def test_process_image_memory_vision_cache_hit(self, db_session, test_user, mock_embedding,
+                                                   mock_vector_db, mock_redis):
+        """Test a cached vision result skips the vision API call."""
+
+        img = Image.new('RGB', (100, 100), color='blue')
+        img_bytes = BytesIO()
+        img.save(img_bytes, format='JPEG')
+
+        memory = ScentMemory(
+            id=uuid.uuid4(),
+            user_id=test_user.id,
+            title="Duplicate",
+            content="Same bottle again",
+            memory_type="PHOTO",
+            processed=False
+        )
+        db_session.add(memory)
+        db_session.commit()
+
+        file_data = {
+            "type": "base64",
+            "data": base64.b64encode(img_bytes.getvalue()).decode('utf-8'),
+            "content_type": "image/jpeg",
+            "extension": ".jpg"
+        }
+
+        cached = {
+            'top_notes': ['iris'],
+            'heart_notes': [],
+            'base_notes': [],
+            'image_description': 'Blue bottle',
+        }
+
+        with patch('app.tasks.process_memory.get_cached_vision_result', return_value=cached), \
+             patch('app.tasks.process_memory.analyze_image') as mock_analyze:
+            process_memory_task(str(memory.id), str(test_user.id), file_data)
+
+            db_session.refresh(memory)
+            assert memory.processed is True
+            assert 'Blue bottle' in memory.content
+            assert memory.chunk_metadata["image"]["vision_cache_hit"] is True
+            mock_analyze.assert_not_called()
+
     def test_process_pdf_memory(self, db_session, test_user, mock_embedding,
                                mock_vector_db, mock_redis):
         """Test processing memory with PDF."""
@@ -256,7 +416,8 @@ class TestProcessMemoryTask:
             assert memory.processing_error is not None
     
     def test_process_publishes_redis_event(self, db_session, test_user,
-                                          mock_embedding, mock_vector_db):
+                                          mock_embedding, mock_vector_db,
+                                          event_publisher_redis):
         """Test task publishes success event to Redis."""
 
         
@@ -271,8 +432,7 @@ class TestProcessMemoryTask:
         db_session.add(memory)
         db_session.commit()
         
-        with patch('app.tasks.process_memory.extract_scents') as mock_extract, \
-             patch('redis.Redis.from_url') as mock_redis:
+        with patch('app.tasks.process_memory.extract_scents') as mock_extract:
             mock_extract.return_value = {
                 'scent_name': 'Test',
                 'brand': 'Test',
@@ -284,11 +444,239 @@ class TestProcessMemoryTask:
                 'emotion': 'happy',
                 'color': 'pink'
             }
-            mock_redis_instance = Mock()
-            mock_redis.return_value = mock_redis_instance
             
             process_memory_task(str(memory.id), str(test_user.id))
             
-            mock_redis_instance.publish.assert_called()
-            call_args = mock_redis_instance.publish.call_args
-            assert call_args[0][0] == "memory_events"
\ No newline at end of file
+            event_publisher_redis.publish.assert_called()
+            call_args = event_publisher_redis.publish.call_args
+            assert call_args[0][0] == "memory_events"
+            assert json.loads(call_args[0][1])["event"] == "memory_processed"
+
+
+class TestMemoryPipeline:
+    """Test the staged memory processing pipeline."""
+
+    def test_stages_routed_to_own_queues(self):
+        """Test each pipeline stage is routed to a dedicated queue."""
+        routes = celery_app.conf.task_routes
+
+        queues = {
+            routes[task.name]["queue"]
+            for task in (extract_memory_stage, embed_memory_stage,
+                         index_memory_stage, finalize_memory_stage)
+        }
+        assert queues == {"memory_extract", "memory_embed", "memory_index", "memory_finalize"}
+
+    def test_index_failure_reports_stage(self, db_session, test_user, mock_embedding, mock_redis):
+        """Test a failing stage records which stage failed and keeps extraction output."""
+
+        memory = ScentMemory(
+            id=uuid.uuid4(),
+            user_id=test_user.id,
+            title="Test",
+            content="Citrus grove",
+            memory_type="TEXT",
+            processed=False
+        )
+        db_session.add(memory)
+        db_session.commit()
+
+        with patch('app.tasks.process_memory.extract_scents') as mock_extract, \
+             patch('app.tasks.process_memory.store_embeddings') as mock_store:
+            mock_extract.return_value = {'top_notes': ['lemon'], 'description': 'Citrus'}
+            mock_store.side_effect = Exception("Chroma unavailable")
+
+            with pytest.raises(Exception):
+                process_memory_task(str(memory.id), str(test_user.id))
+
+            db_session.refresh(memory)
+            assert memory.processed is False
+            assert memory.processing_error.startswith("index:")
+            assert len(memory.extracted_scents) == 1
+            assert len(memory.chunks) > 0
+
+    def test_retry_resumes_at_failed_stage(self, db_session, test_user, mock_embedding, mock_redis):
+        """Test a transient index failure is retried without redoing LLM work."""
+
+        memory = ScentMemory(
+            id=uuid.uuid4(),
+            user_id=test_user.id,
+            title="Test",
+            content="Orange blossom",
+            memory_type="TEXT",
+            processed=False
+        )
+        db_session.add(memory)
+        db_session.commit()
+
+        with patch('app.tasks.process_memory.extract_scents') as mock_extract, \
+             patch('app.tasks.process_memory.store_embeddings') as mock_store:
+            mock_extract.return_value = {'top_notes': ['neroli'], 'description': 'Blossom'}
+            mock_store.side_effect = [Exception("Chroma unavailable"), None]
+
+            process_memory_task(str(memory.id), str(test_user.id))
+
+            db_session.refresh(memory)
+            assert memory.processed is True
+            assert memory.processing_error is None
+            assert mock_extract.call_count == 1
+            assert mock_store.call_count == 2
+            assert set(memory.chunk_metadata["stages"]) == {"extract", "embed", "index", "finalize"}
+
+    def test_index_reuses_stored_vectors(self, db_session, test_user, mock_embedding, mock_redis):
+        """Test the index stage reads the embed stage's vectors even if the cache lost them."""
+        from app.services.embedding_cache import clear_local_cache
+
+        memory = ScentMemory(
+            id=uuid.uuid4(),
+            user_id=test_user.id,
+            title="Test",
+            content="Vetiver after rain",
+            memory_type="TEXT",
+            processed=False
+        )
+        db_session.add(memory)
+        db_session.commit()
+
+        with patch('app.tasks.process_memory.extract_scents') as mock_extract, \
+             patch('app.tasks.process_memory.store_embeddings') as mock_store:
+            mock_extract.return_value = {'top_notes': ['vetiver'], 'description': 'Earthy'}
+
+            extract_memory_stage(str(memory.id), str(test_user.id))
+            embed_memory_stage(str(memory.id), str(test_user.id))
+            clear_local_cache()
+            index_memory_stage(str(memory.id), str(test_user.id))
+
+            db_session.refresh(memory)
+            assert mock_embedding.embeddings.create.call_count == 1
+            assert all(chunk.embedding for chunk in memory.chunks)
+            assert len(mock_store.call_args.kwargs["embeddings"][0]) == 1536
+
+    def test_stale_vectors_deleted_after_extract_commits(self, db_session, test_user,
+                                                        mock_embedding, mock_redis):
+        """Test shrinking a memory removes its extra vectors in the index stage, not during extract."""
+
+        memory = ScentMemory(
+            id=uuid.uuid4(),
+            user_id=test_user.id,
+            title="Test",
+            content="Oakmoss and leather. " * 60,
+            memory_type="TEXT",
+            processed=False
+        )
+        db_session.add(memory)
+        db_session.commit()
+
+        with patch('app.tasks.process_memory.extract_scents') as mock_extract, \
+             patch('app.tasks.process_memory.store_embeddings'), \
+             patch('app.tasks.process_memory.delete_stale_embeddings') as mock_delete:
+            mock_extract.return_value = {'top_notes': ['oakmoss'], 'description': 'Chypre'}
+            process_memory_task(str(memory.id), str(test_user.id))
+
+            memory.content = "Oakmoss"
+            memory.chunk_metadata = {}
+            db_session.commit()
+            mock_delete.reset_mock()
+
+            extract_memory_stage(str(memory.id), str(test_user.id))
+            mock_delete.assert_not_called()
+
+            embed_memory_stage(str(memory.id), str(test_user.id))
+            index_memory_stage(str(memory.id), str(test_user.id))
+
+            db_session.refresh(memory)
+            assert len(memory.chunks) == 1
+            mock_delete.assert_called_once_with([str(memory.id)], keep=[str(memory.chunks[0].id)])
+            assert memory.chunks[0].vector_id == str(memory.chunks[0].id)
+
+    def test_rerun_is_idempotent(self, db_session, test_user, mock_embedding,
+                                 mock_vector_db, mock_redis):
+        """Test re-running a processed memory does not duplicate rows or counts."""
+
+        memory = ScentMemory(
+            id=uuid.uuid4(),
+            user_id=test_user.id,
+            title="Test",
+            content="Fig leaves",
+            memory_type="TEXT",
+            processed=False
+        )
+        db_session.add(memory)
+        db_session.commit()
+
+        with patch('app.tasks.process_memory.extract_scents') as mock_extract:
+            mock_extract.return_value = {'top_notes': ['fig'], 'description': 'Green fig'}
+
+            process_memory_task(str(memory.id), str(test_user.id))
+            process_memory_task(str(memory.id), str(test_user.id))
+
+            db_session.refresh(memory)
+            profile = db_session.query(ScentProfile).filter_by(user_id=test_user.id).first()
+            assert mock_extract.call_count == 1
+            assert len(memory.extracted_scents) == 1
+            assert profile.total_memories == 1
+            assert profile.note_occurrence_counts['top']['fig'] == 1
+
+
+class TestScentProfileAggregation:
+    """Test SQL-side scent profile aggregation."""
+
+    def test_creates_profile_on_first_memory(self, db_session, test_user):
+        """Test the first memory creates the profile with its counts."""
+        memory = ScentMemory(user_id=test_user.id, title="Test", content="Rose", emotion="happy")
+
+        update_scent_profile(
+            test_user.id,
+            {'top_notes': ['rose', 'rose'], 'heart_notes': [], 'base_notes': ['musk'], 'scent_family': 'floral'},
+            memory,
+            db_session
+        )
+        db_session.commit()
+
+        profile = db_session.query(ScentProfile).filter_by(user_id=test_user.id).one()
+        assert profile.total_memories == 1
+        assert profile.note_occurrence_counts == {"top": {"rose": 2}, "heart": {}, "base": {"musk": 1}}
+        assert profile.preferred_families == ['floral']
+        assert profile.emotional_preferences == ['happy']
+
+    def test_increments_existing_profile(self, db_session, test_user):
+        """Test later memories increment counts and append only new values."""
+        profile = ScentProfile(
+            user_id=test_user.id,
+            preferred_families=['floral'],
+            disliked_notes=['oud'],
+            note_occurrence_counts={"top": {"rose": 3}, "heart": {}, "base": {}},
+            emotional_preferences=['happy'],
+            total_memories=3
+        )
+        db_session.add(profile)
+        db_session.commit()
+
+        memory = ScentMemory(user_id=test_user.id, title="Test", content="Rose garden", emotion="happy")
+        update_scent_profile(
+            test_user.id,
+            {'top_notes': ['rose', 'lemon'], 'heart_notes': ['jasmine'], 'scent_family': 'citrus',
+             'emotion': 'nostalgic'},
+            memory,
+            db_session
+        )
+        db_session.commit()
+        db_session.refresh(profile)
+
+        assert profile.total_memories == 4
+        assert profile.note_occurrence_counts["top"] == {"rose": 4, "lemon": 1}
+        assert profile.note_occurrence_counts["heart"] == {"jasmine": 1}
+        assert profile.preferred_families == ['floral', 'citrus']
+        assert profile.emotional_preferences == ['happy', 'nostalgic']
+        assert profile.disliked_notes == ['oud']
+
+    def test_many_notes_in_one_layer(self, db_session, test_user):
+        """Test a layer with more notes than one Postgres function call accepts."""
+        memory = ScentMemory(user_id=test_user.id, title="Test", content="Everything at once")
+        notes = [f"note {i}" for i in range(120)]
+
+        update_scent_profile(test_user.id, {'top_notes': notes}, memory, db_session)
+        db_session.commit()
+
+        profile = db_session.query(ScentProfile).filter_by(user_id=test_user.id).one()
+        assert profile.note_occurrence_counts["top"] == {note: 1 for note in notes}
@@ -0,0 +1,91 @@
+import uuid
+from unittest.mock import patch
+
+from app.models import ScentMemory, MemoryChunk
+from app.services.chunk_writer import chunk_id, split_into_chunks, write_chunks
+
+
+class TestChunkSplitting:
+    """Test splitting memory content into chunks."""
+
+    def test_chunks_overlap(self):
+        """Test chunks are 500 characters with a 50 character overlap."""
+        content = "".join(str(i % 10) for i in range(1000))
+
+        chunks = split_into_chunks(content)
+
+        assert [len(c) for c in chunks] == [500, 500, 100]
+        assert chunks[0][-50:] == chunks[1][:50]
+
+    def test_chunk_ids_are_deterministic(self):
+        """Test the same memory and index always map to the same id."""
+        memory_id = uuid.uuid4()
+
+        assert chunk_id(memory_id, 0) == chunk_id(memory_id, 0)
+        assert chunk_id(memory_id, 0) != chunk_id(memory_id, 1)
+        assert chunk_id(memory_id, 0) != chunk_id(uuid.uuid4(), 0)
+
+
+class TestWriteChunks:
+    """Test bulk chunk persistence."""
+
+    def _memory(self, db_session, test_user) -> ScentMemory:
+        memory = ScentMemory(id=uuid.uuid4(), user_id=test_user.id, title="Test", content="Rain")
+        db_session.add(memory)
+        db_session.commit()
+        return memory
+
+    def test_writes_all_columns(self, db_session, test_user):
+        """Test chunks are written with their derived columns filled in."""
+        memory = self._memory(db_session, test_user)
+
+        removed = write_chunks(db_session, memory.id, ["wet stone and moss", "petrichor"])
+        db_session.commit()
+
+        chunks = db_session.query(MemoryChunk).order_by(MemoryChunk.chunk_index).all()
+        assert removed == 0
+        assert [c.content for c in chunks] == ["wet stone and moss", "petrichor"]
+        assert chunks[0].id == chunk_id(memory.id, 0)
+        assert chunks[0].vector_id is None
+        assert (chunks[0].char_count, chunks[0].word_count) == (18, 4)
+        assert chunks[1].embedding_model == "text-embedding-3-small"
+
+    def test_rewrite_updates_and_drops_stale(self, db_session, test_user):
+        """Test rewriting keeps ids, updates content and drops extra chunks."""
+        memory = self._memory(db_session, test_user)
+        write_chunks(db_session, memory.id, ["one", "two", "three"])
+        db_session.commit()
+
+        removed = write_chunks(db_session, memory.id, ["uno"])
+        db_session.commit()
+
+        chunks = db_session.query(MemoryChunk).all()
+        assert len(chunks) == 1
+        assert chunks[0].content == "uno"
+        assert chunks[0].id == chunk_id(memory.id, 0)
+        assert removed == 2
+
+    def test_changed_content_is_unindexed(self, db_session, test_user):
+        """Test rewritten text clears vector_id until the index stage upserts it."""
+        memory = self._memory(db_session, test_user)
+        write_chunks(db_session, memory.id, ["one", "two"])
+        for chunk in db_session.query(MemoryChunk):
+            chunk.vector_id = str(chunk.id)
+        db_session.commit()
+
+        write_chunks(db_session, memory.id, ["one", "deux"])
+        db_session.commit()
+
+        chunks = db_session.query(MemoryChunk).order_by(MemoryChunk.chunk_index).all()
+        assert chunks[0].vector_id == str(chunks[0].id)
+        assert chunks[1].vector_id is None
+
+    def test_single_insert_per_memory(self, db_session, test_user):
+        """Test all chunks of a memory go out in one INSERT statement."""
+        memory = self._memory(db_session, test_user)
+
+        with patch.object(db_session, "scalars", wraps=db_session.scalars) as mock_scalars:
+            write_chunks(db_session, memory.id, split_into_chunks("x" * 5000))
+            statements = [str(call.args[0]) for call in mock_scalars.call_args_list]
+
+        assert sum(1 for sql in statements if sql.startswith("INSERT")) == 1
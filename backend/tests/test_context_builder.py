@@ -0,0 +1,89 @@
+import uuid
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app.models import MemoryChunk
+from app.services.chunk_writer import split_into_chunks
+from app.services.context_builder import build_context, count_tokens, merge_chunks
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens():
+    """Count tokens with the offline estimate so tests don't fetch the BPE file."""
+    with patch('app.services.context_builder._encoding', return_value=None):
+        yield
+
+
+def _chunks(memory_id: uuid.UUID, content: str) -> list[MemoryChunk]:
+    return [
+        MemoryChunk(id=uuid.uuid4(), memory_id=memory_id, chunk_index=i, content=text)
+        for i, text in enumerate(split_into_chunks(content))
+    ]
+
+
+class TestMergeChunks:
+    """Test merging retrieved chunks into passages."""
+
+    def test_adjacent_chunks_merge_without_overlap(self):
+        """Test consecutive windows of one memory rebuild the original text."""
+        memory_id = uuid.uuid4()
+        content = "".join(chr(ord("a") + i % 26) for i in range(1200))
+        chunks = _chunks(memory_id, content)
+
+        passages = merge_chunks([chunks[2], chunks[0], chunks[1]])
+
+        assert len(passages) == 1
+        assert passages[0]["chunk_indices"] == [0, 1, 2]
+        assert passages[0]["text"] == content
+
+    def test_memories_keep_relevance_order(self):
+        """Test passages follow each memory's best chunk, in document order within it."""
+        first, second = uuid.uuid4(), uuid.uuid4()
+        a = _chunks(first, "x" * 2000)
+        b = _chunks(second, "y" * 600)
+
+        passages = merge_chunks([b[1], a[3], b[0], a[0]])
+
+        assert [(p["memory_id"], p["chunk_indices"]) for p in passages] == [
+            (str(second), [0, 1]),
+            (str(first), [0]),
+            (str(first), [3]),
+        ]
+
+
+class TestBuildContext:
+    """Test packing passages into the prompt token budget."""
+
+    def test_context_fits_budget(self):
+        """Test the packed context never exceeds the budget."""
+        chunks = [chunk for _ in range(5) for chunk in _chunks(uuid.uuid4(), "word " * 100)]
+
+        context, passages = build_context(chunks, token_budget=300)
+
+        assert count_tokens(context) <= 300
+        assert 0 < len(passages) < 5
+        assert context.startswith("Memory: ")
+
+    def test_overflowing_passage_is_truncated(self):
+        """Test a passage too big for the remainder is cut and packing stops."""
+        big, small = uuid.uuid4(), uuid.uuid4()
+        chunks = _chunks(big, "a" * 400) + _chunks(small, "b" * 800)
+
+        context, passages = build_context(chunks, token_budget=160)
+
+        assert [p["memory_id"] for p in passages] == [str(big), str(small)]
+        assert context.endswith("b")
+        assert count_tokens(context) <= 161
+
+    def test_truncates_with_tokenizer(self):
+        """Test truncation cuts on token boundaries when the tokenizer is loaded."""
+        encoding = Mock()
+        encoding.encode.side_effect = lambda text: text.split(" ")
+        encoding.decode.side_effect = lambda tokens: " ".join(tokens)
+        chunks = _chunks(uuid.uuid4(), " ".join(f"w{i}" for i in range(100)))
+
+        with patch('app.services.context_builder._encoding', return_value=encoding):
+            context, _ = build_context(chunks, token_budget=60)
+
+        assert context.split(" ")[-1] == "w58"
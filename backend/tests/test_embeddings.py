@@ -0,0 +1,125 @@
+import asyncio
+from unittest.mock import Mock
+
+import pytest
+
+from app.services.embedding_cache import (
+    get_embedding_cache_key,
+    get_embedding_cache_stats,
+    pack_embedding,
+    unpack_embedding,
+)
+from app.services.embeddings import (
+    EMBEDDING_MODEL,
+    generate_embedding,
+    generate_embedding_async,
+    generate_embeddings,
+)
+
+
+class TestGenerateEmbeddings:
+    """Test batched embedding generation."""
+
+    def test_batches_all_texts_in_one_request(self, mock_embedding):
+        """Test multiple texts are embedded with a single API call."""
+        embeddings = generate_embeddings(["rose", "jasmine", "musk"])
+
+        assert len(embeddings) == 3
+        assert mock_embedding.embeddings.create.call_count == 1
+        assert mock_embedding.embeddings.create.call_args.kwargs["input"] == ["rose", "jasmine", "musk"]
+
+    def test_respects_batch_size(self, mock_embedding, monkeypatch):
+        """Test batches are split by the configured item limit."""
+        monkeypatch.setattr("app.services.embeddings.settings.EMBEDDING_BATCH_SIZE", 2)
+
+        embeddings = generate_embeddings([f"note {i}" for i in range(5)])
+
+        assert len(embeddings) == 5
+        assert mock_embedding.embeddings.create.call_count == 3
+
+    def test_sends_original_text(self, mock_embedding):
+        """Test normalization picks the cache key but the text is embedded as written."""
+        embeddings = generate_embeddings(["  rose\n", "rose"])
+
+        assert len(embeddings) == 2
+        assert mock_embedding.embeddings.create.call_args.kwargs["input"] == ["  rose\n"]
+
+    def test_missing_vector_raises(self, mock_embedding):
+        """Test a short API response fails instead of misaligning texts and vectors."""
+        mock_embedding.embeddings.create.side_effect = lambda model, input: Mock(
+            data=[Mock(embedding=[0.1] * 1536, index=0)]
+        )
+
+        with pytest.raises(RuntimeError):
+            generate_embeddings(["rose", "jasmine"])
+
+    def test_async_shares_the_cache(self, mock_embedding):
+        """Test the async path reuses vectors cached by the sync path."""
+        generate_embedding("oakmoss")
+
+        assert len(asyncio.run(generate_embedding_async("oakmoss"))) == 1536
+        assert mock_embedding.embeddings.create.call_count == 1
+
+
+class TestEmbeddingCache:
+    """Test the two-tier embedding cache."""
+
+    def test_repeated_text_hits_local_cache(self, mock_embedding):
+        """Test identical (normalized) text is only embedded once."""
+        generate_embedding("vanilla and amber")
+        generate_embedding("  vanilla and amber\n")
+
+        assert mock_embedding.embeddings.create.call_count == 1
+        stats = get_embedding_cache_stats()
+        assert stats["local_hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_redis_hit_skips_api(self, mock_embedding, embedding_cache_redis):
+        """Test a packed float32 value in Redis is used without an API call."""
+        embedding_cache_redis.mget.side_effect = lambda keys: [pack_embedding([0.5] * 4)] * len(keys)
+
+        assert generate_embedding("cedarwood") == [0.5] * 4
+        mock_embedding.embeddings.create.assert_not_called()
+        assert get_embedding_cache_stats()["redis_hits"] == 1
+
+    def test_misses_are_written_to_redis(self, mock_embedding, embedding_cache_redis):
+        """Test fresh embeddings are stored as packed bytes with a TTL."""
+        generate_embedding("sea salt")
+
+        pipe = embedding_cache_redis.pipeline.return_value
+        key, ttl, data = pipe.setex.call_args.args
+        assert key == get_embedding_cache_key(EMBEDDING_MODEL, "sea salt")
+        assert isinstance(data, bytes)
+        assert len(unpack_embedding(data)) == 1536
+
+
+class TestOpenAISlots:
+    """Test the per-process cap on in-flight OpenAI calls."""
+
+    def test_in_flight_calls_are_bounded(self, monkeypatch):
+        """Test no more than OPENAI_MAX_IN_FLIGHT calls run at once."""
+        import threading
+        import time
+
+        from app.services import openai_limits
+
+        monkeypatch.setattr(openai_limits, "_slots", threading.BoundedSemaphore(2))
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+
+        def call():
+            with openai_limits.openai_slot():
+                with lock:
+                    state["active"] += 1
+                    state["peak"] = max(state["peak"], state["active"])
+                time.sleep(0.02)
+                with lock:
+                    state["active"] -= 1
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert state["peak"] == 2
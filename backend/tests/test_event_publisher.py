@@ -0,0 +1,99 @@
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.services import event_publisher
+from app.services.event_publisher import (
+    flush_events,
+    get_event_publisher_stats,
+    publish_event,
+    publish_events,
+)
+
+
+@pytest.fixture
+def publisher_redis():
+    with patch('app.services.event_publisher.redis_client') as mock:
+        mock.publish.return_value = 1
+        mock.pipeline.return_value.execute.side_effect = lambda: [1] * len(
+            mock.pipeline.return_value.publish.call_args_list
+        )
+        yield mock
+        flush_events()
+
+
+class TestEventPublisher:
+    """Test the pooled worker event publisher."""
+
+    def test_single_event_published_on_shared_client(self, publisher_redis):
+        """Test an event is published without opening a new connection."""
+        with patch('redis.Redis.from_url') as mock_from_url:
+            publish_event({"user_id": "u1", "event": "memory_processed", "memory_id": "m1"})
+
+        mock_from_url.assert_not_called()
+        channel, payload = publisher_redis.publish.call_args[0]
+        assert channel == "memory_events"
+        assert json.loads(payload)["memory_id"] == "m1"
+
+    def test_multiple_events_are_pipelined(self, publisher_redis):
+        """Test several events go out in one pipelined round trip."""
+        before = get_event_publisher_stats()
+
+        publish_events([{"user_id": "u1", "event": "import_progress"}] * 3)
+
+        assert publisher_redis.pipeline.return_value.publish.call_count == 3
+        publisher_redis.pipeline.return_value.execute.assert_called_once()
+        stats = get_event_publisher_stats()
+        assert stats["published"] == before["published"] + 3
+        assert stats["round_trips"] == before["round_trips"] + 1
+        assert stats["max_latency_ms"] >= 0
+
+    def test_publish_errors_do_not_raise(self, publisher_redis):
+        """Test a Redis failure is counted instead of failing the task."""
+        publisher_redis.publish.side_effect = ConnectionError("down")
+        before = get_event_publisher_stats()
+
+        publish_event({"user_id": "u1", "event": "memory_failed"})
+
+        assert get_event_publisher_stats()["errors"] == before["errors"] + 1
+
+    def test_batching_buffers_until_flush(self, publisher_redis, monkeypatch):
+        """Test batched mode holds events and flushes them together."""
+        monkeypatch.setattr(event_publisher.settings, "EVENT_PUBLISH_BATCH_MS", 60000)
+        monkeypatch.setattr(event_publisher.settings, "EVENT_PUBLISH_BATCH_SIZE", 100)
+
+        for i in range(5):
+            publish_event({"user_id": "u1", "event": "import_progress", "completed": i})
+
+        publisher_redis.pipeline.return_value.execute.assert_not_called()
+        assert get_event_publisher_stats()["pending"] == 5
+
+        flush_events()
+
+        assert publisher_redis.pipeline.return_value.publish.call_count == 5
+        assert get_event_publisher_stats()["pending"] == 0
+
+    def test_batching_flushes_when_full(self, publisher_redis, monkeypatch):
+        """Test a full buffer is flushed without waiting for the window."""
+        monkeypatch.setattr(event_publisher.settings, "EVENT_PUBLISH_BATCH_MS", 60000)
+        monkeypatch.setattr(event_publisher.settings, "EVENT_PUBLISH_BATCH_SIZE", 2)
+
+        publish_events([{"user_id": "u1", "event": "import_progress"}] * 2)
+
+        publisher_redis.pipeline.return_value.execute.assert_called_once()
+
+    def test_batching_flushes_after_window(self, publisher_redis, monkeypatch):
+        """Test the background flusher publishes buffered events."""
+        monkeypatch.setattr(event_publisher.settings, "EVENT_PUBLISH_BATCH_MS", 20)
+        monkeypatch.setattr(event_publisher.settings, "EVENT_PUBLISH_BATCH_SIZE", 100)
+        monkeypatch.setattr(event_publisher, "_flusher_pid", None)
+
+        publish_event({"user_id": "u1", "event": "memory_processed"})
+
+        deadline = time.monotonic() + 2
+        while not publisher_redis.publish.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        publisher_redis.publish.assert_called_once()
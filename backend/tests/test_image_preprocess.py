@@ -0,0 +1,66 @@
+from io import BytesIO
+
+from PIL import Image
+
+from app.services.image_preprocess import choose_detail, prepare_image, target_size
+
+
+def _jpeg(width: int, height: int, exif: bytes | None = None) -> bytes:
+    output = BytesIO()
+    image = Image.new('RGB', (width, height), color='orange')
+    if exif is not None:
+        image.save(output, format='JPEG', exif=exif)
+    else:
+        image.save(output, format='JPEG')
+    return output.getvalue()
+
+
+class TestImagePreprocess:
+    """Test image preparation before the vision call."""
+
+    def test_large_image_is_downsized_for_high_detail(self):
+        """Test a large photo is scaled to the high-detail resolution."""
+        prepared = prepare_image(_jpeg(4000, 3000))
+
+        assert prepared["detail"] == "high"
+        assert (prepared["width"], prepared["height"]) == (1024, 768)
+        assert prepared["mime_type"] == "image/webp"
+        assert prepared["bytes_saved"] == prepared["original_bytes"] - prepared["encoded_bytes"]
+        assert prepared["decode_ms"] >= 0 and prepared["encode_ms"] >= 0
+
+    def test_small_image_uses_low_detail(self):
+        """Test images within one low-detail tile are sent with detail=low."""
+        prepared = prepare_image(_jpeg(300, 200))
+
+        assert prepared["detail"] == "low"
+        assert (prepared["width"], prepared["height"]) == (300, 200)
+
+    def test_exif_is_stripped_and_orientation_applied(self):
+        """Test EXIF orientation is applied and metadata removed."""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotate 90 degrees
+        exif[0x010F] = "CameraMaker"
+
+        prepared = prepare_image(_jpeg(800, 600, exif.tobytes()))
+
+        with Image.open(BytesIO(prepared["data"])) as image:
+            assert image.size == (prepared["width"], prepared["height"])
+            assert image.width < image.height
+            assert not image.getexif()
+
+    def test_fixed_detail_policy(self, monkeypatch):
+        """Test a configured detail level overrides the automatic policy."""
+        monkeypatch.setattr("app.services.image_preprocess.settings.VISION_DETAIL", "low")
+
+        assert choose_detail(4000, 3000) == "low"
+        assert target_size(4000, 3000, "low") == (512, 384)
+
+    def test_undecodable_image_falls_back_to_original(self):
+        """Test bytes Pillow cannot decode are passed through unchanged."""
+        data = b"\x89PNG\r\n\x1a\n" + b"broken" * 10
+
+        prepared = prepare_image(data)
+
+        assert prepared["data"] == data
+        assert prepared["mime_type"] == "image/png"
+        assert prepared["bytes_saved"] == 0
@@ -48,6 +48,28 @@ class TestUploadMemory:
         data = response.json()
         assert data["status"] == "processing"
         mock_celery.assert_called_once()
+
+    def test_upload_stores_file_as_blob_reference(self, client, auth_headers,
+                                                  mock_celery, blob_store):
+        """Test the task payload carries a blob key instead of file bytes."""
+        img = Image.new('RGB', (100, 100), color='blue')
+        img_bytes = BytesIO()
+        img.save(img_bytes, format='PNG')
+        raw = img_bytes.getvalue()
+
+        response = client.post(
+            "/api/memories/upload",
+            headers=auth_headers,
+            data={"title": "Blue", "content": "Ocean"},
+            files={"file": ("ocean.png", BytesIO(raw), "image/png")}
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        file_data = mock_celery.call_args[0][2]
+        assert file_data["type"] == "blob"
+        assert "data" not in file_data
+        assert file_data["key"].endswith(".png")
+        assert blob_store.get(file_data["key"]) == raw
     
     def test_upload_file_too_large(self, client, auth_headers):
         """Test uploading file exceeding size limit."""
@@ -66,6 +88,33 @@ class TestUploadMemory:
         assert response.status_code == status.HTTP_400_BAD_REQUEST
         assert "too large" in response.json()["detail"].lower()
     
+    def test_upload_content_type_mismatch(self, client, auth_headers):
+        """Test a file whose bytes do not match its declared type is rejected."""
+        response = client.post(
+            "/api/memories/upload",
+            headers=auth_headers,
+            data={
+                "title": "Test",
+                "content": "Test content"
+            },
+            files={"file": ("fake.jpg", BytesIO(b"not really a jpeg at all"), "image/jpeg")}
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_upload_kind_mismatch_stores_nothing(self, client, auth_headers, blob_store):
+        """Test a PDF declared as an image is rejected without leaving a blob behind."""
+        response = client.post(
+            "/api/memories/upload",
+            headers=auth_headers,
+            data={
+                "title": "Test",
+                "content": "Test content"
+            },
+            files={"file": ("photo.jpg", BytesIO(b"%PDF-1.4 not a photo at all"), "image/jpeg")}
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not any(path.is_file() for path in blob_store.root.rglob("*"))
+
     def test_upload_unsupported_file_type(self, client, auth_headers):
         """Test uploading unsupported file type."""
         file = BytesIO(b"test content")
@@ -0,0 +1,50 @@
+from benchmarks.bench_pdf_extraction import build_text_pdf
+from app.services.pdf_extractor import extract_text_from_pdf, iter_pdf_pages
+
+
+class TestPdfExtraction:
+    """Test budgeted PDF text extraction."""
+
+    def test_extracts_pages_in_order(self):
+        """Test every page's text is streamed with its page number."""
+        pdf = build_text_pdf([f"Page about note {i}" for i in range(12)])
+
+        pages = list(iter_pdf_pages(pdf, max_chars=10_000))
+
+        assert [num for num, _ in pages] == list(range(1, 13))
+        assert "note 11" in pages[-1][1]
+
+    def test_stops_at_char_budget(self):
+        """Test extraction stops once the character budget is reached."""
+        pdf = build_text_pdf(["vetiver " * 20] * 50)
+
+        pages = list(iter_pdf_pages(pdf, max_chars=500))
+
+        assert sum(len(text) for _, text in pages) == 500
+        assert len(pages) < 50
+
+    def test_respects_page_cap(self):
+        """Test pages beyond max_pages are never read."""
+        pdf = build_text_pdf(["iris"] * 30)
+
+        pages = list(iter_pdf_pages(pdf, max_chars=10_000, max_pages=5))
+
+        assert len(pages) == 5
+
+    def test_parallel_matches_inline(self, monkeypatch):
+        """Test the process pool returns the same text as inline extraction."""
+        pdf = build_text_pdf([f"Oud and saffron, page {i}" for i in range(12)])
+
+        monkeypatch.setattr("app.services.pdf_extractor.settings.PDF_WORKERS", 1)
+        inline = list(iter_pdf_pages(pdf, max_chars=100_000, layout=True))
+
+        monkeypatch.setattr("app.services.pdf_extractor.settings.PDF_WORKERS", 2)
+        monkeypatch.setattr("app.services.pdf_extractor.settings.PDF_PARALLEL_MIN_PAGES", 10)
+        parallel = list(iter_pdf_pages(pdf, max_chars=100_000, layout=True))
+
+        assert parallel == inline
+        assert len(parallel) == 12
+
+    def test_invalid_pdf_returns_empty(self):
+        """Test malformed input degrades to an empty string."""
+        assert extract_text_from_pdf(b"%PDF-1.4 fake pdf content") == ""
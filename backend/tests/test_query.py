@@ -1,9 +1,39 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
 import pytest
+import httpx
 from fastapi import status
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, AsyncMock
+from app.main import app
 from app.models import User, QueryLog
+from app.services.cache import _query_hash, bump_user_data_version, get_recommendation_cache_stats, normalize_query
 import uuid
 
+
+def _completion(content: str) -> Mock:
+    response = Mock()
+    response.choices = [Mock(message=Mock(content=content))]
+    response.usage = Mock(prompt_tokens=850, completion_tokens=120, prompt_tokens_details=Mock(cached_tokens=0))
+    return response
+
+
+async def _completion_stream(*deltas: str):
+    for delta in deltas:
+        yield Mock(choices=[Mock(delta=Mock(content=delta))], usage=None)
+    yield Mock(choices=[], usage=Mock(prompt_tokens=850, completion_tokens=len(deltas),
+                                      prompt_tokens_details=Mock(cached_tokens=0)))
+
+
+def _sse_events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for frame in body.strip().split("\n\n"):
+        event_line, data_line = frame.split("\n")
+        events.append((event_line.removeprefix("event: "), json.loads(data_line.removeprefix("data: "))))
+    return events
+
+
 class TestSearchMemories:
     """Test search/recommendation endpoint."""
     
@@ -47,9 +77,252 @@ class TestSearchMemories:
         )
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
+    def test_search_cache_miss_calls_llm(self, client, auth_headers, db_session, test_user,
+                                         mock_embedding, recommendation_cache_redis, flush_query_logs):
+        """Test a cache miss awaits the completion, logs the query and caches it."""
+        with patch('app.api.query.async_client') as mock_llm:
+            mock_llm.chat.completions.create = AsyncMock(return_value=_completion("Try Philosykos"))
+
+            response = client.post(
+                "/api/query/search",
+                headers=auth_headers,
+                json={"query": "Something green?"}
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["cached"] is False
+        assert data["response"] == "Try Philosykos"
+        assert get_recommendation_cache_stats()["misses"] == 1
+
+        flush_query_logs()
+        query_log = db_session.query(QueryLog).filter_by(user_id=test_user.id).one()
+        assert str(query_log.id) == data["query_id"]
+        assert query_log.model_version == "gpt-4"
+        assert (query_log.prompt_tokens, query_log.completion_tokens) == (850, 120)
+        assert query_log.latency_ms is not None
+        query_key, _, payload = recommendation_cache_redis.setex.await_args[0]
+        assert query_key == f"qrec:{test_user.id}:{_query_hash('Something green?')}"
+        assert json.loads(payload)["version"] == "0"
+        assert json.loads(payload)["entry"]["response"] == "Try Philosykos"
+
+        pipe = recommendation_cache_redis.pipeline.return_value
+        assert pipe.setex.call_count == 2
+        pipe.sadd.assert_called_once()
+        pipe.execute.assert_awaited_once()
+
+    def test_search_query_cache_hit_skips_retrieval(self, client, auth_headers, db_session, test_user,
+                                                    recommendation_cache_redis, flush_query_logs):
+        """Test a repeated question returns without embedding, vector search or LLM."""
+        entry = {"response": "Try Philosykos again", "sources": ["m1"]}
+        lookup = AsyncMock(return_value=["3", json.dumps({"version": "3", "entry": entry})])
+
+        with patch('app.services.cache._query_cache_lookup', lookup), \
+             patch('app.api.query.async_client') as mock_llm, \
+             patch('app.api.query._retrieve_context') as mock_retrieve:
+            mock_llm.chat.completions.create = AsyncMock()
+
+            response = client.post(
+                "/api/query/search",
+                headers=auth_headers,
+                json={"query": "  Something   GREEN? "}
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["cached"] is True
+        assert data["response"] == "Try Philosykos again"
+        assert data["sources"] == ["m1"]
+
+        assert lookup.await_args.kwargs["keys"] == [
+            f"data_version:{test_user.id}",
+            f"qrec:{test_user.id}:{_query_hash('something green?')}",
+        ]
+        mock_retrieve.assert_not_called()
+        mock_llm.chat.completions.create.assert_not_called()
+
+        flush_query_logs()
+        query_log = db_session.query(QueryLog).filter_by(user_id=test_user.id).one()
+        assert query_log.model_version == "gpt-4-cached"
+        assert query_log.prompt_tokens is None
+
+    def test_duplicate_search_reuses_inflight_answer(self, client, auth_headers, db_session, test_user,
+                                                     mock_embedding, flush_query_logs):
+        """Test a duplicate of an in-flight search waits for it instead of calling the LLM."""
+        with patch('app.api.query.async_client') as mock_llm, \
+             patch('app.api.query.acquire_inflight', AsyncMock(return_value=None)), \
+             patch('app.api.query.wait_for_inflight', AsyncMock(return_value="Leader answer")):
+            mock_llm.chat.completions.create = AsyncMock()
+
+            response = client.post(
+                "/api/query/search",
+                headers=auth_headers,
+                json={"query": "Something green?"}
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        data = response.json()
+        assert data["cached"] is True
+        assert data["response"] == "Leader answer"
+        mock_llm.chat.completions.create.assert_not_called()
+
+        flush_query_logs()
+        query_log = db_session.query(QueryLog).filter_by(user_id=test_user.id).one()
+        assert query_log.model_version == "gpt-4-coalesced"
+
+    def test_inflight_leader_publishes_answer(self, client, auth_headers, mock_embedding):
+        """Test the request holding the lock releases it with its answer, even on failure."""
+        with patch('app.api.query.async_client') as mock_llm, \
+             patch('app.api.query.release_inflight', AsyncMock()) as mock_release:
+            mock_llm.chat.completions.create = AsyncMock(return_value=_completion("Try Philosykos"))
+            client.post("/api/query/search", headers=auth_headers, json={"query": "Something green?"})
+
+            mock_llm.chat.completions.create = AsyncMock(side_effect=RuntimeError("timeout"))
+            with pytest.raises(RuntimeError):
+                client.post("/api/query/search", headers=auth_headers, json={"query": "Something woody?"})
+
+        assert [c.args[2] for c in mock_release.await_args_list] == ["Try Philosykos", None]
+
+    def test_concurrent_searches_overlap(self, client, auth_headers, mock_embedding):
+        """Test slow completions run concurrently instead of queueing on the threadpool."""
+        async def slow_completion(**kwargs):
+            await asyncio.sleep(0.5)
+            return _completion("Slow answer")
+
+        async def run_searches() -> list[httpx.Response]:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+                return await asyncio.gather(*[
+                    async_client.post(
+                        "/api/query/search?use_cache=false",
+                        headers=auth_headers,
+                        json={"query": f"Question {i}"}
+                    )
+                    for i in range(20)
+                ])
+
+        with patch('app.api.query.async_client') as mock_llm, \
+             patch('app.middleware.rate_limit.check_rate_limit', return_value={"allowed": True}), \
+             patch('app.middleware.rate_limit.increment_rate_limit'):
+            mock_llm.chat.completions.create = AsyncMock(side_effect=slow_completion)
+
+            started = time.monotonic()
+            responses = asyncio.run(run_searches())
+            elapsed = time.monotonic() - started
+
+        assert all(r.status_code == status.HTTP_200_OK for r in responses)
+        assert elapsed < 5
+
 
 
 
+class TestQueryCache:
+    """Test the first-level query cache keys."""
+
+    def test_normalize_query(self):
+        """Test case and whitespace differences map to the same query."""
+        assert normalize_query("  Something\tGREEN?\n") == "something green?"
+        assert _query_hash("Fresh Citrus") == _query_hash("fresh   citrus")
+        assert _query_hash("fresh citrus") != _query_hash("fresh cedar")
+
+    def test_bump_data_version(self):
+        """Test a bump increments the user's version with a TTL in one round trip."""
+        with patch('app.services.cache.redis_client') as mock_redis:
+            bump_user_data_version("u1")
+
+        pipe = mock_redis.pipeline.return_value
+        pipe.incr.assert_called_once_with("data_version:u1")
+        pipe.expire.assert_called_once()
+        pipe.execute.assert_called_once()
+
+
+class TestStreamSearch:
+    """Test streamed recommendations."""
+
+    def test_stream_sse(self, client, auth_headers, db_session, test_user,
+                        mock_embedding, recommendation_cache_redis, flush_query_logs):
+        """Test tokens arrive as SSE events and the full text is logged and cached."""
+        with patch('app.api.query.async_client') as mock_llm:
+            mock_llm.chat.completions.create = AsyncMock(
+                return_value=_completion_stream("Try ", "Philosykos", ".")
+            )
+
+            response = client.post(
+                "/api/query/search/stream",
+                headers=auth_headers,
+                json={"query": "Something green?"}
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["content-type"].startswith("text/event-stream")
+
+        events = _sse_events(response.text)
+        assert [name for name, _ in events] == ["sources", "token", "token", "token", "done"]
+        assert "".join(data["delta"] for name, data in events if name == "token") == "Try Philosykos."
+        assert mock_llm.chat.completions.create.call_args.kwargs["stream"] is True
+
+        flush_query_logs()
+        query_log = db_session.query(QueryLog).filter_by(user_id=test_user.id).one()
+        assert events[-1][1] == {"query_id": str(query_log.id), "cached": False}
+        assert query_log.llm_response == "Try Philosykos."
+        assert query_log.completion_tokens == 3
+        assert any(call.args[2] == "Try Philosykos." for call in recommendation_cache_redis.setex.await_args_list)
+
+    def test_stream_sse_cache_hit(self, client, auth_headers, mock_embedding):
+        """Test a cached recommendation is sent as a single token without an LLM call."""
+        with patch('app.api.query.get_cached_recommendation', return_value="Cached answer"), \
+             patch('app.api.query.async_client') as mock_llm:
+            response = client.post(
+                "/api/query/search/stream",
+                headers=auth_headers,
+                json={"query": "Something green?"}
+            )
+
+        events = _sse_events(response.text)
+        assert [name for name, _ in events] == ["sources", "token", "done"]
+        assert events[1][1]["delta"] == "Cached answer"
+        assert events[2][1]["cached"] is True
+        mock_llm.chat.completions.create.assert_not_called()
+
+    def test_stream_websocket(self, client, auth_headers, test_user, mock_embedding):
+        """Test the websocket transport publishes tagged events for the user's socket."""
+        with patch('app.api.query.async_client') as mock_llm, \
+             patch('app.api.query.publish_event_async') as mock_publish:
+            mock_llm.chat.completions.create = AsyncMock(return_value=_completion_stream("Neroli", "!"))
+
+            response = client.post(
+                "/api/query/search/stream?transport=websocket",
+                headers=auth_headers,
+                json={"query": "Something bright?"}
+            )
+            assert response.status_code == status.HTTP_200_OK
+            stream_id = response.json()["stream_id"]
+
+            deadline = time.monotonic() + 5
+            while mock_publish.await_count < 4 and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        messages = [call.args[0] for call in mock_publish.await_args_list]
+        assert [m["event"] for m in messages] == [
+            "recommendation_sources", "recommendation_token", "recommendation_token", "recommendation_done"
+        ]
+        assert all(m["stream_id"] == stream_id and m["user_id"] == str(test_user.id) for m in messages)
+
+    def test_stream_llm_error(self, client, auth_headers, mock_embedding):
+        """Test a failed completion ends the stream with an error event."""
+        with patch('app.api.query.async_client') as mock_llm:
+            mock_llm.chat.completions.create = AsyncMock(side_effect=RuntimeError("boom"))
+
+            response = client.post(
+                "/api/query/search/stream?use_cache=false",
+                headers=auth_headers,
+                json={"query": "Anything?"}
+            )
+
+        events = _sse_events(response.text)
+        assert events[-1] == ("error", {"error": "Failed to generate recommendation"})
+
+
 class TestSubmitFeedback:
     """Test feedback submission endpoint."""
     
@@ -137,6 +410,35 @@ class TestSubmitFeedback:
             assert response.status_code == status.HTTP_200_OK
             mock_invalidate.assert_called_once()
     
+    def test_feedback_on_unwritten_query_log(self, client, auth_headers, db_session, test_user):
+        """Test feedback right after a search finds the log still queued for the writer."""
+        from app.services.query_log_writer import enqueue_query_log
+
+        query_id = uuid.uuid4()
+        enqueue_query_log({
+            "id": query_id,
+            "user_id": test_user.id,
+            "query_text": "What perfumes?",
+            "query_type": "RECOMMENDATION",
+            "retrieved_chunks": None,
+            "context_used": None,
+            "llm_response": "Recommendations",
+            "model_version": "gpt-4",
+            "prompt_tokens": None,
+            "completion_tokens": None,
+            "latency_ms": 10,
+            "created_at": datetime.now(timezone.utc),
+        })
+
+        response = client.post(
+            f"/api/query/{query_id}/feedback",
+            headers=auth_headers,
+            json={"rating": 4}
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert db_session.get(QueryLog, query_id).rating == 4
+
     def test_feedback_rating_validation(self, client, auth_headers, db_session, test_user):
         """Test rating validation (must be 1-5)."""
         
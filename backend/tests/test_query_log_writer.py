@@ -0,0 +1,158 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.models import QueryType
+from app.services import query_log_writer
+from app.services.query_log_writer import enqueue_query_log, flush_query_logs, get_query_log_writer_stats
+
+
+def _record(**overrides) -> dict:
+    record = {
+        "id": uuid.uuid4(),
+        "user_id": uuid.uuid4(),
+        "query_text": "Something green?",
+        "query_type": QueryType.RECOMMENDATION,
+        "retrieved_chunks": ["c1", "c2"],
+        "context_used": "Memory: fig leaves",
+        "llm_response": "Try Philosykos",
+        "model_version": "gpt-4",
+        "prompt_tokens": 850,
+        "completion_tokens": 120,
+        "latency_ms": 2400,
+        "created_at": datetime.now(timezone.utc),
+    }
+    record.update(overrides)
+    return record
+
+
+@pytest.fixture
+def log_session():
+    """Capture the writer's inserts instead of hitting the database."""
+    query_log_writer._buffer.clear()
+    for key in query_log_writer._stats:
+        query_log_writer._stats[key] = 0
+
+    session = MagicMock()
+    session.execute = AsyncMock()
+    session.commit = AsyncMock()
+    session.rollback = AsyncMock()
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=False)
+
+    with patch('app.services.query_log_writer.get_async_session_factory', return_value=lambda: session):
+        yield session
+    query_log_writer._buffer.clear()
+
+
+class TestQueryLogWriter:
+    """Test the batched background query log writer."""
+
+    def test_flush_writes_queued_logs_in_one_batch(self, log_session):
+        """Test queued logs are inserted with one statement and one commit."""
+        records = [_record() for _ in range(3)]
+        for record in records:
+            enqueue_query_log(record)
+
+        assert asyncio.run(flush_query_logs()) == 3
+
+        log_session.execute.assert_awaited_once()
+        assert log_session.execute.await_args.args[1] == records
+        log_session.commit.assert_awaited_once()
+        assert get_query_log_writer_stats()["pending"] == 0
+        assert asyncio.run(flush_query_logs()) == 0
+
+    def test_large_backlog_splits_into_batches(self, log_session, monkeypatch):
+        """Test a backlog larger than the batch size is inserted in chunks."""
+        monkeypatch.setattr("app.services.query_log_writer.settings.QUERY_LOG_BATCH_SIZE", 2)
+        for _ in range(5):
+            enqueue_query_log(_record())
+
+        asyncio.run(flush_query_logs())
+
+        assert [len(call.args[1]) for call in log_session.execute.await_args_list] == [2, 2, 1]
+        log_session.commit.assert_awaited_once()
+
+    def test_full_buffer_drops_new_logs(self, log_session, monkeypatch):
+        """Test logs beyond the pending limit are dropped instead of growing memory."""
+        monkeypatch.setattr("app.services.query_log_writer.settings.QUERY_LOG_MAX_PENDING", 2)
+        for _ in range(3):
+            enqueue_query_log(_record())
+
+        stats = get_query_log_writer_stats()
+        assert stats["pending"] == 2
+        assert stats["dropped"] == 1
+
+    def test_failed_batch_retries_row_by_row(self, log_session):
+        """Test one bad row is dropped while the rest of its batch is written."""
+        records = [_record() for _ in range(3)]
+        for record in records:
+            enqueue_query_log(record)
+        error = RuntimeError("foreign key violation")
+        log_session.execute.side_effect = [error, None, error, None]
+
+        assert asyncio.run(flush_query_logs()) == 2
+
+        assert [call.args[1] for call in log_session.execute.await_args_list[1:]] == [[r] for r in records]
+        assert log_session.rollback.await_count == 2
+        stats = get_query_log_writer_stats()
+        assert (stats["written"], stats["errors"], stats["dropped"], stats["pending"]) == (2, 1, 1, 0)
+
+    def test_failed_write_never_raises(self, log_session):
+        """Test rows that keep failing are dropped and never reach the caller."""
+        log_session.execute.side_effect = RuntimeError("check constraint violated")
+        enqueue_query_log(_record())
+
+        assert asyncio.run(flush_query_logs()) == 0
+
+        stats = get_query_log_writer_stats()
+        assert (stats["errors"], stats["dropped"], stats["pending"]) == (1, 1, 0)
+
+    def test_connection_error_skips_row_retries(self, log_session):
+        """Test a lost database connection drops the batch without retrying each row."""
+        log_session.execute.side_effect = ConnectionRefusedError("database is down")
+        for _ in range(3):
+            enqueue_query_log(_record())
+
+        assert asyncio.run(flush_query_logs()) == 0
+
+        log_session.execute.assert_awaited_once()
+        stats = get_query_log_writer_stats()
+        assert (stats["errors"], stats["dropped"], stats["pending"]) == (1, 3, 0)
+
+    def test_writer_survives_failed_flush(self, log_session, monkeypatch):
+        """Test an exception escaping a flush does not end the writer task."""
+        monkeypatch.setattr("app.services.query_log_writer.settings.QUERY_LOG_FLUSH_INTERVAL", 0)
+        flush = AsyncMock(side_effect=[RuntimeError("rollback failed"), 0, 0, 0])
+        monkeypatch.setattr("app.services.query_log_writer.flush_query_logs", flush)
+
+        async def run() -> None:
+            task = asyncio.create_task(query_log_writer.run_query_log_writer())
+            while flush.await_count < 2:
+                await asyncio.sleep(0)
+            assert not task.done()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+
+    def test_writer_flushes_on_shutdown(self, log_session, monkeypatch):
+        """Test cancelling the writer task writes what is still queued."""
+        monkeypatch.setattr("app.services.query_log_writer.settings.QUERY_LOG_FLUSH_INTERVAL", 60)
+
+        async def run() -> None:
+            task = asyncio.create_task(query_log_writer.run_query_log_writer())
+            await asyncio.sleep(0)
+            enqueue_query_log(_record())
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+
+        log_session.execute.assert_awaited_once()
+        assert get_query_log_writer_stats()["written"] == 1
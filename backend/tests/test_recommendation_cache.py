@@ -0,0 +1,218 @@
+import asyncio
+from unittest.mock import AsyncMock, Mock, patch
+
+import numpy as np
+
+from app.services.cache import (
+    acquire_inflight,
+    cache_recommendation,
+    find_similar_cached_query,
+    get_cache_key,
+    get_cache_stats,
+    get_query_cached_recommendation,
+    get_recommendation_cache_stats,
+    get_semantic_index_key,
+    get_user_index_key,
+    invalidate_user_recommendations,
+    record_cache_miss,
+    wait_for_inflight,
+)
+from app.services.embedding_cache import pack_embedding
+
+
+def _pubsub(*messages: dict) -> Mock:
+    pubsub = Mock()
+    pubsub.subscribe = AsyncMock()
+    pubsub.unsubscribe = AsyncMock()
+    pubsub.close = AsyncMock()
+    pubsub.get_message = AsyncMock(side_effect=list(messages) + [None] * 10)
+    return pubsub
+
+
+def _vector(*values: float) -> list[float]:
+    vector = np.zeros(1536, dtype=np.float32)
+    vector[:len(values)] = values
+    return vector.tolist()
+
+
+class TestSemanticCache:
+    """Test the embedding-based similar query cache."""
+
+    def test_paraphrase_hits_nearest_entry(self, recommendation_cache_redis):
+        """Test the closest cached query above the threshold is returned."""
+        entries = {
+            b"aaa": pack_embedding(_vector(1.0, 0.0)),
+            b"bbb": pack_embedding(_vector(0.6, 0.8)),
+        }
+        recommendation_cache_redis.get = AsyncMock(return_value="Try Terre d'Hermes")
+
+        with patch('app.services.cache.async_binary_redis_client.hgetall', AsyncMock(return_value=entries)) as hgetall:
+            response = asyncio.run(find_similar_cached_query(_vector(0.62, 0.78), "u1", "3", threshold=0.95))
+
+        assert response == "Try Terre d'Hermes"
+        hgetall.assert_awaited_once_with(get_semantic_index_key("u1", "3"))
+        recommendation_cache_redis.get.assert_awaited_once_with("rec:u1:3:bbb")
+        assert get_recommendation_cache_stats()["semantic_hits"] == 1
+
+    def test_below_threshold_misses(self, recommendation_cache_redis):
+        """Test an unrelated query neither fetches a response nor hits."""
+        entries = {b"aaa": pack_embedding(_vector(1.0, 0.0))}
+
+        with patch('app.services.cache.async_binary_redis_client.hgetall', AsyncMock(return_value=entries)):
+            response = asyncio.run(find_similar_cached_query(_vector(0.0, 1.0), "u1", "0"))
+
+        assert response is None
+        recommendation_cache_redis.get.assert_not_awaited()
+        assert get_recommendation_cache_stats()["semantic_hits"] == 0
+
+    def test_expired_entry_is_dropped_from_index(self, recommendation_cache_redis):
+        """Test an index field whose response expired is removed."""
+        entries = {b"aaa": pack_embedding(_vector(1.0, 0.0))}
+
+        with patch('app.services.cache.async_binary_redis_client') as binary:
+            binary.hgetall = AsyncMock(return_value=entries)
+            response = asyncio.run(find_similar_cached_query(_vector(1.0, 0.0), "u1", "0"))
+
+        assert response is None
+        binary.hdel.assert_awaited_once_with(get_semantic_index_key("u1", "0"), "aaa")
+
+    def test_store_indexes_embedding(self, recommendation_cache_redis, monkeypatch):
+        """Test caching a response stores its packed query embedding and evicts overflow."""
+        monkeypatch.setattr("app.services.cache.settings.SEMANTIC_CACHE_MAX_ENTRIES", 2)
+        embedding = _vector(0.3, 0.4)
+
+        with patch('app.services.cache.async_binary_redis_client') as binary:
+            binary.pipeline = Mock()
+            pipe = binary.pipeline.return_value
+            pipe.execute = AsyncMock(return_value=[1, True, 3])
+            binary.hrandfield = AsyncMock(return_value=[b"old"])
+
+            asyncio.run(cache_recommendation(
+                "u1:context:query", "Try Philosykos", "query", "u1", "0", query_embedding=embedding
+            ))
+
+        field, data = pipe.hset.call_args[0][1:]
+        assert pipe.hset.call_args[0][0] == get_semantic_index_key("u1", "0")
+        assert data == pack_embedding(embedding)
+        assert f"rec:u1:0:{field}" == recommendation_cache_redis.pipeline.return_value.setex.call_args_list[0][0][0]
+        binary.hrandfield.assert_awaited_once_with(get_semantic_index_key("u1", "0"), 1)
+        binary.hdel.assert_awaited_once_with(get_semantic_index_key("u1", "0"), b"old")
+
+
+class TestCacheIndex:
+    """Test versioned, per-user cache bookkeeping without KEYS scans."""
+
+    def test_invalidate_is_single_incr(self):
+        """Test invalidation bumps the data version without touching entries."""
+        with patch('app.services.cache.redis_client') as mock_redis:
+            invalidate_user_recommendations("u1")
+
+        pipe = mock_redis.pipeline.return_value
+        pipe.incr.assert_called_once_with("data_version:u1")
+        pipe.execute.assert_called_once()
+        mock_redis.keys.assert_not_called()
+        mock_redis.smembers.assert_not_called()
+        mock_redis.delete.assert_not_called()
+
+    def test_new_version_changes_every_key(self):
+        """Test entries written before a bump are not found after it."""
+        assert get_cache_key("u1:context:query", "u1", "1") != get_cache_key("u1:context:query", "u1", "2")
+        assert get_user_index_key("u1", "1") != get_user_index_key("u1", "2")
+        assert get_semantic_index_key("u1", "1") != get_semantic_index_key("u1", "2")
+
+    def test_stats_count_live_entries_and_prune_index(self):
+        """Test stats read the current version's index and drop expired members."""
+        with patch('app.services.cache.redis_client') as mock_redis:
+            mock_redis.get.return_value = "2"
+            mock_redis.smembers.return_value = {"aaa", "bbb"}
+            mock_redis.pipeline.return_value.execute.return_value = [1, 1, 0, 0]
+
+            stats = get_cache_stats("u1")
+
+        mock_redis.keys.assert_not_called()
+        mock_redis.smembers.assert_called_once_with(get_user_index_key("u1", "2"))
+        assert stats == {"cached_recommendations": 1, "metadata_entries": 1, "user_id": "u1"}
+        mock_redis.srem.assert_called_once_with(get_user_index_key("u1", "2"), "bbb")
+
+
+class TestQueryCache:
+    """Test the first-level (user, query) cache lookup."""
+
+    def test_entry_from_older_version_misses(self):
+        """Test an entry stored before the user's data changed is not returned."""
+        stored = '{"version": "2", "entry": {"response": "Old answer", "sources": []}}'
+        with patch('app.services.cache._query_cache_lookup', AsyncMock(return_value=["3", stored])):
+            assert asyncio.run(get_query_cached_recommendation("u1", "Something green?")) == ("3", None)
+
+    def test_redis_failure_disables_caching(self):
+        """Test a failed lookup returns no version so the caller caches nothing."""
+        lookup = AsyncMock(side_effect=ConnectionError("redis down"))
+        with patch('app.services.cache._query_cache_lookup', lookup):
+            assert asyncio.run(get_query_cached_recommendation("u1", "Something green?")) == (None, None)
+
+
+class TestCacheStats:
+    """Test the recommendation cache hit/miss counters."""
+
+    def test_each_request_counted_once(self, recommendation_cache_redis):
+        """Test a lookup that misses and then coalesces counts as one hit, not a miss too."""
+        entries = {b"aaa": pack_embedding(_vector(1.0, 0.0))}
+        recommendation_cache_redis.pubsub = Mock(return_value=_pubsub({"type": "message", "data": "Leader answer"}))
+        recommendation_cache_redis.pipeline.return_value.execute = AsyncMock(return_value=[None, 1])
+
+        with patch('app.services.cache.async_binary_redis_client.hgetall', AsyncMock(return_value=entries)):
+            for _ in range(2):
+                asyncio.run(find_similar_cached_query(_vector(0.0, 1.0), "u1", "0"))
+        asyncio.run(wait_for_inflight("rec:u1:0:aaa", timeout=1))
+        record_cache_miss()
+
+        stats = get_recommendation_cache_stats()
+        assert (stats["coalesced"], stats["misses"]) == (1, 1)
+        assert stats["hit_rate"] == 0.5
+        assert stats["semantic_hit_rate"] == 0.0
+
+
+class TestSingleFlight:
+    """Test coalescing of identical in-flight recommendation requests."""
+
+    def test_first_request_takes_lock(self, recommendation_cache_redis):
+        """Test only the request that sets the lock gets a token."""
+        assert asyncio.run(acquire_inflight("rec:u1:0:aaa"))
+        lock_key = recommendation_cache_redis.set.await_args[0][0]
+        assert lock_key == "inflight:rec:u1:0:aaa"
+        assert recommendation_cache_redis.set.await_args.kwargs["nx"] is True
+
+        recommendation_cache_redis.set = AsyncMock(return_value=None)
+        assert asyncio.run(acquire_inflight("rec:u1:0:aaa")) is None
+
+    def test_waiter_receives_published_answer(self, recommendation_cache_redis):
+        """Test a duplicate request gets the answer published by the lock holder."""
+        pubsub = _pubsub({"type": "message", "data": "Leader answer"})
+        recommendation_cache_redis.pubsub = Mock(return_value=pubsub)
+        recommendation_cache_redis.pipeline.return_value.execute = AsyncMock(return_value=[None, 1])
+
+        assert asyncio.run(wait_for_inflight("rec:u1:0:aaa", timeout=1)) == "Leader answer"
+        pubsub.subscribe.assert_awaited_once_with("inflight_done:rec:u1:0:aaa")
+        pubsub.unsubscribe.assert_awaited_once()
+        stats = get_recommendation_cache_stats()
+        assert (stats["coalesced"], stats["misses"]) == (1, 0)
+        assert stats["hit_rate"] == 1.0
+
+    def test_waiter_reads_answer_published_before_subscribing(self, recommendation_cache_redis):
+        """Test an answer cached before the subscription is still picked up."""
+        pubsub = _pubsub()
+        recommendation_cache_redis.pubsub = Mock(return_value=pubsub)
+        recommendation_cache_redis.pipeline.return_value.execute = AsyncMock(return_value=["Leader answer", 0])
+
+        assert asyncio.run(wait_for_inflight("rec:u1:0:aaa", timeout=1)) == "Leader answer"
+        pubsub.get_message.assert_not_awaited()
+
+    def test_waiter_gives_up_when_holder_failed(self, recommendation_cache_redis):
+        """Test a failed or vanished lock holder makes the waiter generate itself."""
+        recommendation_cache_redis.pubsub = Mock(return_value=_pubsub({"type": "message", "data": ""}))
+        recommendation_cache_redis.pipeline.return_value.execute = AsyncMock(return_value=[None, 1])
+        assert asyncio.run(wait_for_inflight("rec:u1:0:aaa", timeout=1)) is None
+
+        recommendation_cache_redis.pubsub = Mock(return_value=_pubsub())
+        recommendation_cache_redis.pipeline.return_value.execute = AsyncMock(return_value=[None, 0])
+        assert asyncio.run(wait_for_inflight("rec:u1:0:aaa", timeout=1)) is None
@@ -0,0 +1,117 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, Mock, patch
+
+import numpy as np
+from fastapi import status
+
+from app.models import ExtractedScent, MemoryChunk
+from app.services.retrieval import mmr_select, reciprocal_rank_fusion, retrieve_chunk_ids
+
+
+class TestReciprocalRankFusion:
+    """Test rank fusion of retriever results."""
+
+    def test_agreement_outranks_single_list(self):
+        """Test a chunk ranked by several retrievers beats one ranked first by one."""
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"], ["c"]], k=60)
+
+        assert fused[0] == "c"
+        assert fused.index("a") < fused.index("b")
+        assert set(fused) == {"a", "b", "c", "d"}
+
+    def test_empty_rankings(self):
+        """Test no candidates fuse to an empty result."""
+        assert reciprocal_rank_fusion([[], []]) == []
+
+
+class TestRetrieveChunkIds:
+    """Test retriever selection."""
+
+    def test_hybrid_fuses_vector_and_lexical(self):
+        """Test hybrid mode over-fetches from both retrievers and fuses them."""
+        vectors = np.zeros((2, 0), dtype=np.float32)
+        with patch('app.services.retrieval.vector_search', AsyncMock(return_value=(["v1", "both"], vectors))) as vector, \
+             patch('app.services.retrieval.lexical_search', AsyncMock(return_value=[["both", "l1"], []])) as lexical:
+            chunk_ids = asyncio.run(retrieve_chunk_ids(Mock(), "ambroxan", [0.1], "u1", top_k=2, mode="hybrid"))
+
+        assert chunk_ids == ["both", "v1"]
+        assert vector.await_args[0][2] >= 2
+        lexical.assert_awaited_once()
+
+    def test_vector_mode_skips_lexical(self):
+        """Test vector mode only queries ChromaDB."""
+        with patch('app.services.retrieval.vector_search', AsyncMock(return_value=(["v1"], np.ones((1, 2))))), \
+             patch('app.services.retrieval.lexical_search', AsyncMock()) as lexical:
+            chunk_ids = asyncio.run(retrieve_chunk_ids(Mock(), "ambroxan", [0.1, 0.2], "u1", mode="vector"))
+
+        assert chunk_ids == ["v1"]
+        lexical.assert_not_awaited()
+
+
+class TestMMR:
+    """Test maximal marginal relevance re-ranking."""
+
+    def test_skips_near_duplicates(self):
+        """Test a near-copy of the top chunk loses to a less relevant, different one."""
+        embeddings = np.array([[1.0, 0.0], [0.99, 0.05], [0.0, 1.0]], dtype=np.float32)
+        relevance = np.array([1.0, 0.98, 0.6])
+
+        assert mmr_select(relevance, embeddings, 2, lambda_=0.5) == [0, 2]
+        assert mmr_select(relevance, embeddings, 2, lambda_=1.0) == [0, 1]
+
+    def test_vector_search_diversifies_neighbouring_chunks(self, monkeypatch):
+        """Test vector retrieval over-fetches and re-ranks using the returned embeddings."""
+        monkeypatch.setattr("app.services.retrieval.settings.MMR_LAMBDA", 0.5)
+        query = [1.0, 0.0, 0.0]
+        vectors = np.array([[1.0, 0.1, 0.0], [1.0, 0.11, 0.0], [1.0, 0.12, 0.0], [0.7, 0.0, 0.7]], dtype=np.float32)
+
+        with patch('app.services.retrieval.vector_search', AsyncMock(return_value=(["a", "b", "c", "d"], vectors))) as vector:
+            chunk_ids = asyncio.run(retrieve_chunk_ids(Mock(), "q", query, "u1", top_k=2, mode="vector"))
+
+        assert chunk_ids == ["a", "d"]
+        assert vector.await_args[0][2] > 2
+
+    def test_under_a_millisecond(self):
+        """Test selecting 5 of 20 candidates with 1536-d embeddings stays sub-millisecond."""
+        rng = np.random.default_rng(0)
+        embeddings = rng.standard_normal((20, 1536)).astype(np.float32)
+        relevance = rng.random(20)
+
+        timings = []
+        for _ in range(50):
+            started = time.perf_counter()
+            mmr_select(relevance, embeddings, 5, lambda_=0.7)
+            timings.append(time.perf_counter() - started)
+
+        assert min(timings) < 0.001
+
+
+class TestHybridSearch:
+    """Test lexical matches reach the search context."""
+
+    def test_named_perfume_found_lexically(self, client, auth_headers, db_session, test_memory,
+                                           mock_embedding):
+        """Test a memory naming the perfume is retrieved even when vectors miss it."""
+        db_session.add(MemoryChunk(
+            memory_id=test_memory.id, chunk_index=0, content="Grandma's dresser and her bottle"
+        ))
+        db_session.add(ExtractedScent(
+            memory_id=test_memory.id, scent_name="Wood Sage & Sea Salt", brand="Jo Malone",
+            confidence=0.9, source="text"
+        ))
+        db_session.commit()
+
+        with patch('app.api.query.async_client') as mock_llm:
+            mock_llm.chat.completions.create = AsyncMock(return_value=Mock(
+                choices=[Mock(message=Mock(content="Try it again"))], usage=None
+            ))
+
+            response = client.post(
+                "/api/query/search?use_cache=false",
+                headers=auth_headers,
+                json={"query": "Something like Wood Sage & Sea Salt"}
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["sources"] == [str(test_memory.id)]
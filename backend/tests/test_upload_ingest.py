@@ -0,0 +1,68 @@
+import asyncio
+from io import BytesIO
+
+import pytest
+from fastapi import UploadFile
+
+from app.services.upload_ingest import (
+    UnsupportedUploadError,
+    UploadTooLargeError,
+    ingest_upload,
+    sniff_mime_type,
+)
+
+
+ALLOWED = {"image/jpeg", "image/png", "application/pdf"}
+PNG_HEADER = b"\x89PNG\r\n\x1a\n" + b"\x00" * 8
+
+
+def _ingest(data: bytes, store, max_size: int = 1024 * 1024):
+    upload = UploadFile(file=BytesIO(data), filename="upload.bin")
+    return asyncio.run(ingest_upload(upload, store, max_size, ALLOWED, ".png"))
+
+
+class TestIngestUpload:
+    """Test streaming upload ingestion."""
+
+    def test_streams_into_blob_store(self, blob_store):
+        """Test content is hashed, sniffed and stored in one pass."""
+        data = PNG_HEADER + b"x" * 200_000
+
+        ingested = _ingest(data, blob_store)
+
+        assert ingested["content_type"] == "image/png"
+        assert ingested["size"] == len(data)
+        assert ingested["key"].endswith(".png")
+        assert ingested["sha256"] in ingested["key"]
+        assert blob_store.get(ingested["key"]) == data
+
+    def test_enforces_size_limit_incrementally(self, blob_store):
+        """Test oversized uploads are rejected and nothing is kept."""
+        with pytest.raises(UploadTooLargeError):
+            _ingest(PNG_HEADER + b"x" * 5000, blob_store, max_size=1000)
+
+        assert not list(blob_store.root.rglob("*"))
+
+    def test_rejects_unrecognized_content(self, blob_store):
+        """Test content whose magic bytes are not allowed is rejected."""
+        with pytest.raises(UnsupportedUploadError):
+            _ingest(b"just some plain text pretending to be an image", blob_store)
+
+    def test_claim_runs_before_blob_is_stored(self, blob_store):
+        """Test the caller records its reference to the key before the blob exists."""
+        claimed = []
+
+        def claim(key):
+            claimed.append((key, blob_store.exists(key)))
+
+        upload = UploadFile(file=BytesIO(PNG_HEADER + b"x" * 100), filename="upload.bin")
+        ingested = asyncio.run(ingest_upload(upload, blob_store, 1024 * 1024, ALLOWED, ".png", claim=claim))
+
+        assert claimed == [(ingested["key"], False)]
+        assert blob_store.exists(ingested["key"])
+
+    def test_sniff_mime_type(self):
+        """Test magic-byte detection."""
+        assert sniff_mime_type(b"%PDF-1.7\n") == "application/pdf"
+        assert sniff_mime_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+        assert sniff_mime_type(b"hello") is None
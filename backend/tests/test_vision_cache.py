@@ -0,0 +1,124 @@
+from io import BytesIO
+from unittest.mock import patch
+
+import pytest
+from PIL import Image, ImageDraw
+
+from app.services.image_preprocess import prepare_image
+from app.services.vision_cache import cache_vision_result, get_cached_vision_result, hamming_distance
+
+
+class FakeRedis:
+    """Minimal in-memory stand-in for the commands the vision cache uses."""
+
+    def __init__(self):
+        self.values = {}
+        self.sets = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    def setex(self, key, ttl, value):
+        self.values[key] = value
+
+    def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(member)
+
+    def expire(self, key, ttl):
+        pass
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args):
+            self.calls.append((name, args))
+        return queue
+
+    def execute(self):
+        return [getattr(self.redis, name)(*args) for name, args in self.calls]
+
+
+@pytest.fixture
+def fake_redis():
+    fake = FakeRedis()
+    with patch('app.services.vision_cache.redis_client', fake):
+        yield fake
+
+
+def _photo(quality: int = 90, size: tuple[int, int] = (640, 480), dot: bool = False) -> bytes:
+    image = Image.new('RGB', size, color='white')
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([size[0] // 4, size[1] // 4, size[0] // 2, size[1] - 40], fill='navy')
+    draw.ellipse([size[0] // 2, 40, size[0] - 40, size[1] // 2], fill='gold')
+    if dot:
+        draw.point((5, 5), fill='red')
+    output = BytesIO()
+    image.save(output, format='JPEG', quality=quality)
+    return output.getvalue()
+
+
+RESULT = {'image_description': 'A navy bottle beside a golden sun', 'top_notes': ['bergamot']}
+
+
+class TestVisionCache:
+    """Test the perceptual-hash cache for vision results."""
+
+    def test_exact_image_hits(self, fake_redis):
+        """Test the same image and context reuses the stored result."""
+        phash = prepare_image(_photo())["phash"]
+        cache_vision_result(phash, "u1", "happy", "summer", RESULT)
+
+        assert get_cached_vision_result(phash, "u1", "happy", "summer") == RESULT
+
+    def test_near_duplicate_hits(self, fake_redis):
+        """Test a re-encoded, resized copy of an image finds the cached result."""
+        original = prepare_image(_photo())["phash"]
+        near = prepare_image(_photo(quality=40, size=(1280, 960), dot=True))["phash"]
+        cache_vision_result(original, "u1", "happy", None, RESULT)
+
+        assert hamming_distance(original, near) <= 4
+        assert get_cached_vision_result(near, "u1", "happy", None) == RESULT
+
+    def test_different_context_misses(self, fake_redis):
+        """Test emotion/occasion are part of the cache key."""
+        phash = prepare_image(_photo())["phash"]
+        cache_vision_result(phash, "u1", "happy", None, RESULT)
+
+        assert get_cached_vision_result(phash, "u1", "sad", None) is None
+
+    def test_other_user_misses(self, fake_redis):
+        """Test another user's exact or near-duplicate photo never gets this user's result."""
+        original = prepare_image(_photo())["phash"]
+        near = prepare_image(_photo(quality=40, size=(1280, 960), dot=True))["phash"]
+        cache_vision_result(original, "u1", "happy", None, RESULT)
+
+        assert get_cached_vision_result(original, "u2", "happy", None) is None
+        assert get_cached_vision_result(near, "u2", "happy", None) is None
+
+    def test_distant_hash_misses(self, fake_redis):
+        """Test hashes beyond the Hamming threshold are not matched."""
+        cache_vision_result("ffffffffffffffff", "u1", None, None, RESULT)
+
+        assert get_cached_vision_result("ffffffffffff0000", "u1", None, None) is None
+
+    def test_exact_only_when_threshold_zero(self, fake_redis, monkeypatch):
+        """Test a zero threshold disables near-duplicate matching."""
+        monkeypatch.setattr("app.services.vision_cache.settings.VISION_CACHE_MAX_DISTANCE", 0)
+        cache_vision_result("ffffffffffffffff", "u1", None, None, RESULT)
+
+        assert get_cached_vision_result("fffffffffffffffe", "u1", None, None) is None
+        assert get_cached_vision_result("ffffffffffffffff", "u1", None, None) == RESULT